@@ -0,0 +1,149 @@
+import time
+from datetime import date, timedelta
+import numpy as np
+
+
+#Dia 0 da contagem de dias usada nos arrays (dias desde 1970-01-01)
+EPOCH = date(1970, 1, 1)
+
+
+def forecast_arrays(datas):
+    """
+    Converte as respostas do end-point forecast de uma ou várias cidades em arrays colunares (NumPy).
+
+    Parâmetros:
+    datas (list): Respostas da API (dict com 'list' e 'city'), todas válidas.
+
+    Retorna:
+    dict: Arrays com uma posição por intervalo de 3 horas:
+          city (índice da cidade em datas), dt (timestamp UTC), offset (fuso em segundos),
+          day (dia local, em dias desde 1970-01-01),
+          temp, temp_max, temp_min, humidity, wind, condition (id da condição do tempo),
+          e as listas description e icon na mesma ordem.
+    """
+    size = sum(len(data['list']) for data in datas)
+    arrays = {
+        "city": np.empty(size, dtype=np.int64),
+        "dt": np.empty(size, dtype=np.int64),
+        "offset": np.empty(size, dtype=np.int64),
+        "temp": np.empty(size, dtype=np.float64),
+        "temp_max": np.empty(size, dtype=np.float64),
+        "temp_min": np.empty(size, dtype=np.float64),
+        "humidity": np.empty(size, dtype=np.float64),
+        "wind": np.empty(size, dtype=np.float64),
+        "condition": np.empty(size, dtype=np.int64),
+    }
+    description = []
+    icon = []
+
+    position = 0
+    for index, data in enumerate(datas):
+        items = data['list']
+        end = position + len(items)
+        arrays["city"][position:end] = index
+        arrays["offset"][position:end] = data.get('city', {}).get('timezone', 0)
+        arrays["dt"][position:end] = [item['dt'] for item in items]
+        arrays["temp"][position:end] = [item['main']['temp'] for item in items]
+        arrays["temp_max"][position:end] = [item['main']['temp_max'] for item in items]
+        arrays["temp_min"][position:end] = [item['main']['temp_min'] for item in items]
+        arrays["humidity"][position:end] = [item['main']['humidity'] for item in items]
+        arrays["wind"][position:end] = [item['wind']['speed'] for item in items]
+        arrays["condition"][position:end] = [item['weather'][0]['id'] for item in items]
+        description.extend(item['weather'][0]['description'] for item in items)
+        icon.extend(item['weather'][0]['icon'] for item in items)
+        position = end
+
+    arrays["day"] = (arrays["dt"] + arrays["offset"]) // 86400
+    arrays["description"] = description
+    arrays["icon"] = icon
+    return arrays
+
+
+def aggregate_forecasts(datas, skip_today=True, now=None):
+    """
+    Agrupa as previsões de 3 horas por cidade e dia local (fuso de city.timezone) em uma única passada vetorizada.
+
+    Por dia calcula a temperatura mínima, máxima e média, a umidade média, o vento máximo e a condição do tempo
+    predominante (a que mais aparece no dia, em empate a primeira).
+
+    Parâmetros:
+    datas (list): Respostas da API do end-point forecast, todas válidas.
+    skip_today (bool, opcional): Ignora o dia atual de cada cidade, por padrão é True.
+    now (float, opcional): Timestamp usado como agora, por padrão time.time().
+
+    Retorna:
+    list: Uma lista por cidade (na ordem de datas) com um dicionário numérico por dia:
+          date, temp, temp_max, temp_min, humidity, wind, description, icon.
+    """
+    return aggregate_arrays(forecast_arrays(datas), len(datas), skip_today, now)
+
+
+def aggregate_arrays(arrays, cities, skip_today=True, now=None):
+    """
+    Agrupa por cidade e dia os arrays de forecast_arrays(), sem alterá-los (usado também pelos modelos do models.py).
+
+    Parâmetros:
+    arrays (dict): Arrays de forecast_arrays().
+    cities (int): Quantidade de cidades dos arrays.
+    skip_today (bool, opcional): Ignora o dia atual de cada cidade, por padrão é True.
+    now (float, opcional): Timestamp usado como agora, por padrão time.time().
+
+    Retorna:
+    list: O mesmo retorno de aggregate_forecasts().
+    """
+    result = [[] for _ in range(cities)]
+    arrays = dict(arrays)
+    if not len(arrays["day"]):
+        return result
+
+    city = arrays["city"]
+    day = arrays["day"]
+    if skip_today:
+        today = (int(now if now is not None else time.time()) + arrays["offset"]) // 86400
+        keep = day != today
+        if not keep.all():
+            indexes = np.flatnonzero(keep)
+            for name in ("city", "dt", "day", "temp", "temp_max", "temp_min", "humidity", "wind", "condition"):
+                arrays[name] = arrays[name][keep]
+            arrays["description"] = [arrays["description"][i] for i in indexes]
+            arrays["icon"] = [arrays["icon"][i] for i in indexes]
+            city = arrays["city"]
+            day = arrays["day"]
+        if not len(day):
+            return result
+
+    #Ordena por (cidade, dia) e encontra o início de cada grupo
+    order = np.lexsort((day, city))
+    group_city = city[order]
+    group_day = day[order]
+    starts = np.flatnonzero(np.r_[True, (np.diff(group_city) != 0) | (np.diff(group_day) != 0)])
+    counts = np.diff(np.r_[starts, len(order)])
+    group = np.repeat(np.arange(len(starts)), counts)
+
+    temp_max = np.maximum.reduceat(arrays["temp_max"][order], starts)
+    temp_min = np.minimum.reduceat(arrays["temp_min"][order], starts)
+    temp = np.add.reduceat(arrays["temp"][order], starts) / counts
+    humidity = np.add.reduceat(arrays["humidity"][order], starts) / counts
+    wind = np.maximum.reduceat(arrays["wind"][order], starts)
+
+    #Condição predominante: conta (grupo, condição) e pega a de maior contagem de cada grupo
+    condition_key = group * 1000 + arrays["condition"][order] % 1000
+    keys, first, occurrences = np.unique(condition_key, return_index=True, return_counts=True)
+    key_group = keys // 1000
+    best = np.lexsort((first, -occurrences, key_group))
+    best = best[np.flatnonzero(np.r_[True, np.diff(key_group[best]) != 0])]
+    dominant = order[first[best]]
+
+    for i, (city_index, day_number) in enumerate(zip(group_city[starts].tolist(), group_day[starts].tolist())):
+        position = dominant[i]
+        result[city_index].append({
+            "date": EPOCH + timedelta(days=day_number),
+            "temp": round(float(temp[i]), 2),
+            "temp_max": float(temp_max[i]),
+            "temp_min": float(temp_min[i]),
+            "humidity": round(float(humidity[i]), 1),
+            "wind": float(wind[i]),
+            "description": arrays["description"][position],
+            "icon": arrays["icon"][position],
+        })
+    return result
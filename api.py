@@ -1,20 +1,328 @@
+import os
+import random
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import time
 import requests
+from requests.adapters import HTTPAdapter
+from cache import weather_cache, cache_key, CACHE_TTL, WEATHER_COMBINED
+from scheduler import RefreshScheduler, REFRESH_ENABLED
+from cities import city_index, CITY_RESOLVE_IDS
+from geo import geo_index, snap, GEO_GRID_PRECISION, GEO_NEAREST_MAX_KM
+from metrics import stage, observe_upstream
+from quota import upstream_quota
 
 
+#Configuração da API da Open Weather, pode ser ajustada por variáveis de ambiente
+API_BASE_URL = os.environ.get('OPENWEATHER_BASE_URL', 'https://api.openweathermap.org/data/2.5')
+API_KEY = os.environ.get('OPENWEATHER_API_KEY', 'eb7162fd4bef5a8bf3a2f3ad86984996')
 
-def get_weather_data(city_name, current_day=True):
+#Tempos limite em segundos para conectar e para ler a resposta
+HTTP_CONNECT_TIMEOUT = float(os.environ.get('HTTP_CONNECT_TIMEOUT', 3.05))
+HTTP_READ_TIMEOUT = float(os.environ.get('HTTP_READ_TIMEOUT', 10))
+#Novas tentativas em erros de conexão e 5xx, com espera exponencial (HTTP_BACKOFF * 2^n) mais variação aleatória.
+#Cada tentativa retira uma ficha da cota (quota.upstream_quota), respostas 429 não são repetidas
+HTTP_RETRIES = int(os.environ.get('HTTP_RETRIES', 2))
+HTTP_BACKOFF = float(os.environ.get('HTTP_BACKOFF', 0.3))
+HTTP_BACKOFF_JITTER = float(os.environ.get('HTTP_BACKOFF_JITTER', 0.2))
+HTTP_POOL_SIZE = int(os.environ.get('HTTP_POOL_SIZE', 20))
+#Falhas seguidas para abrir o circuito e segundos até tentar a API novamente
+CIRCUIT_FAILURE_THRESHOLD = int(os.environ.get('CIRCUIT_FAILURE_THRESHOLD', 5))
+CIRCUIT_RESET_TIMEOUT = float(os.environ.get('CIRCUIT_RESET_TIMEOUT', 30))
+#Chamadas simultâneas a API nas rotas em lote (weatherBatch e forecastBatch)
+BATCH_MAX_CONCURRENCY = int(os.environ.get('BATCH_MAX_CONCURRENCY', 10))
+BATCH_MAX_CITIES = int(os.environ.get('BATCH_MAX_CITIES', 50))
+
+
+class UpstreamUnavailable(Exception):
+    """Erro lançado quando a API da Open Weather não responde, responde 5xx/429 ou o circuito está aberto."""
+
+
+class QuotaExhausted(UpstreamUnavailable):
+    """Erro lançado quando a cota de chamadas da API (quota.upstream_quota) está esgotada."""
+
+
+class CircuitBreaker:
+    """
+    Disjuntor das chamadas a API: após CIRCUIT_FAILURE_THRESHOLD falhas seguidas o circuito abre
+    e as chamadas falham imediatamente por CIRCUIT_RESET_TIMEOUT segundos. Depois desse tempo
+    uma única chamada de teste é liberada, se tiver sucesso o circuito fecha.
+
+    Atributos:
+        failures (int): Falhas seguidas desde o último sucesso.
+        rejected (int): Chamadas recusadas com o circuito aberto.
+    """
+    def __init__(self, failure_threshold=CIRCUIT_FAILURE_THRESHOLD, reset_timeout=CIRCUIT_RESET_TIMEOUT):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.rejected = 0
+        self._opened_at = None
+        self._probing = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        if self._opened_at is None:
+            return 'closed'
+        if time.monotonic() - self._opened_at < self.reset_timeout:
+            return 'open'
+        return 'half_open'
+
+    def allow(self):
+        """Retorna se uma chamada a API pode ser feita agora."""
+        with self._lock:
+            if self._opened_at is None:
+                return True
+            if time.monotonic() - self._opened_at >= self.reset_timeout and not self._probing:
+                self._probing = True
+                return True
+            self.rejected += 1
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self._opened_at = None
+            self._probing = False
+
+    def cancel(self):
+        """Libera a chamada de teste (half_open) liberada por allow() que não chegou a ser feita, ex: recusada pela cota."""
+        with self._lock:
+            self._probing = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            self._probing = False
+            if self.failures >= self.failure_threshold:
+                self._opened_at = time.monotonic()
+
+    def stats(self):
+        return {"state": self.state, "failures": self.failures, "rejected": self.rejected}
+
+
+def create_http_session():
+    """
+    Cria a sessão HTTP usada nas chamadas a API, com conexões reaproveitadas (keep-alive).
+    A sessão não repete as chamadas, as novas tentativas ficam em fetch_weather_data (uma ficha da cota por tentativa).
+
+    Retorna:
+    requests.Session: Sessão configurada.
+    """
+    adapter = HTTPAdapter(pool_connections=4, pool_maxsize=HTTP_POOL_SIZE, max_retries=0)
+    session = requests.Session()
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    return session
+
+
+def retry_delay(attempt):
+    """Segundos de espera antes da nova tentativa attempt (1, 2, ...): HTTP_BACKOFF * 2^(attempt-1) mais até HTTP_BACKOFF_JITTER."""
+    return HTTP_BACKOFF * 2 ** (attempt - 1) + random.uniform(0, HTTP_BACKOFF_JITTER)
+
+
+def quota_exhausted(attempt):
+    """
+    Encerra uma chamada sem ficha da cota: na primeira tentativa libera a chamada de teste do disjuntor,
+    nas novas tentativas conta a falha das anteriores.
+
+    Retorna:
+    QuotaExhausted: O erro a ser lançado.
+    """
+    if attempt:
+        circuit_breaker.record_failure()
+    else:
+        circuit_breaker.cancel()
+    return QuotaExhausted('cota de chamadas da API esgotada')
+
+
+#Sessão HTTP e disjuntor únicos do processo
+http_session = create_http_session()
+circuit_breaker = CircuitBreaker()
+
+#Threads compartilhadas pelas consultas em lote, limitam as chamadas simultâneas do processo a API
+batch_executor = ThreadPoolExecutor(max_workers=BATCH_MAX_CONCURRENCY, thread_name_prefix='weather-batch')
+
+#Renovação em segundo plano das cidades mais consultadas (REFRESH_ENABLED=1), com o limite no armazenamento da cota
+refresh_scheduler = RefreshScheduler(
+    lambda city_name, current_day, city_id: fetch_weather_data(city_name, current_day, city_id, background=True),
+    cacheable=lambda data: is_valid_response(data),
+    store=upstream_quota.store,
+)
+
+
+
+def get_weather_data(city_name=None, current_day=True, city_id=None, coords=None):
+    """
+    Obtém dados meteorológicos da API OpenWeatherMap passando pelo cache (cache.weather_cache).
+
+    O nome da cidade é convertido no ID da OpenWeather pelo índice de cidades (resolve_city), assim variações
+    como 'Osorio', 'Osório' e 'osorio ' usam a mesma chave do cache e a mesma chamada a API (por id).
+    A chave do cache é o ID (ou o nome normalizado) e o end-point ('weather' ou 'forecast'), cada um com seu TTL (CACHE_TTL).
+    Requisições simultâneas para a mesma cidade ausente no cache fazem uma única chamada a API.
+    Respostas de erro da API (cidade não encontrada, chave inválida) não são guardadas.
+    Se a API estiver indisponível ou a cota de chamadas esgotada (UpstreamUnavailable) é retornado o último valor guardado da cidade, mesmo expirado,
+    ou um dicionário de erro no formato da API ({"cod": 503, "message": ...}) sem esperar pela API.
+    Com REFRESH_ENABLED=1 a consulta é contada no refresh_scheduler, que renova as cidades mais consultadas antes de expirarem.
+    As coordenadas são ajustadas à célula do geohash e convertidas na cidade conhecida mais próxima (resolve_coordinates),
+    sem cidade próxima a API é consultada pelo centro da célula, com a célula como chave do cache.
+    Com WEATHER_COMBINED=1 o dia atual também usa o end-point forecast (a mesma chave do cache da previsão), e as
+    condições atuais são calculadas da previsão na conversão (function.convert_api_to_current_city).
+
+    Parâmetros:
+    city_name (string): Cidade que é recebido no campo de pesquisa pela api do frontend
+    current_day (bool, opcional): True busca os dados do dia atual, False busca os próximos 5 dias (ver fetch_weather_data)
+    city_id (int, opcional): ID da cidade na OpenWeather, usado no lugar do nome quando informado
+    coords (tuple, opcional): (lat, lon), usado quando o nome e o ID não são informados
+
+    Retorna:
+    dict: Um dicionário contendo informações obtidas da API.
+    """
+    current_day = current_day and not WEATHER_COMBINED
+    endpoint = 'weather' if current_day else 'forecast'
+    cell = None
+    if coords is not None and city_id is None and not city_name:
+        cell, coords, city_id = resolve_coordinates(*coords)
+    city_id = resolve_city(city_name, city_id)
+    key = cache_key(city_name, endpoint, city_id, cell)
+    #as células sem cidade próxima não são renovadas, o agendador consulta somente por nome ou ID
+    if REFRESH_ENABLED and (city_name or city_id is not None):
+        refresh_scheduler.record(key, endpoint, city_name, city_id)
+        refresh_scheduler.start()
+    try:
+        return weather_cache.get_or_fetch(
+            key,
+            CACHE_TTL[endpoint],
+            lambda: learn_city(fetch_weather_data(city_name, current_day, city_id, coords=coords), endpoint, city_id),
+            cacheable=is_valid_response,
+        )
+    except UpstreamUnavailable as e:
+        stale = weather_cache.get_stale(key)
+        if stale is not None:
+            return stale
+        return {"cod": 503, "message": f'Serviço de previsão indisponível: {e}'}
+
+
+def get_weather_data_batch(queries, current_day=True):
+    """
+    Obtém os dados de várias cidades, buscando na API em paralelo (no máximo BATCH_MAX_CONCURRENCY chamadas simultâneas).
+
+    Parâmetros:
+    queries (list): Lista de tuplas (city_name, city_id), uma por cidade, com um dos dois valores preenchido.
+    current_day (bool, opcional): True busca os dados do dia atual, False busca os próximos 5 dias
+
+    Retorna:
+    list: Os dicionários da API na mesma ordem de queries. Uma falha inesperada em uma cidade
+          vira um dicionário de erro no formato da API, sem afetar as demais.
+    """
+    def fetch(query):
+        city_name, city_id = query
+        try:
+            return get_weather_data(city_name, current_day, city_id)
+        except Exception as e:
+            return {"cod": 500, "message": type(e).__name__}
+
+    return list(batch_executor.map(fetch, queries))
+
+
+def resolve_city(city_name, city_id=None):
+    """
+    Converte o nome da cidade no ID da OpenWeather pelo índice de cidades (cities.city_index), sem diferenciar acentos e maiúsculas.
+
+    Retorna:
+    int: city_id quando informado, o ID encontrado no índice, ou None para consultar a API pelo nome.
+    """
+    if city_id is None and city_name and CITY_RESOLVE_IDS:
+        return city_index.lookup(city_name)
+    return city_id
+
+
+def resolve_coordinates(lat, lon):
+    """
+    Ajusta as coordenadas à célula do geohash (geo.snap, precisão GEO_GRID_PRECISION), assim usuários próximos
+    usam a mesma chave do cache, e procura a cidade conhecida mais próxima do centro da célula (geo.geo_index)
+    a até GEO_NEAREST_MAX_KM, consultada pelo ID e com o mesmo cache das consultas pelo nome.
+
+    Retorna:
+    tuple: (geohash da célula, (lat, lon) do centro da célula, ID da cidade mais próxima ou None)
+    """
+    cell, center_lat, center_lon = snap(lat, lon, GEO_GRID_PRECISION)
+    found = geo_index.nearest(center_lat, center_lon, GEO_NEAREST_MAX_KM) if GEO_NEAREST_MAX_KM > 0 else None
+    return cell, (center_lat, center_lon), found[0] if found else None
+
+
+def learn_city(data, endpoint, city_id=None):
+    """
+    Guarda no índice de cidades a cidade de uma resposta consultada pelo nome ou pelas coordenadas (city_id None), e grava
+    a resposta também na chave do cache por ID, usada pelas próximas consultas com qualquer variação do nome.
+    As coordenadas de todas as respostas de sucesso vão para o índice espacial (geo.geo_index).
+
+    Retorna:
+    dict: data, ou o mesmo objeto guardado no cache (cache.CachedResponse) quando gravado na chave por ID.
+    """
+    if is_valid_response(data):
+        geo_index.learn(data)
+    if city_id is None and CITY_RESOLVE_IDS and is_valid_response(data):
+        city = data.get('city') if endpoint == 'forecast' else data
+        if isinstance(city, dict) and city.get('id'):
+            city_index.learn(data)
+            data = weather_cache.set(cache_key(None, endpoint, city['id']), data, CACHE_TTL[endpoint])
+    return data
+
+
+def is_valid_response(data):
+    """
+    Verifica se a resposta da API foi de sucesso, o campo 'cod' é 200 (int no weather e string no forecast).
+    """
+    return isinstance(data, dict) and str(data.get('cod')) == '200'
+
+
+def build_request(city_name, current_day=True, city_id=None, coords=None):
+    """
+    Monta a url e os parâmetros da chamada a API (ver fetch_weather_data).
+
+    Retorna:
+    tuple: (API_PATH, params)
+    """
+    #Configuração da API e os end-point baseado no parâmetro current_day
+    params = {'appid': API_KEY, 'lang': 'pt_br', 'units': 'metric'}
+    if city_id is not None:
+        params['id'] = city_id
+    elif coords is not None and not city_name:
+        params['lat'], params['lon'] = coords
+    else:
+        params['q'] = city_name
+    if current_day:
+        API_PATH = f'{API_BASE_URL}/weather'
+    else:
+        API_PATH = f'{API_BASE_URL}/forecast'
+        params['cnt'] = 40
+    return API_PATH, params
+
+
+def fetch_weather_data(city_name, current_day=True, city_id=None, background=False, coords=None):
     """
     Obtém dados meteorológicos da API OpenWeatherMap com base no nome da cidade fornecido.
+    A chamada usa a sessão HTTP do módulo (http_session) com tempos limite e passa pelo disjuntor (circuit_breaker)
+    e pela cota de chamadas da chave (quota.upstream_quota), compartilhada por todos os processos.
+    Erros de conexão e respostas 5xx são repetidos até HTTP_RETRIES vezes (retry_delay), cada tentativa retira
+    uma ficha da cota. Respostas 429 não são repetidas, a API já recusou pela cota da chave.
     
     Parâmetros:
     city_name (string): Cidade que é recebido no campo de pesquisa pela api do frontend
     current_day (bool, opcional): Confiuração da api para o API_PATH, por padrão é True, busca os dados para a o dia atual, de for False, busca para os próximos 5 dias,
                         dependendo do hórario o dia de hoje também é incluso
+    city_id (int, opcional): ID da cidade na OpenWeather, enviado como id no lugar de q quando informado
+    background (bool, opcional): True na renovação em segundo plano, não espera pela cota e respeita a reserva (QUOTA_RESERVE)
+    coords (tuple, opcional): (lat, lon), enviados como lat e lon quando o nome e o ID não são informados
 
     Atributos (chave  = descrição):
     APi_PATH: weather = Previsão do clima do dia atual
               forecast =  Previsão do clima dos proximos dias
               q = (city_name) Recebe o valor de nome da cidade
+              id = (city_id) ID da cidade, substitui o q quando informado
+              lat, lon = (coords) Coordenadas, substituem o q quando o nome não é informado
               appid = (API_KEY) chave de API
               lang = (pt_br) variante da linguagem(português Brasil)
               units = (metric) Unidade de medida em Graus Celsius e velocidade em Km/h
@@ -26,6 +334,10 @@ def get_weather_data(city_name, current_day=True):
     Retorna:
     dict: Um dicionário contendo informações obtidas da API.
 
+    Exceções:
+    UpstreamUnavailable: Se o circuito estiver aberto, a API responder 429 ou um corpo que não é JSON, ou não responder no tempo limite ou responder 5xx após as novas tentativas.
+    QuotaExhausted: Se a cota de chamadas da API estiver esgotada (subclasse de UpstreamUnavailable).
+
     Observação:
     Esta função requer uma API_KEY válida da OpenWeatherMap para acessar a API
     Obtido em https://openweathermap.org/
@@ -34,17 +346,42 @@ def get_weather_data(city_name, current_day=True):
         forecast = https://openweathermap.org/forecast5
     """
 
-    #chave api da Open Weather
-    API_KEY = "eb7162fd4bef5a8bf3a2f3ad86984996"
+    API_PATH, params = build_request(city_name, current_day, city_id, coords)
 
-    #Configuração da API e os end-point baseado no parâmetro current_day
-    if current_day:
-        API_PATH = f'https://api.openweathermap.org/data/2.5/weather?q={city_name}&appid={API_KEY}&lang=pt_br&units=metric'
-    else:
-        API_PATH = f'https://api.openweathermap.org/data/2.5/forecast?q={city_name}&appid={API_KEY}&cnt=40&lang=pt_br&units=metric'
+    if not circuit_breaker.allow():
+        raise UpstreamUnavailable('circuito aberto')
+
+    # Faz a solicitação get para a API, cada tentativa retira uma ficha da cota
+    endpoint = 'weather' if current_day else 'forecast'
+    for attempt in range(HTTP_RETRIES + 1):
+        if attempt:
+            time.sleep(retry_delay(attempt))
+        if not upstream_quota.acquire(background):
+            raise quota_exhausted(attempt)
+        start = time.perf_counter()
+        try:
+            with stage('upstream'):
+                requisicao = http_session.get(API_PATH, params=params, timeout=(HTTP_CONNECT_TIMEOUT, HTTP_READ_TIMEOUT))
+        except requests.RequestException as e:
+            error = type(e).__name__
+            observe_upstream(endpoint, error, time.perf_counter() - start)
+            continue
+        observe_upstream(endpoint, str(requisicao.status_code), time.perf_counter() - start)
+        if requisicao.status_code == 429:
+            error = 'status 429'
+            break
+        if requisicao.status_code >= 500:
+            error = f'status {requisicao.status_code}'
+            continue
 
-    # Faz a solicitação get para a API
-    requisicao = requests.get(API_PATH)
+        # Retorna os dados da API como JSON, um corpo inválido (ex: página de erro de um proxy) conta como falha
+        try:
+            data = requisicao.json()
+        except ValueError:
+            error = 'resposta inválida'
+            break
+        circuit_breaker.record_success()
+        return data
 
-    # Retorna os dados da API como JSON
-    return requisicao.json()
+    circuit_breaker.record_failure()
+    raise UpstreamUnavailable(error)
@@ -0,0 +1,165 @@
+import asyncio
+import httpx
+import time
+from metrics import stage, observe_upstream
+from quota import upstream_quota
+from api import (
+    HTTP_CONNECT_TIMEOUT,
+    HTTP_READ_TIMEOUT,
+    HTTP_RETRIES,
+    HTTP_POOL_SIZE,
+    BATCH_MAX_CONCURRENCY,
+    BATCH_MAX_CITIES,
+    UpstreamUnavailable,
+    build_request,
+    retry_delay,
+    quota_exhausted,
+    circuit_breaker,
+    is_valid_response,
+    resolve_city,
+    resolve_coordinates,
+    learn_city,
+    refresh_scheduler,
+    REFRESH_ENABLED,
+)
+from cache import weather_cache, cache_key, CACHE_TTL, WEATHER_COMBINED
+
+
+#Cliente HTTP assíncrono do processo, criado por get_async_client() dentro do loop do servidor ASGI
+async_client = None
+
+
+def get_async_client():
+    """
+    Retorna o cliente HTTP assíncrono (httpx.AsyncClient) com conexões reaproveitadas e os mesmos
+    tempos limite do api.py, criando-o na primeira chamada.
+    """
+    global async_client
+    if async_client is None:
+        async_client = httpx.AsyncClient(
+            timeout=httpx.Timeout(HTTP_READ_TIMEOUT, connect=HTTP_CONNECT_TIMEOUT),
+            limits=httpx.Limits(max_connections=HTTP_POOL_SIZE * 5, max_keepalive_connections=HTTP_POOL_SIZE),
+        )
+    return async_client
+
+
+async def close_async_client():
+    """Encerra o cliente HTTP assíncrono, chamado ao parar o servidor ASGI."""
+    global async_client
+    if async_client is not None:
+        await async_client.aclose()
+        async_client = None
+
+
+async def get_weather_data(city_name=None, current_day=True, city_id=None, coords=None):
+    """
+    Versão assíncrona de api.get_weather_data: mesmo cache, mesmas chaves e mesmo disjuntor,
+    sem bloquear o loop durante a chamada a API.
+
+    Parâmetros:
+    city_name (string): Cidade que é recebido no campo de pesquisa pela api do frontend
+    current_day (bool, opcional): True busca os dados do dia atual, False busca os próximos 5 dias
+    city_id (int, opcional): ID da cidade na OpenWeather, usado no lugar do nome quando informado
+    coords (tuple, opcional): (lat, lon), usado quando o nome e o ID não são informados
+
+    Retorna:
+    dict: Um dicionário contendo informações obtidas da API.
+    """
+    current_day = current_day and not WEATHER_COMBINED
+    endpoint = 'weather' if current_day else 'forecast'
+    cell = None
+    if coords is not None and city_id is None and not city_name:
+        cell, coords, city_id = resolve_coordinates(*coords)
+    city_id = resolve_city(city_name, city_id)
+    key = cache_key(city_name, endpoint, city_id, cell)
+    if REFRESH_ENABLED and (city_name or city_id is not None):
+        refresh_scheduler.record(key, endpoint, city_name, city_id)
+        refresh_scheduler.start()
+    async def fetch():
+        return learn_city(await fetch_weather_data(city_name, current_day, city_id, coords), endpoint, city_id)
+
+    try:
+        return await weather_cache.get_or_fetch_async(
+            key,
+            CACHE_TTL[endpoint],
+            fetch,
+            cacheable=is_valid_response,
+        )
+    except UpstreamUnavailable as e:
+        stale = await weather_cache.get_stale_async(key)
+        if stale is not None:
+            return stale
+        return {"cod": 503, "message": f'Serviço de previsão indisponível: {e}'}
+
+
+async def get_weather_data_batch(queries, current_day=True):
+    """
+    Versão assíncrona de api.get_weather_data_batch, no máximo BATCH_MAX_CONCURRENCY chamadas simultâneas por lote.
+
+    Parâmetros:
+    queries (list): Lista de tuplas (city_name, city_id).
+    current_day (bool, opcional): True busca os dados do dia atual, False busca os próximos 5 dias
+
+    Retorna:
+    list: Os dicionários da API na mesma ordem de queries.
+    """
+    semaphore = asyncio.Semaphore(BATCH_MAX_CONCURRENCY)
+
+    async def fetch(city_name, city_id):
+        async with semaphore:
+            try:
+                return await get_weather_data(city_name, current_day, city_id)
+            except Exception as e:
+                return {"cod": 500, "message": type(e).__name__}
+
+    return await asyncio.gather(*(fetch(city_name, city_id) for city_name, city_id in queries))
+
+
+async def fetch_weather_data(city_name, current_day=True, city_id=None, coords=None):
+    """
+    Versão assíncrona de api.fetch_weather_data.
+
+    Faz até HTTP_RETRIES novas tentativas em erros de conexão e respostas 5xx, com espera
+    exponencial (api.retry_delay), cada tentativa retira uma ficha da cota. Respostas 429 não são repetidas.
+
+    Exceções:
+    UpstreamUnavailable: Se o circuito estiver aberto ou a API continuar falhando após as novas tentativas.
+    QuotaExhausted: Se a cota de chamadas da API estiver esgotada (quota.upstream_quota).
+    """
+    API_PATH, params = build_request(city_name, current_day, city_id, coords)
+
+    if not circuit_breaker.allow():
+        raise UpstreamUnavailable('circuito aberto')
+
+    client = get_async_client()
+    endpoint = 'weather' if current_day else 'forecast'
+    for attempt in range(HTTP_RETRIES + 1):
+        if attempt:
+            await asyncio.sleep(retry_delay(attempt))
+        if not await upstream_quota.acquire_async():
+            raise quota_exhausted(attempt)
+        start = time.perf_counter()
+        try:
+            with stage('upstream'):
+                requisicao = await client.get(API_PATH, params=params)
+        except httpx.HTTPError as e:
+            error = type(e).__name__
+            observe_upstream(endpoint, error, time.perf_counter() - start)
+            continue
+        observe_upstream(endpoint, str(requisicao.status_code), time.perf_counter() - start)
+        if requisicao.status_code == 429:
+            error = 'status 429'
+            break
+        if requisicao.status_code >= 500:
+            error = f'status {requisicao.status_code}'
+            continue
+        try:
+            data = requisicao.json()
+        except ValueError:
+            error = 'resposta inválida'
+            break
+        circuit_breaker.record_success()
+        return data
+
+    circuit_breaker.record_failure()
+    raise UpstreamUnavailable(error)
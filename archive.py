@@ -0,0 +1,374 @@
+"""
+Arquivo do histórico antigo em arquivos Parquet (colunar, comprimido), um arquivo por mês em HISTORIC_ARCHIVE_DIR.
+
+O job de retenção (python archive.py, ou crud.archive_historic) exporta os meses anteriores aos últimos
+HISTORIC_ARCHIVE_MONTHS meses e os remove do banco (DROP da partição no PostgreSQL particionado, DELETE nos demais).
+As leituras do histórico no crud.py continuam no arquivo quando o período consultado passa do início da janela
+do banco (live_start), lendo os arquivos com memória mapeada (mmap) e somente as colunas e grupos de linhas
+necessários (filtros pelas estatísticas do Parquet).
+
+As identidades crescem com a data de gravação, então os meses arquivados têm identidades menores que as do banco
+e a ordem por identidade decrescente é a do banco seguida pelos meses arquivados, do mais recente ao mais antigo.
+
+Uso:
+    python archive.py [--months 12]
+
+Observação:
+Requer o pyarrow (python -m pip install pyarrow), sem ele não há arquivo e o histórico fica somente no banco.
+"""
+import argparse
+import bisect
+import os
+import re
+import threading
+from collections import namedtuple
+from datetime import date, datetime
+from types import SimpleNamespace
+
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+
+
+#Configuração do arquivo do histórico, pode ser ajustada por variáveis de ambiente
+HISTORIC_ARCHIVE_DIR = os.environ.get('HISTORIC_ARCHIVE_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'archive'))
+#Meses mantidos no banco, contando o atual, os anteriores são arquivados pelo job de retenção ('0' não arquiva)
+HISTORIC_ARCHIVE_MONTHS = int(os.environ.get('HISTORIC_ARCHIVE_MONTHS', 12))
+#Compressão dos arquivos Parquet (zstd, snappy, gzip, ...)
+HISTORIC_ARCHIVE_COMPRESSION = os.environ.get('HISTORIC_ARCHIVE_COMPRESSION', 'zstd')
+#Linhas por grupo do Parquet, menor unidade lida do arquivo
+HISTORIC_ARCHIVE_ROW_GROUP = int(os.environ.get('HISTORIC_ARCHIVE_ROW_GROUP', 16384))
+
+#Colunas da tabela historico_previsao_tempo (crud.tableHistoric), na mesma ordem
+ARCHIVE_SCHEMA = pa.schema([
+    ('identidade', pa.int64()),
+    ('cidade', pa.string()),
+    ('data', pa.date32()),
+    ('data_current', pa.timestamp('us')),
+    ('previsao', pa.string()),
+    ('pais', pa.string()),
+    ('vento', pa.string()),
+    ('icon', pa.string()),
+    ('umidade', pa.string()),
+    ('temp', pa.string()),
+    ('temp_max', pa.string()),
+    ('temp_min', pa.string()),
+    ('id', pa.int64()),
+    ('temp_c', pa.float64()),
+    ('temp_max_c', pa.float64()),
+    ('temp_min_c', pa.float64()),
+    ('umidade_pct', pa.float64()),
+    ('vento_kmh', pa.float64()),
+]) if pa is not None else None
+
+ARCHIVE_FILE = re.compile(r'^historico_(\d{4})-(\d{2})\.parquet$')
+
+#Um mês arquivado: primeiro dia, caminho do arquivo, linhas, a menor e maior identidade e os grupos de linhas
+ArchivedMonth = namedtuple('ArchivedMonth', 'month path rows first last groups')
+#Um grupo de linhas do Parquet: menor e maior identidade e data (None sem estatísticas)
+RowGroup = namedtuple('RowGroup', 'first last day_first day_last')
+
+
+def column_range(metadata, index, column):
+    """Menor e maior valor de uma coluna em um grupo de linhas, pelas estatísticas do Parquet, ou (None, None)."""
+    statistics = metadata.row_group(index).column(column).statistics
+    if statistics is None or not statistics.has_min_max:
+        return None, None
+    return statistics.min, statistics.max
+
+
+def add_months(month, count):
+    """
+    Primeiro dia do mês count meses depois (ou antes, count negativo) do mês de uma data.
+
+    Exemplo de Uso:
+    - add_months(date(2023, 11, 20), 2) retorna date(2024, 1, 1)
+    """
+    index = month.year * 12 + month.month - 1 + count
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def archive_condition(after=None, city=None, city_id=None, start=None, end=None):
+    """Filtros de crud.historic_select() como expressão do Arrow, ou None sem filtros."""
+    condition = None
+    for expression in (
+        pc.field('identidade') < after if after is not None else None,
+        pc.field('cidade') == city if city else None,
+        pc.field('id') == city_id if city_id is not None else None,
+        pc.field('data') >= start if start is not None else None,
+        pc.field('data') <= end if end is not None else None,
+    ):
+        if expression is not None:
+            condition = expression if condition is None else condition & expression
+    return condition
+
+
+def group_excluded(group, after=None, start=None, end=None):
+    """True se as estatísticas do grupo de linhas (identidade e data) mostram que nenhuma linha passa nos filtros."""
+    return (
+        (after is not None and group.first is not None and group.first >= after)
+        or (start is not None and group.day_last is not None and group.day_last < start)
+        or (end is not None and group.day_first is not None and group.day_first > end)
+    )
+
+
+def archive_table(rows):
+    """
+    Monta uma tabela do Arrow (ARCHIVE_SCHEMA) a partir de linhas do histórico com as colunas de crud.tableHistoric.
+    data_current gravado como texto em bases antigas (ver README) é convertido para data e hora.
+    """
+    columns = list(zip(*rows)) or [()] * len(ARCHIVE_SCHEMA)
+    arrays = []
+    for field, values in zip(ARCHIVE_SCHEMA, columns):
+        if field.name == 'data_current':
+            values = [datetime.fromisoformat(value) if isinstance(value, str) else value for value in values]
+        arrays.append(pa.array(values, type=field.type))
+    return pa.Table.from_arrays(arrays, schema=ARCHIVE_SCHEMA)
+
+
+class HistoricArchive:
+    """
+    Meses do histórico arquivados em arquivos Parquet, lidos com memória mapeada.
+
+    A lista de meses é relida quando a pasta muda (novos arquivos do job de retenção, de qualquer processo).
+
+    Atributos:
+        directory (str): Pasta dos arquivos.
+        queries (int): Leituras que usaram o arquivo.
+        rows_read (int): Linhas retornadas do arquivo.
+        archived (int): Meses gravados por este processo (job de retenção).
+    """
+    def __init__(self, directory=HISTORIC_ARCHIVE_DIR):
+        self.directory = directory
+        self.queries = 0
+        self.rows_read = 0
+        self.archived = 0
+        self._months = []
+        self._version = None
+        self._lock = threading.Lock()
+
+    def months(self):
+        """Meses arquivados (ArchivedMonth), do mais recente ao mais antigo."""
+        if pa is None:
+            return []
+        try:
+            version = os.stat(self.directory).st_mtime_ns
+        except OSError:
+            return []
+        if version != self._version:
+            with self._lock:
+                if version != self._version:
+                    self._months = self._scan()
+                    self._version = version
+        return self._months
+
+    def _scan(self):
+        months = []
+        for name in os.listdir(self.directory):
+            match = ARCHIVE_FILE.match(name)
+            if not match:
+                continue
+            path = os.path.join(self.directory, name)
+            metadata = pq.read_metadata(path)
+            groups = tuple(
+                RowGroup(*column_range(metadata, index, 0), *column_range(metadata, index, 2))
+                for index in range(metadata.num_row_groups)
+            )
+            identities = [value for group in groups for value in (group.first, group.last) if value is not None]
+            months.append(ArchivedMonth(
+                date(int(match[1]), int(match[2]), 1), path, metadata.num_rows,
+                min(identities, default=None), max(identities, default=None), groups,
+            ))
+        return sorted(months, reverse=True)
+
+    def live_start(self):
+        """Primeiro dia do histórico que ainda está no banco (mês seguinte ao último arquivado), ou None sem arquivo."""
+        months = self.months()
+        return add_months(months[0].month, 1) if months else None
+
+    def last_identity(self):
+        """Maior identidade arquivada, as linhas do banco têm identidades maiores. None sem arquivo."""
+        months = self.months()
+        return max((item.last for item in months if item.last is not None), default=None)
+
+    def reaches(self, start=None):
+        """True se um período a partir de start (None, desde o início) passa do início da janela do banco."""
+        live_start = self.live_start()
+        return live_start is not None and (start is None or start < live_start)
+
+    def blocks(self, limit=None, after=None, city=None, city_id=None, start=None, end=None, batch_size=10000):
+        """
+        Lê o histórico arquivado com os mesmos filtros de crud.historic_select(), ordenado pela identidade
+        em ordem decrescente. Os arquivos estão em ordem de identidade, os grupos de linhas são lidos do último
+        para o primeiro, sem ler os que as estatísticas (identidade e data) excluem, até completar o limit.
+
+        Retorna:
+        generator: Listas de tuplas (identidade, cidade, data), de até batch_size linhas.
+        """
+        condition = archive_condition(after, city, city_id, start, end)
+        remaining = limit
+        with self._lock:
+            self.queries += 1
+        for item in self.months():
+            if remaining is not None and remaining <= 0:
+                break
+            if (start is not None and add_months(item.month, 1) <= start) or (end is not None and item.month > end):
+                continue
+            file = None
+            for index in reversed(range(len(item.groups))):
+                if remaining is not None and remaining <= 0:
+                    break
+                if group_excluded(item.groups[index], after, start, end):
+                    continue
+                file = file or pq.ParquetFile(item.path, memory_map=True)
+                table = file.read_row_group(index, columns=['identidade', 'cidade', 'data', 'id'])
+                if condition is not None:
+                    table = table.filter(condition)
+                table = table.sort_by([('identidade', 'descending')])
+                if remaining is not None:
+                    table = table.slice(0, remaining)
+                    remaining -= table.num_rows
+                with self._lock:
+                    self.rows_read += table.num_rows
+                for offset in range(0, table.num_rows, batch_size):
+                    chunk = table.slice(offset, batch_size)
+                    yield list(zip(*(chunk.column(name).to_pylist() for name in ('identidade', 'cidade', 'data'))))
+            if file is not None:
+                file.close()
+
+    def export_tables(self, city=None, city_id=None, start=None, end=None):
+        """
+        Lê as linhas completas (ARCHIVE_SCHEMA) do histórico arquivado para a exportação, em ordem crescente
+        de identidade, um grupo de linhas do Parquet por vez.
+
+        Retorna:
+        generator: Tabelas do Arrow com as linhas que passam nos filtros.
+        """
+        condition = archive_condition(None, city, city_id, start, end)
+        with self._lock:
+            self.queries += 1
+        for item in reversed(self.months()):
+            if (start is not None and add_months(item.month, 1) <= start) or (end is not None and item.month > end):
+                continue
+            with pq.ParquetFile(item.path, memory_map=True) as file:
+                for index, group in enumerate(item.groups):
+                    if group_excluded(group, None, start, end):
+                        continue
+                    table = file.read_row_group(index)
+                    if condition is not None:
+                        table = table.filter(condition)
+                    with self._lock:
+                        self.rows_read += table.num_rows
+                    if table.num_rows:
+                        yield table
+
+    def select(self, **filters):
+        """Página do histórico arquivado (filtros de blocks()), uma lista de tuplas (identidade, cidade, data)."""
+        return [row for rows in self.blocks(**filters) for row in rows]
+
+    def records(self, identities, columns):
+        """
+        Busca registros arquivados pela identidade, lendo somente os grupos de linhas cujo intervalo de identidades
+        contém alguma delas.
+
+        Parâmetros:
+        identities (iterable): Identidades (int).
+        columns (list): Nomes das colunas (ex: crud.RECORD_COLUMNS).
+
+        Retorna:
+        list: Registros encontrados, com as colunas como atributos (iguais às linhas do banco).
+        """
+        identities = sorted(identities)
+
+        def contains(first, last):
+            position = bisect.bisect_left(identities, first)
+            return position < len(identities) and identities[position] <= last
+
+        found = []
+        value_set = pa.array(identities, type=pa.int64())
+        for item in self.months():
+            if item.first is None or not contains(item.first, item.last):
+                continue
+            indexes = [index for index, group in enumerate(item.groups)
+                       if group.first is None or contains(group.first, group.last)]
+            with pq.ParquetFile(item.path, memory_map=True) as file:
+                table = file.read_row_groups(indexes, columns=list(columns))
+            table = table.filter(pc.is_in(table['identidade'], value_set=value_set))
+            found.extend(SimpleNamespace(**row) for row in table.to_pylist())
+        with self._lock:
+            self.queries += 1
+            self.rows_read += len(found)
+        return found
+
+    def write_month(self, month, blocks):
+        """
+        Grava um mês do histórico em historico_AAAA-MM.parquet, em um arquivo temporário renomeado no final,
+        os leitores nunca veem um arquivo incompleto. Se o mês já estiver arquivado, as linhas são juntadas às do arquivo.
+
+        Parâmetros:
+        month (date): Primeiro dia do mês.
+        blocks (iterable): Blocos de linhas com as colunas de crud.tableHistoric, em ordem de identidade.
+
+        Retorna:
+        int: Linhas gravadas.
+        """
+        if pa is None:
+            raise RuntimeError('O arquivo do histórico requer o pyarrow (python -m pip install pyarrow)')
+        os.makedirs(self.directory, exist_ok=True)
+        path = os.path.join(self.directory, f'historico_{month:%Y-%m}.parquet')
+        temporary = path + '.tmp'
+        existing = pq.read_table(path) if os.path.exists(path) else None
+
+        rows = 0
+        with pq.ParquetWriter(temporary, ARCHIVE_SCHEMA, compression=HISTORIC_ARCHIVE_COMPRESSION) as file:
+            if existing is None:
+                for block in blocks:
+                    if block:
+                        file.write_table(archive_table(block), row_group_size=HISTORIC_ARCHIVE_ROW_GROUP)
+                        rows += len(block)
+            else:
+                table = pa.concat_tables([existing] + [archive_table(block) for block in blocks if block])
+                #primeira ocorrência de cada identidade
+                identities = table['identidade']
+                table = table.take(pc.index_in(pc.unique(identities), value_set=identities)).sort_by('identidade')
+                file.write_table(table, row_group_size=HISTORIC_ARCHIVE_ROW_GROUP)
+                rows = table.num_rows
+        with open(temporary, 'rb') as file:
+            os.fsync(file.fileno())
+        os.replace(temporary, path)
+        with self._lock:
+            self.archived += 1
+        return rows
+
+    def stats(self):
+        months = self.months()
+        with self._lock:
+            return {
+                "enabled": pa is not None,
+                "months": len(months),
+                "rows": sum(item.rows for item in months),
+                "bytes": sum(os.path.getsize(item.path) for item in months if os.path.exists(item.path)),
+                "oldest": months[-1].month.isoformat() if months else None,
+                "live_start": add_months(months[0].month, 1).isoformat() if months else None,
+                "queries": self.queries,
+                "rows_read": self.rows_read,
+                "archived": self.archived,
+            }
+
+
+#Arquivo do histórico compartilhado pelo processo
+historic_archive = HistoricArchive()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Job de retenção: arquiva os meses antigos do histórico')
+    parser.add_argument('--months', type=int, default=HISTORIC_ARCHIVE_MONTHS, help='meses mantidos no banco, contando o atual')
+    args = parser.parse_args()
+
+    import crud
+
+    for month, rows in crud.archive_historic(months=args.months):
+        print(f'{month:%Y-%m}: {rows} registros arquivados')
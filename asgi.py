@@ -0,0 +1,450 @@
+#Import de bibliotecas e modulos
+import asyncio
+from functools import wraps
+from quart import Quart, Response, g, jsonify, request
+from quart.wrappers.response import IterableBody
+import api_async
+import crud_async
+import writer
+from cache import record_cache
+from dates import current_language, set_language
+from cities import city_index, load_city_index, historic_cities, CITY_SUGGEST_LIMIT
+from geo import geo_index
+from models import model_cache
+from profiler import profiler, access_error, parse_session, render_collapsed
+from metrics import stage, request_started, request_finished, register_stats, render, recent_traces, admin_error
+from quota import upstream_quota, rate_limiter
+from archive import historic_archive
+from export import export_historic_async, export_available, EXPORT_FORMATS
+from responses import (
+    FastJSONProvider,
+    add_vary,
+    compress_chunks_async,
+    finalize_body,
+    is_compressible,
+    negotiate_encoding,
+    COMPRESS_ENABLED
+)
+from function import (
+    convert_api_to_current_city,
+    convert_postgres_historic,
+    convert_postgres_json,
+    forecast,
+    build_batch_queries,
+    convert_batch,
+    historic_json_block,
+    parse_historic_filters,
+    convert_rollup_stats,
+    parse_stats_filters,
+    parse_identities,
+    parse_coordinates,
+    join_historic_records
+)
+
+
+#cria uma intância do Quart (mesma API do Flask, com rotas assíncronas)
+app = Quart(__name__)
+
+#JSON das respostas com orjson quando instalado (JSON_PROVIDER)
+app.json = FastJSONProvider(app)
+
+
+@app.before_serving
+async def startup():
+    """
+    Cria o engine assíncrono do banco de dados e carrega o índice de cidades ao iniciar o servidor ASGI.
+    Com server.py e WEB_PRELOAD=1 o índice já foi carregado antes do fork e é compartilhado pelos workers.
+    """
+    crud_async.init_async_engine()
+    if not len(city_index):
+        load_city_index(entries=historic_cities(await crud_async.list_known_cities()))
+
+
+@app.after_serving
+async def shutdown():
+    """Grava a fila do histórico, para a renovação do cache, fecha o cliente HTTP e as conexões do banco de dados ao parar o servidor ASGI."""
+    writer.historic_writer.stop()
+    api_async.refresh_scheduler.stop()
+    await api_async.close_async_client()
+    await crud_async.dispose_async_engine()
+
+
+#contadores dos componentes publicados em /metrics
+register_stats('cache', api_async.weather_cache.stats, 'Cache da API OpenWeather')
+register_stats('record_cache', record_cache.stats, 'Cache dos registros do histórico')
+register_stats('writer', writer.historic_writer.stats, 'Gravação do histórico em segundo plano')
+register_stats('circuit', api_async.circuit_breaker.stats, 'Disjuntor das chamadas a API OpenWeather')
+register_stats('refresh', api_async.refresh_scheduler.stats, 'Renovação do cache em segundo plano')
+register_stats('quota', upstream_quota.stats, 'Cota de chamadas da API OpenWeather')
+register_stats('rate_limit', rate_limiter.stats, 'Limite de requisições por cliente')
+register_stats('archive', historic_archive.stats, 'Arquivo do histórico')
+register_stats('geo', geo_index.stats, 'Índice espacial de cidades')
+register_stats('profiler', profiler.stats, 'Profiler por amostragem')
+register_stats('models', model_cache.stats, 'Modelos normalizados das respostas da API')
+
+
+@app.before_request
+async def start_metrics():
+    """Inicia a medição da requisição, igual ao start_metrics do main.py."""
+    g.metrics = request_started(request.url_rule.rule if request.url_rule else 'unmatched')
+
+
+@app.after_request
+async def response_metrics(response):
+    """Guarda o status da resposta para o registro em finish_metrics."""
+    g.status = response.status_code
+    return response
+
+
+@app.teardown_request
+async def finish_metrics(exception=None):
+    """Registra a latência e o status da requisição, igual ao finish_metrics do main.py."""
+    request_finished(g.pop('metrics', None), request.method, g.pop('status', 500))
+
+
+@app.before_request
+async def limit_client():
+    """Limita as requisições por cliente, igual ao limit_client do main.py."""
+    return rate_limiter.check(request)
+
+
+@app.before_request
+async def select_language():
+    """Define o idioma das datas da requisição, igual ao select_language do main.py."""
+    set_language(request.args.get('lang') or request.headers.get('Accept-Language'))
+
+
+@app.after_request
+async def compress_response(response):
+    """Versão assíncrona do compress_response do main.py (responses.finalize_response)."""
+    if not is_compressible(response.status_code, response.mimetype, response.headers):
+        return response
+    add_vary(response)
+
+    if isinstance(response.response, IterableBody):
+        encoding = negotiate_encoding(request.headers.get('Accept-Encoding')) if COMPRESS_ENABLED else None
+        if encoding is not None:
+            response.response = IterableBody(compress_chunks_async(response.response.iter, encoding))
+            response.headers['Content-Encoding'] = encoding
+            response.headers.pop('Content-Length', None)
+        return response
+
+    body = await response.get_data()
+    with stage('compress'):
+        status, body, headers = finalize_body(body, request.headers, request.method in ('GET', 'HEAD'))
+    response.set_data(body)
+    response.headers.update(headers)
+    if status is not None:
+        response.status_code = status
+        response.headers.pop('Content-Type', None)
+        response.headers.pop('Content-Length', None)
+    return response
+
+
+@app.route('/weather', methods=['GET'])
+async def get_weather():
+    """
+    Versão assíncrona da rota /weather do main.py, com o mesmo contrato JSON.
+
+    Exemplo de Uso:
+    - URL: /weather?city=Osorio
+    - Retorna: JSON com dados da previsão do tempo atual de Osorio.
+    - URL: /weather?lat=-29.8864&lon=-50.2697
+    - Retorna: JSON com dados da previsão do tempo atual da cidade mais próxima das coordenadas.
+
+    """
+    city_name = request.args.get('city')
+    try:
+        coords = parse_coordinates(request.args)
+    except ValueError:
+        return jsonify({'error': 'lat e lon devem ser números, com lat entre -90 e 90 e lon entre -180 e 180'}), 400
+    if city_name or coords:
+        weather_data = await api_async.get_weather_data(city_name, coords=coords)
+        with stage('convert'):
+            extracted_weather_data = convert_api_to_current_city(weather_data)
+        if writer.WRITE_BEHIND:
+            writer.historic_writer.put(extracted_weather_data)
+        else:
+            try:
+                await crud_async.insert_weather_historic(extracted_weather_data)
+            except Exception as e:
+                writer.historic_writer.record_failure(1, e)
+        return jsonify(extracted_weather_data)
+    else:
+        return jsonify({'error': 'Nome da cidade incorreto ou não encontrado'}), 400
+
+
+@app.route('/historic', methods=['GET'])
+async def get_historic():
+    """
+    Versão assíncrona da rota /historic do main.py, com os mesmos parâmetros de paginação e filtros.
+
+    Exemplo de Uso:
+    - URL: /historic
+    - Retorna: JSON com os dados históricos de previsões de tempo.
+
+    """
+    try:
+        filters = parse_historic_filters(request.args)
+    except ValueError:
+        return jsonify({'error': 'Parâmetros de filtro ou paginação inválidos'}), 400
+
+    if 'limit' not in filters:
+        language = current_language.get()
+
+        async def generate():
+            yield '['
+            separator = ''
+            async for rows in crud_async.stream_data_historic(**filters):
+                if rows:
+                    yield separator + historic_json_block(rows, language, app.json.dumps_compact)
+                    separator = ','
+            yield ']'
+
+        return Response(generate(), mimetype='application/json')
+
+    filters['limit'] = min(filters['limit'], crud_async.HISTORIC_MAX_LIMIT)
+    data_historic = await crud_async.get_data_historic(**filters)
+    if data_historic is None:
+        return jsonify({'error': 'Histórico indisponível, tente novamente'}), 503
+    with stage('convert'):
+        json_historic = convert_postgres_historic(data_historic)
+    response = jsonify(json_historic)
+    if len(data_historic) == filters['limit']:
+        response.headers['X-Next-After'] = str(data_historic[-1][0])
+    return response
+
+
+@app.route('/export', methods=['GET'])
+async def get_export():
+    """
+    Versão assíncrona da rota /export do main.py, com os mesmos formatos e filtros.
+
+    Exemplo de Uso:
+    - URL: /export?format=csv
+    - Retorna: o histórico inteiro em CSV.
+
+    """
+    export_format = request.args.get('format', 'csv')
+    if not export_available(export_format):
+        return jsonify({'error': f'Formato inválido ou indisponível, use um de: {", ".join(EXPORT_FORMATS)}'}), 400
+    try:
+        filters = parse_historic_filters(request.args)
+    except ValueError:
+        return jsonify({'error': 'Parâmetros de filtro inválidos'}), 400
+    filters.pop('limit', None)
+    filters.pop('after', None)
+
+    response = Response(export_historic_async(export_format, **filters), mimetype=EXPORT_FORMATS[export_format])
+    response.headers['Content-Disposition'] = f'attachment; filename=historico.{export_format}'
+    return response
+
+
+@app.route('/listHistoric', methods=['GET'])
+async def get_list_historic():
+    """
+    Versão assíncrona da rota /listHistoric do main.py, com o mesmo contrato JSON.
+
+    Exemplo de Uso:
+    - URL: /listHistoric?identidade=1 ou /listHistoric?identidade=1,2,3
+
+    """
+    identify = request.args.get('identidade')
+    if not identify:
+        return jsonify({'error': 'Erro ao buscar histórico'}), 400
+    try:
+        identities = parse_identities(identify)
+    except ValueError:
+        return jsonify({'error': 'identidade deve ser um número, ou números separados por vírgula'}), 400
+    if not identities or len(identities) > crud_async.HISTORIC_MAX_LIMIT:
+        return jsonify({'error': f'Informe de 1 a {crud_async.HISTORIC_MAX_LIMIT} identidades'}), 400
+
+    encode = lambda row: app.json.dumps(convert_postgres_json(row)).encode()
+    records = await record_cache.get_or_load_async(identities, current_language.get(), crud_async.list_historic_many, encode)
+    body = join_historic_records(identities, records, encode(None), many=',' in identify)
+    return Response(body, mimetype='application/json')
+
+
+@app.route('/forecast', methods=['GET'])
+async def get_forecast():
+    """
+    Versão assíncrona da rota /forecast do main.py, com o mesmo contrato JSON.
+
+    Exemplo de Uso:
+    - URL: /forecast?city=Osorio
+    - Retorna: JSON com a previsão detalhada do tempo para os próximos dias em Osorio(5 dias max).
+
+    """
+    city_name = request.args.get('city')
+    try:
+        coords = parse_coordinates(request.args)
+    except ValueError:
+        return jsonify({'error': 'lat e lon devem ser números, com lat entre -90 e 90 e lon entre -180 e 180'}), 400
+    if city_name or coords:
+        weather_data = await api_async.get_weather_data(city_name, current_day=False, coords=coords)
+        with stage('convert'):
+            extracted_weather_data = forecast(weather_data)
+        return jsonify(extracted_weather_data)
+    else:
+        return jsonify({'error': 'Nome da cidade incorreto ou não encontrado'}), 400
+
+
+@app.route('/stats', methods=['GET'])
+async def get_stats():
+    """
+    Versão assíncrona da rota /stats do main.py, com o mesmo contrato JSON.
+
+    Exemplo de Uso:
+    - URL: /stats?city=Osório&period=month&last=12
+
+    """
+    try:
+        filters = parse_stats_filters(request.args)
+    except ValueError:
+        return jsonify({'error': 'Informe city ou id, period (week ou month) e last válidos'}), 400
+
+    data_stats = await crud_async.get_weather_stats(**filters)
+    return jsonify(convert_rollup_stats(data_stats or []))
+
+
+@app.route('/cities', methods=['GET'])
+async def get_cities():
+    """
+    Versão assíncrona da rota /cities (autocompletar) do main.py, com o mesmo contrato JSON.
+
+    Exemplo de Uso:
+    - URL: /cities?q=oso
+
+    """
+    prefix = request.args.get('q')
+    try:
+        limit = min(int(request.args.get('limit', CITY_SUGGEST_LIMIT)), 100)
+    except ValueError:
+        return jsonify({'error': 'limit deve ser um número'}), 400
+    if not prefix:
+        return jsonify({'error': 'Informe o início do nome da cidade em q'}), 400
+    return jsonify(city_index.suggest(prefix, limit, request.args.get('country')))
+
+
+async def get_batch(current_day):
+    """
+    Versão assíncrona de get_batch do main.py, as cidades são buscadas com asyncio.gather.
+    """
+    body = await request.get_json(silent=True) or {}
+    try:
+        queries = build_batch_queries(
+            request.args.getlist('cities') + list(body.get('cities', [])),
+            request.args.getlist('ids') + [str(city_id) for city_id in body.get('ids', [])],
+        )
+    except ValueError:
+        return jsonify({'error': 'IDs de cidade devem ser números'}), 400
+
+    if not queries:
+        return jsonify({'error': 'Nenhuma cidade informada'}), 400
+    if len(queries) > api_async.BATCH_MAX_CITIES:
+        return jsonify({'error': f'Máximo de {api_async.BATCH_MAX_CITIES} cidades por requisição'}), 400
+
+    weather_data = await api_async.get_weather_data_batch(queries, current_day)
+    with stage('convert'):
+        extracted_weather_data = convert_batch(queries, weather_data, current_day)
+    if current_day:
+        if writer.WRITE_BEHIND:
+            writer.save_weather_historic_many(extracted_weather_data)
+        else:
+            try:
+                await crud_async.insert_weather_historic_many(extracted_weather_data)
+            except Exception as e:
+                writer.historic_writer.record_failure(sum(1 for dados in extracted_weather_data if dados.get('code') == 1), e)
+    return jsonify(extracted_weather_data)
+
+
+@app.route('/weatherBatch', methods=['GET', 'POST'])
+async def get_weather_batch():
+    """
+    Versão assíncrona da rota /weatherBatch do main.py, com o mesmo contrato JSON.
+
+    Exemplo de Uso:
+    - URL: /weatherBatch?cities=Osorio,Torres
+
+    """
+    return await get_batch(current_day=True)
+
+
+@app.route('/forecastBatch', methods=['GET', 'POST'])
+async def get_forecast_batch():
+    """
+    Versão assíncrona da rota /forecastBatch do main.py, com o mesmo contrato JSON.
+
+    Exemplo de Uso:
+    - URL: /forecastBatch?cities=Osorio,Torres
+
+    """
+    return await get_batch(current_day=False)
+
+
+def admin_route(view):
+    """Versão assíncrona do decorador admin_route do main.py (token de administração, ADMIN_TOKEN)."""
+    @wraps(view)
+    async def wrapper(*args, **kwargs):
+        error = admin_error(request.headers)
+        if error:
+            return jsonify({'error': error[0]}), error[1]
+        return await view(*args, **kwargs)
+    return wrapper
+
+
+@app.route('/metrics', methods=['GET'])
+@admin_route
+async def get_metrics():
+    """Versão assíncrona da rota /metrics do main.py, com o mesmo token de administração (ADMIN_TOKEN)."""
+    return Response(render(), mimetype='text/plain; version=0.0.4')
+
+
+@app.route('/traces', methods=['GET'])
+@admin_route
+async def get_traces():
+    """Versão assíncrona da rota /traces do main.py, com o mesmo token de administração (ADMIN_TOKEN)."""
+    return jsonify(recent_traces())
+
+
+@app.route('/profile', methods=['GET'])
+async def get_profile():
+    """
+    Versão assíncrona da rota /profile do main.py. As requisições do servidor ASGI rodam no loop, sem uma thread
+    por requisição, então são amostradas todas as threads do processo, inclusive a do loop (scope é sempre 'all').
+    A perfilagem por requisição (X-Profile) existe somente no main.py.
+
+    Exemplo de Uso:
+    - URL: /profile?seconds=30 (com o cabeçalho X-Profile-Token)
+
+    """
+    error = access_error(request.headers)
+    if error:
+        return jsonify({'error': error[0]}), error[1]
+    try:
+        seconds, _ = parse_session(request.args)
+    except ValueError:
+        return jsonify({'error': 'seconds deve ser um número entre 0 e PROFILER_MAX_SECONDS, scope requests ou all'}), 400
+
+    session = profiler.start('all', exclude=())
+    try:
+        await asyncio.sleep(seconds)
+    finally:
+        profiler.stop(session)
+    response = Response(render_collapsed(session.stacks), mimetype='text/plain')
+    response.headers['Content-Disposition'] = 'attachment; filename=profile.collapsed'
+    return response
+
+
+if __name__ == '__main__':
+    """
+    Inicia o servidor ASGI (uvicorn) na máquina local, no host 127.0.0.1, na porta 5000.
+
+    Exemplo de Uso:
+    - python asgi.py
+    - uvicorn asgi:app --host 127.0.0.1 --port 5000
+
+    """
+    import uvicorn
+
+    uvicorn.run(app, host='127.0.0.1', port=5000)
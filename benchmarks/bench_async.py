@@ -0,0 +1,124 @@
+"""
+Teste de carga comparando o modo síncrono (main.py, Flask) com o modo assíncrono (asgi.py, Quart/uvicorn).
+
+Os dois servidores usam o stub local da OpenWeatherMap com 200 ms de latência e um banco SQLite
+temporário (ou DATABASE_URL). O cache é desativado (TTL 0) para que toda requisição chame a API.
+O servidor síncrono atende com um número fixo de threads, como um worker de produção.
+
+Uso:
+    python benchmarks/bench_async.py [--requests 400] [--concurrency 50] [--sync-threads 8] [--latency 0.2]
+"""
+import argparse
+import asyncio
+import os
+import random
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from stub_upstream import start_stub, disable_limits
+
+
+class PooledWSGIServer:
+    """Servidor WSGI do werkzeug com um número fixo de threads de atendimento."""
+
+    def __init__(self, app, threads):
+        from werkzeug.serving import ThreadedWSGIServer, WSGIRequestHandler
+
+        executor = ThreadPoolExecutor(threads)
+
+        class Server(ThreadedWSGIServer):
+            def process_request(self, request, client_address):
+                executor.submit(self.process_request_thread, request, client_address)
+
+        class QuietHandler(WSGIRequestHandler):
+            def log_request(self, *args, **kwargs):
+                pass
+
+        self.server = Server('127.0.0.1', 0, app, handler=QuietHandler)
+        self.url = f'http://127.0.0.1:{self.server.server_address[1]}'
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+
+def start_asgi(app):
+    import uvicorn
+
+    server = uvicorn.Server(uvicorn.Config(app, host='127.0.0.1', port=0, log_level='warning', lifespan='on'))
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.05)
+    port = server.servers[0].sockets[0].getsockname()[1]
+    return server, f'http://127.0.0.1:{port}'
+
+
+async def load(base_url, total, concurrency):
+    """Dispara total requisições com no máximo concurrency simultâneas e retorna as latências em segundos."""
+    import httpx
+
+    latencies = []
+    errors = 0
+    semaphore = asyncio.Semaphore(concurrency)
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+
+    async with httpx.AsyncClient(base_url=base_url, timeout=60, limits=limits) as client:
+        async def one(i):
+            nonlocal errors
+            route = random.choice(['/weather', '/forecast', '/weather', '/historic'])
+            params = {} if route == '/historic' else {'city': f'Cidade {random.randint(0, 5000)}'}
+            async with semaphore:
+                start = time.perf_counter()
+                response = await client.get(route, params=params)
+                latencies.append(time.perf_counter() - start)
+                if response.status_code != 200:
+                    errors += 1
+
+        start = time.perf_counter()
+        await asyncio.gather(*(one(i) for i in range(total)))
+        elapsed = time.perf_counter() - start
+    return latencies, elapsed, errors
+
+
+def report(name, latencies, elapsed, errors):
+    latencies = sorted(latencies)
+    p50 = statistics.median(latencies) * 1000
+    p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))] * 1000
+    print(f'{name:<28} {len(latencies) / elapsed:>8.1f} req/s   p50 {p50:>8.1f} ms   p99 {p99:>8.1f} ms   erros {errors}')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Carga: Flask síncrono x ASGI assíncrono')
+    parser.add_argument('--requests', type=int, default=400)
+    parser.add_argument('--concurrency', type=int, default=50)
+    parser.add_argument('--sync-threads', type=int, default=8)
+    parser.add_argument('--latency', type=float, default=0.2)
+    args = parser.parse_args()
+
+    stub = start_stub(latency=args.latency)
+    os.environ['OPENWEATHER_BASE_URL'] = stub.base_url
+    disable_limits()
+    os.environ['CACHE_TTL_WEATHER'] = '0'
+    os.environ['CACHE_TTL_FORECAST'] = '0'
+    os.environ.setdefault('DATABASE_URL', 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'bench_async.db'))
+
+    import crud
+    import main
+    import asgi
+
+    crud.Base.metadata.create_all(crud.get_engine())
+
+    sync_server = PooledWSGIServer(main.app, args.sync_threads)
+    asgi_server, asgi_url = start_asgi(asgi.app)
+
+    print(f'{args.requests} requisições, {args.concurrency} simultâneas, API com {args.latency * 1000:.0f} ms de latência')
+    report(f'Flask ({args.sync_threads} threads)', *asyncio.run(load(sync_server.url, args.requests, args.concurrency)))
+    report('ASGI (asyncio)', *asyncio.run(load(asgi_url, args.requests, args.concurrency)))
+
+    asgi_server.should_exit = True
+    sync_server.server.shutdown()
+    stub.shutdown()
@@ -0,0 +1,52 @@
+"""
+Compara N chamadas sequenciais a /weather com uma chamada a /weatherBatch para as mesmas N cidades.
+
+Usa o stub local da OpenWeatherMap (200 ms de latência por padrão), banco SQLite temporário
+(ou DATABASE_URL) e o cliente de teste do Flask. O cache é desativado (TTL 0).
+
+Uso:
+    python benchmarks/bench_batch.py [quantidade_de_cidades] [latencia]
+"""
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from stub_upstream import start_stub, disable_limits
+
+
+if __name__ == '__main__':
+    total = int(sys.argv[1]) if len(sys.argv) > 1 else 40
+    latency = float(sys.argv[2]) if len(sys.argv) > 2 else 0.2
+
+    stub = start_stub(latency=latency)
+    os.environ['OPENWEATHER_BASE_URL'] = stub.base_url
+    disable_limits()
+    os.environ['CACHE_TTL_WEATHER'] = '0'
+    os.environ['CACHE_TTL_FORECAST'] = '0'
+    os.environ.setdefault('DATABASE_URL', 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'bench_batch.db'))
+
+    import crud
+    import main
+
+    crud.Base.metadata.create_all(crud.get_engine())
+    client = main.app.test_client()
+    cities = [f'Cidade {i}' for i in range(total)]
+
+    start = time.perf_counter()
+    for city in cities:
+        client.get('/weather', query_string={'city': city})
+    sequential = time.perf_counter() - start
+
+    start = time.perf_counter()
+    response = client.post('/weatherBatch', json={'cities': [f'Outra {i}' for i in range(total)]})
+    batch = time.perf_counter() - start
+
+    found = sum(1 for item in response.get_json() if item['code'] == 1)
+    print(f'{total} cidades, API com {latency * 1000:.0f} ms de latência')
+    print(f'/weather sequencial   {sequential:>7.2f} s')
+    print(f'/weatherBatch         {batch:>7.2f} s   ({found} encontradas, {sequential / batch:.1f}x mais rápido)')
+    stub.shutdown()
@@ -0,0 +1,62 @@
+"""
+Benchmark do índice de cidades (cities.CityIndex).
+
+Monta o índice com N cidades (padrão 200.000, nomes gerados com acentos, ou o city.list.json da OpenWeather
+informado em CITY_LIST_FILE) e mede o tempo de montagem, a memória ocupada e o tempo médio de
+busca por nome (lookup) e por prefixo (suggest, autocompletar).
+
+Uso:
+    python benchmarks/bench_cities.py [quantidade_de_cidades]
+"""
+import os
+import random
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from cities import CityIndex, read_city_list, CITY_LIST_FILE
+
+SYLLABLES = ['sa', 'são', 'jo', 'sé', 'po', 'rto', 'a', 'le', 'gre', 'o', 'só', 'rio', 'ma', 'ri', 'ná', 'cu', 'ri', 'ti', 'ba',
+             'flo', 'ri', 'a', 'nó', 'po', 'lis', 'bra', 'sí', 'lia', 'be', 'lém', 'na', 'tal', 'gua', 'í', 'ba', 'çu']
+COUNTRIES = ['BR', 'BR', 'BR', 'PT', 'AR', 'US', 'ES', 'IT', 'MX', 'CO']
+
+
+def generated_cities(total, seed=42):
+    rnd = random.Random(seed)
+    for city_id in range(1, total + 1):
+        words = [''.join(rnd.choice(SYLLABLES) for _ in range(rnd.randint(2, 4))) for _ in range(rnd.randint(1, 3))]
+        yield ' '.join(word.capitalize() for word in words), rnd.choice(COUNTRIES), city_id
+
+
+def per_call(func, queries):
+    start = time.perf_counter()
+    for query in queries:
+        func(query)
+    return (time.perf_counter() - start) / len(queries) * 1e6
+
+
+if __name__ == '__main__':
+    total = int(sys.argv[1]) if len(sys.argv) > 1 else 200000
+    entries = list(read_city_list(CITY_LIST_FILE)) if CITY_LIST_FILE else list(generated_cities(total))
+
+    tracemalloc.start()
+    start = time.perf_counter()
+    index = CityIndex(entries)
+    elapsed = time.perf_counter() - start
+    memory = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    print(f'{len(index)} cidades, montagem {elapsed * 1000:.0f} ms, {memory / 1024 / 1024:.1f} MiB')
+
+    rnd = random.Random(1)
+    sample = [rnd.choice(entries) for _ in range(20000)]
+    exact = [name for name, _, _ in sample]
+    variants = [' ' + name.upper().replace('Ã', 'A').replace('É', 'E') + ' ' for name, _, _ in sample]
+    prefixes = [index.keys[rnd.randrange(len(index))][:rnd.randint(2, 5)] for _ in range(20000)]
+
+    print(f'{"lookup (nome exato)":<32} {per_call(index.lookup, exact):>8.2f} µs')
+    print(f'{"lookup (sem acento, maiúsculo)":<32} {per_call(index.lookup, variants):>8.2f} µs')
+    print(f'{"suggest (prefixo, 10 cidades)":<32} {per_call(index.suggest, prefixes):>8.2f} µs')
+    print(f'{"suggest (prefixo, país BR)":<32} {per_call(lambda prefix: index.suggest(prefix, country="BR"), prefixes):>8.2f} µs')
+    print(f'{"add (cidade nova)":<32} {per_call(lambda i: index.add(f"Nova Cidade {i}", "BR", 9000000 + i), range(1000)):>8.2f} µs')
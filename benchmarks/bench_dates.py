@@ -0,0 +1,60 @@
+"""
+Benchmark da formatação de datas do histórico (function.format_datetime).
+
+Formata N linhas do histórico (padrão 1.000.000, com 365 datas diferentes) com:
+    - strftime("%A, %d de %B de %Y"), como era antes (com o locale do processo, sem setlocale)
+    - convert_postgres_historic, com as tabelas e o cache de dates.py
+    - convert_postgres_historic em 4 threads com idiomas diferentes, conferindo que não há mistura de idiomas
+
+Uso:
+    python benchmarks/bench_dates.py [quantidade_de_linhas]
+"""
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from dates import format_ordinal, set_language
+from function import convert_postgres_historic
+
+
+def strftime_historic(dados):
+    """Versão anterior do convert_postgres_historic, com strftime."""
+    return [{"identidade": identity, "cidade": city, "data": data.strftime("%A, %d de %B de %Y")} for identity, city, data in dados]
+
+
+def measure(name, func):
+    start = time.perf_counter()
+    func()
+    elapsed = time.perf_counter() - start
+    print(f'{name:<36} {elapsed * 1000:>10.1f} ms')
+
+
+def check_language(rows, language, expected):
+    set_language(language)
+    return all(item["data"].startswith(expected) for item in convert_postgres_historic(rows))
+
+
+if __name__ == '__main__':
+    total = int(sys.argv[1]) if len(sys.argv) > 1 else 1000000
+    today = date.today()
+    rows = [(i, f'Cidade {i % 500}', today - timedelta(days=i % 365)) for i in range(total)]
+    print(f'{total} linhas, 365 datas diferentes')
+
+    measure('strftime (antigo)', lambda: strftime_historic(rows))
+    format_ordinal.cache_clear()
+    measure('dates.py (cache vazio)', lambda: convert_postgres_historic(rows, 'pt'))
+    measure('dates.py (cache cheio)', lambda: convert_postgres_historic(rows, 'pt'))
+    print(format_ordinal.cache_info())
+
+    #uma data fixa (domingo) para conferir o idioma de cada thread
+    sunday = [(i, 'Osório', date(2023, 8, 20)) for i in range(total // 4)]
+    languages = [('pt', 'domingo'), ('en', 'Sunday'), ('es', 'domingo'), ('pt-BR,pt;q=0.9', 'domingo')] * 2
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        start = time.perf_counter()
+        results = list(executor.map(lambda item: check_language(sunday, *item), languages))
+        elapsed = time.perf_counter() - start
+    print(f'{"8 x " + str(len(sunday)) + " linhas em 4 threads":<36} {elapsed * 1000:>10.1f} ms   idiomas corretos: {all(results)}')
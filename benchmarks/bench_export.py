@@ -0,0 +1,84 @@
+"""
+Benchmark da exportação do histórico (/export) x paginação de /historic seguida de /listHistoric.
+
+Popula o histórico com N linhas (padrão 200.000) em um SQLite temporário (ou DATABASE_URL) e mede tempo, linhas
+por segundo e pico de memória alocada (tracemalloc) de:
+    - /export em CSV, NDJSON e Arrow (o Arrow requer o pyarrow), lido em streaming
+    - o caminho antigo: páginas de /historic?limit=1000 e uma chamada a /listHistoric por registro, em uma amostra
+      de --sample registros, com o tempo estimado para todas as linhas
+
+Uso:
+    python benchmarks/bench_export.py [quantidade_de_linhas] [--sample 2000]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench_historic import seed
+
+
+def measure(name, func, rows):
+    tracemalloc.start()
+    start = time.perf_counter()
+    size = func()
+    elapsed = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    print(f'{name:<32} {elapsed:>8.2f} s   {rows / elapsed:>10.0f} linhas/s   pico {peak / 1024 / 1024:>7.1f} MiB'
+          f'   {size / 1024 / 1024:>8.1f} MiB de resposta')
+    return elapsed
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='/export x /historic + /listHistoric')
+    parser.add_argument('total', type=int, nargs='?', default=200000)
+    parser.add_argument('--sample', type=int, default=2000, help='registros lidos um a um pelo caminho antigo')
+    args = parser.parse_args()
+    os.environ.setdefault('DATABASE_URL', 'sqlite:///' + os.path.join(tempfile.gettempdir(), f'bench_historic_{args.total}.db'))
+
+    import crud
+    import main
+    from export import export_available
+
+    seed(crud, args.total)
+    client = main.app.test_client()
+    print(f'{args.total} linhas no histórico')
+
+    def export(export_format):
+        def run():
+            response = client.get(f'/export?format={export_format}', buffered=False)
+            size = sum(len(chunk) for chunk in response.response)
+            response.close()
+            return size
+        return run
+
+    for export_format in ('csv', 'ndjson', 'arrow'):
+        if export_available(export_format):
+            measure(f'/export?format={export_format}', export(export_format), args.total)
+        else:
+            print(f'/export?format={export_format}: pyarrow não instalado')
+
+    def paginated():
+        size = 0
+        after = None
+        read = 0
+        while read < args.sample:
+            page = client.get('/historic?limit=1000' + (f'&after={after}' if after else ''))
+            records = page.get_json()
+            if not records:
+                break
+            for record in records[:args.sample - read]:
+                size += len(client.get(f'/listHistoric?identidade={record["identidade"]}').get_data())
+            read += len(records)
+            after = page.headers.get('X-Next-After')
+            if after is None:
+                break
+        return size
+
+    elapsed = measure(f'/historic + /listHistoric ({args.sample})', paginated, args.sample)
+    print(f'{"":<32} estimado para {args.total} linhas: {elapsed * args.total / args.sample:.0f} s')
@@ -0,0 +1,70 @@
+"""
+Micro-benchmark do agrupamento da previsão de 5 dias (function.forecast / forecast_many).
+
+Compara o laço em Python puro da versão anterior com o agrupamento vetorizado (aggregation.py),
+para 1 e 1.000 previsões (respostas do stub_upstream.py). As respostas do stub são dicionários fora do cache da API,
+então forecast() converte o modelo a cada chamada, exceto na linha 'modelo em cache', que mede a resposta repetida do
+cache da API (cache.CachedResponse, com o modelo guardado).
+
+Uso:
+    python benchmarks/bench_forecast.py
+"""
+import os
+import sys
+import time
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from stub_upstream import forecast_payload
+from cache import cached_response
+from function import forecast, forecast_many, format_logo, format_datetime
+
+
+def forecast_loop(data):
+    """Versão anterior do function.forecast, mantida aqui como referência."""
+    daily_data = {}
+    data_clean = []
+    for item in data['list']:
+        date = item['dt_txt'].split()[0]
+        if date != str(datetime.now().date()):
+            if date not in daily_data:
+                daily_data[date] = {
+                    'temp_max': item['main']['temp_max'], 'temp_min': item['main']['temp_min'],
+                    'previsao': item['weather'][0]['description'], 'icon': format_logo(item['weather'][0]['icon']),
+                    'vento': item['wind']['speed'], 'umidade': item['main']['humidity'], 'temp': item['main']['temp'],
+                }
+            else:
+                if item['main']['temp_max'] > daily_data[date]['temp_max']:
+                    daily_data[date]['temp_max'] = item['main']['temp_max']
+                if item['main']['temp_min'] < daily_data[date]['temp_min']:
+                    daily_data[date]['temp_min'] = item['main']['temp_min']
+    for date, values in daily_data.items():
+        data_clean.append({
+            "previsao": values["previsao"], "vento": f'{values["vento"]} Km/h', "icon": values['icon'],
+            "umidade": f'{values["umidade"]}%', "temp": f'{values["temp"]} °C', "temp_max": f'{values["temp_max"]} °C',
+            "temp_min": f'{values["temp_min"]} °C', "data": format_datetime(datetime.strptime(date, '%Y-%m-%d')),
+        })
+    return data_clean
+
+
+def measure(name, func, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        func()
+    elapsed = (time.perf_counter() - start) / repeat
+    print(f'{name:<42} {elapsed * 1000:>10.3f} ms')
+
+
+if __name__ == '__main__':
+    one = forecast_payload('Osorio')
+    many = [forecast_payload(f'Cidade {i}') for i in range(1000)]
+
+    measure('1 previsão - laço Python', lambda: forecast_loop(one), 2000)
+    measure('1 previsão - vetorizado', lambda: forecast(one), 2000)
+    cached = cached_response(one)
+    measure('1 previsão - modelo em cache', lambda: forecast(cached), 2000)
+    measure('1.000 previsões - laço Python', lambda: [forecast_loop(data) for data in many], 5)
+    measure('1.000 previsões - vetorizado, uma por vez', lambda: [forecast(data) for data in many], 5)
+    measure('1.000 previsões - vetorizado, em lote', lambda: forecast_many(many), 5)
@@ -0,0 +1,108 @@
+"""
+Simulação das consultas por coordenadas (lat/lon) com a grade de geohash e o índice espacial de cidades.
+
+Sorteia --cities cidades em uma região (por padrão o Rio Grande do Sul) e --requests consultas de usuários em
+volta de --hotspots pontos de concentração (cidades com popularidade Zipf, deslocamento normal de --spread km),
+e envia as consultas a api.get_weather_data contra o stub local da OpenWeatherMap. Para cada precisão do geohash
+e cada modo mostra as chamadas a API, a taxa de acertos do cache, as chaves do cache e o erro de posição
+(distância do usuário até a cidade ou ao centro da célula usada na resposta):
+    - grade: somente a célula do geohash (GEO_NEAREST_MAX_KM=0)
+    - grade + catálogo: cidade mais próxima do centro da célula com o índice carregado (city.list.json)
+    - grade + aprendidas: índice vazio, preenchido pelas respostas da API
+Todas as consultas acontecem dentro do TTL do cache.
+
+Uso:
+    python benchmarks/bench_geo.py [--cities 500] [--requests 20000] [--hotspots 40] [--spread 5]
+"""
+import argparse
+import math
+import os
+import random
+import statistics
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from stub_upstream import start_stub, disable_limits
+
+#Região das cidades sorteadas (lat_min, lat_max, lon_min, lon_max)
+REGION = (-33.5, -27.2, -57.5, -49.7)
+ZIPF_S = 1.1
+
+
+def workload(rnd):
+    """Sorteia o catálogo de cidades e as coordenadas das consultas."""
+    lat_min, lat_max, lon_min, lon_max = REGION
+    catalog = [(rnd.uniform(lat_min, lat_max), rnd.uniform(lon_min, lon_max), 4000000 + index) for index in range(args.cities)]
+    hotspots = rnd.sample(catalog, args.hotspots)
+    weights = [1 / (rank ** ZIPF_S) for rank in range(1, len(hotspots) + 1)]
+    points = []
+    for lat, lon, _ in rnd.choices(hotspots, weights, k=args.requests):
+        points.append((lat + rnd.gauss(0, args.spread) / 111.2,
+                       lon + rnd.gauss(0, args.spread) / (111.2 * math.cos(math.radians(lat)))))
+    return catalog, points
+
+
+def run(api, cache, geo, stub, catalog, points, precision, max_km, load_catalog):
+    """Executa as consultas com uma configuração e retorna as métricas."""
+    api.weather_cache.backend = cache.MemoryBackend(max_entries=len(points) + 1)
+    api.GEO_GRID_PRECISION = precision
+    api.GEO_NEAREST_MAX_KM = max_km
+    geo.geo_index.build(catalog if load_catalog else ())
+    positions = {city_id: (lat, lon) for lat, lon, city_id in catalog}
+    hits_before, misses_before = api.weather_cache.hits, api.weather_cache.misses
+    calls_before = stub.calls
+    keys = set()
+    errors = []
+    for lat, lon in points:
+        cell, center, city_id = api.resolve_coordinates(lat, lon)
+        data = api.get_weather_data(coords=(lat, lon))
+        if city_id is None:
+            keys.add(cell)
+            errors.append(geo.distance_km(lat, lon, *center))
+            positions.setdefault(data['id'], center)
+        else:
+            keys.add(city_id)
+            errors.append(geo.distance_km(lat, lon, *positions[city_id]))
+    hits = api.weather_cache.hits - hits_before
+    misses = api.weather_cache.misses - misses_before
+    errors.sort()
+    return {
+        "calls": stub.calls - calls_before,
+        "hit_rate": hits / max(1, hits + misses),
+        "keys": len(keys),
+        "error": statistics.mean(errors),
+        "error_p95": errors[int(len(errors) * 0.95)],
+    }
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Consultas por coordenadas com a grade de geohash')
+    parser.add_argument('--cities', type=int, default=500)
+    parser.add_argument('--requests', type=int, default=20000)
+    parser.add_argument('--hotspots', type=int, default=40)
+    parser.add_argument('--spread', type=float, default=5, help='desvio padrão em km em volta de cada ponto')
+    parser.add_argument('--max-km', type=float, default=10, help='raio da busca da cidade mais próxima')
+    args = parser.parse_args()
+
+    stub = start_stub()
+    os.environ['OPENWEATHER_BASE_URL'] = stub.base_url
+    disable_limits()
+    os.environ['CITY_RESOLVE_IDS'] = '1'
+
+    import api
+    import cache
+    import geo
+
+    catalog, points = workload(random.Random(42))
+    print(f'{args.requests} consultas em volta de {args.hotspots} pontos (desvio de {args.spread} km), '
+          f'{args.cities} cidades no catálogo, raio de {args.max_km} km\n')
+    print(f'{"precisão":<9} {"modo":<20} {"chamadas":>9} {"acertos":>8} {"chaves":>7} {"erro médio":>11} {"erro p95":>9}')
+    modes = (('grade', 0, False), ('grade + catálogo', args.max_km, True), ('grade + aprendidas', args.max_km, False))
+    for precision in (4, 5, 6, 7):
+        for label, max_km, load_catalog in modes:
+            result = run(api, cache, geo, stub, catalog, points, precision, max_km, load_catalog)
+            print(f'{precision:<9} {label:<20} {result["calls"]:>9} {result["hit_rate"]:>7.1%} {result["keys"]:>7}'
+                  f' {result["error"]:>8.2f} km {result["error_p95"]:>6.2f} km')
+    stub.shutdown()
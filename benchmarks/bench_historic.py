@@ -0,0 +1,95 @@
+"""
+Benchmark da rota /historic com uma tabela grande.
+
+Popula o histórico com N linhas (padrão 1.000.000) em um SQLite temporário (ou DATABASE_URL) e compara:
+    - carga completa: todas as linhas em memória + convert_postgres_historic + jsonify (comportamento antigo)
+    - página: /historic?limit=100 (paginação por cursor), primeira página e uma página do meio da tabela
+    - streaming: /historic sem limit, lido em blocos com cursor no servidor
+Mede tempo e pico de memória alocada (tracemalloc) de cada caso.
+
+Uso:
+    python benchmarks/bench_historic.py [quantidade_de_linhas]
+"""
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import date, datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def seed(crud, total, chunk=50000):
+    """Insere total linhas, 500 cidades por dia, se a tabela estiver vazia."""
+    from sqlalchemy import func, insert, select
+
+    engine = crud.get_engine()
+    crud.Base.metadata.create_all(engine)
+    with engine.begin() as connection:
+        if connection.execute(select(func.count()).select_from(crud.tableHistoric)).scalar() >= total:
+            return
+    today = date.today()
+    now = datetime.now()
+    for offset in range(0, total, chunk):
+        rows = [{
+            "cidade": f'Cidade {i % 500}', "data": today - timedelta(days=i // 500), "data_current": now,
+            "pais": "https://flagsapi.com/BR/shiny/64.png", "vento": "3.1 Km/h", "icon": "https://openweathermap.org/img/wn/01d@2x.png",
+            "previsao": "céu limpo", "umidade": "80%", "temp": "20.0 °C", "temp_max": "22.0 °C", "temp_min": "18.0 °C", "id": i % 500,
+        } for i in range(offset, min(offset + chunk, total))]
+        with engine.begin() as connection:
+            connection.execute(insert(crud.tableHistoric), rows)
+
+
+def measure(name, func):
+    tracemalloc.start()
+    start = time.perf_counter()
+    size = func()
+    elapsed = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    print(f'{name:<32} {elapsed * 1000:>10.1f} ms   pico {peak / 1024 / 1024:>8.1f} MiB   {size / 1024 / 1024:>8.1f} MiB de resposta')
+
+
+if __name__ == '__main__':
+    total = int(sys.argv[1]) if len(sys.argv) > 1 else 1000000
+    os.environ.setdefault('DATABASE_URL', 'sqlite:///' + os.path.join(tempfile.gettempdir(), f'bench_historic_{total}.db'))
+
+    import crud
+    import main
+    from flask import jsonify
+    from function import convert_postgres_historic
+    from sqlalchemy import desc
+
+    seed(crud, total)
+    client = main.app.test_client()
+    print(f'{total} linhas no histórico')
+
+    def full_load():
+        session = crud.open_connection()
+        rows = session.query(crud.tableHistoric.identidade, crud.tableHistoric.cidade, crud.tableHistoric.data) \
+            .order_by(desc(crud.tableHistoric.identidade)).all()
+        crud.remove_session()
+        with main.app.app_context():
+            return len(jsonify(convert_postgres_historic(rows)).get_data())
+
+    def first_page():
+        return len(client.get('/historic?limit=100').get_data())
+
+    def middle_page():
+        return len(client.get(f'/historic?limit=100&after={total // 2}').get_data())
+
+    def filtered_page():
+        return len(client.get('/historic?limit=100&id=42').get_data())
+
+    def streaming():
+        response = client.get('/historic', buffered=False)
+        size = sum(len(chunk) for chunk in response.response)
+        response.close()
+        return size
+
+    measure('página (limit=100)', first_page)
+    measure('página do meio (after)', middle_page)
+    measure('página filtrada por cidade', filtered_page)
+    measure('streaming (tabela inteira)', streaming)
+    measure('carga completa (antigo)', full_load)
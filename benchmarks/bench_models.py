@@ -0,0 +1,117 @@
+"""
+Simulação de um tráfego misto de /weather e /forecast com o modelo normalizado (models.py) e o modo combinado.
+
+Sorteia --requests consultas (metade /weather e metade /forecast, cidades com popularidade Zipf entre --cities)
+espalhadas em --hours horas de um relógio simulado do cache, e atende cada uma como as rotas (api.get_weather_data
+e function.convert_api_to_current_city ou function.forecast) contra o stub local da OpenWeatherMap. Para cada modo
+mostra as chamadas a API, e com o cache já preenchido o tempo e o pico de memória alocada (tracemalloc) por requisição:
+    - separado: /weather no end-point weather e /forecast no forecast (WEATHER_COMBINED=0)
+    - combinado: as duas rotas com a resposta do forecast (WEATHER_COMBINED=1)
+cada um com e sem o cache de modelos (MODEL_CACHE=0 converte o JSON da API a cada requisição).
+
+Uso:
+    python benchmarks/bench_models.py [--cities 200] [--requests 20000] [--hours 3]
+"""
+import argparse
+import os
+import random
+import sys
+import time
+import tracemalloc
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from stub_upstream import start_stub, disable_limits
+
+ZIPF_S = 1.1
+
+
+class Clock:
+    """Relógio simulado usado pelo cache (time.monotonic e time.time), avançado pelas consultas."""
+    def __init__(self):
+        self.now = time.time()
+
+    def monotonic(self):
+        return self.now
+
+    def time(self):
+        return self.now
+
+
+def workload(rnd):
+    """Sorteia as consultas: (segundos desde o início, cidade, True para /weather)."""
+    weights = [1 / (rank ** ZIPF_S) for rank in range(1, args.cities + 1)]
+    cities = rnd.choices(range(args.cities), weights, k=args.requests)
+    span = args.hours * 3600
+    return [(index * span / args.requests, f'Cidade {city}', rnd.random() < 0.5) for index, city in enumerate(cities)]
+
+
+def handle(api, function, city, current):
+    """Atende uma consulta como as rotas /weather e /forecast, sem o Flask e sem o histórico."""
+    if current:
+        return function.convert_api_to_current_city(api.get_weather_data(city))
+    return function.forecast(api.get_weather_data(city, current_day=False))
+
+
+def run(api, cache, function, models, stub, requests, combined, model_cache):
+    """Executa as consultas com uma configuração e retorna as métricas."""
+    clock = Clock()
+    cache.time = SimpleNamespace(monotonic=clock.monotonic, time=clock.time)
+    api.weather_cache.backend = cache.MemoryBackend(max_entries=args.cities * 2 + 1)
+    api.WEATHER_COMBINED = combined
+    #backend novo a cada execução, os modelos guardados nas respostas anteriores são liberados junto
+    models.model_cache.enabled = model_cache
+    calls_before = stub.calls
+    start = clock.now
+    for offset, city, current in requests:
+        clock.now = start + offset
+        handle(api, function, city, current)
+    calls = stub.calls - calls_before
+
+    #com o cache da API preenchido: tempo e pico de memória por requisição
+    sample = requests[-args.sample:]
+    begin = time.perf_counter()
+    for _, city, current in sample:
+        handle(api, function, city, current)
+    elapsed = (time.perf_counter() - begin) / len(sample)
+    peaks = []
+    tracemalloc.start()
+    for _, city, current in sample[:1000]:
+        tracemalloc.reset_peak()
+        base = tracemalloc.get_traced_memory()[0]
+        handle(api, function, city, current)
+        peaks.append(tracemalloc.get_traced_memory()[1] - base)
+    tracemalloc.stop()
+    cache.time = time
+    return {"calls": calls, "us": elapsed * 1e6, "peak": sum(peaks) / len(peaks)}
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Tráfego misto de /weather e /forecast com o modelo normalizado')
+    parser.add_argument('--cities', type=int, default=200)
+    parser.add_argument('--requests', type=int, default=20000)
+    parser.add_argument('--hours', type=float, default=3)
+    parser.add_argument('--sample', type=int, default=5000, help='consultas medidas com o cache preenchido')
+    args = parser.parse_args()
+
+    stub = start_stub()
+    os.environ['OPENWEATHER_BASE_URL'] = stub.base_url
+    disable_limits()
+
+    import api
+    import cache
+    import function
+    import models
+
+    requests = workload(random.Random(42))
+    print(f'{args.requests} consultas (50% /weather, 50% /forecast) em {args.hours} horas, {args.cities} cidades, '
+          f'TTL weather {cache.CACHE_TTL["weather"]} s e forecast {cache.CACHE_TTL["forecast"]} s\n')
+    print(f'{"modo":<11} {"modelos":<14} {"chamadas":>9} {"µs/req":>8} {"pico KB/req":>12}')
+    for combined in (False, True):
+        for model_cache, label in ((False, 'sem cache'), (True, 'em cache')):
+            result = run(api, cache, function, models, stub, requests, combined, model_cache)
+            print(f'{"combinado" if combined else "separado":<11} {label:<14} {result["calls"]:>9} '
+                  f'{result["us"]:>8.1f} {result["peak"] / 1024:>12.1f}')
+    stub.shutdown()
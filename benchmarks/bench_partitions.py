@@ -0,0 +1,227 @@
+"""
+Benchmark do histórico particionado por mês x tabela única, e das leituras do arquivo Parquet (archive.py).
+
+PostgreSQL (DATABASE_URL=postgresql://...): cria duas tabelas com as colunas e índices do histórico, bench_plano
+(sem partições) e bench_particionado (PARTITION BY RANGE (data), uma partição por mês), com --cities cidades por
+dia em --days dias (padrão 10.000 x 1.100, 11.000.000 de linhas) e mede p50/p99 de:
+    - inserção: lote de 200 linhas do dia com INSERT ... ON CONFLICT DO NOTHING (tamanho do lote do writer.py)
+    - página recente: /historic?limit=100
+    - cidade nos últimos 30 dias, cidade em um mês antigo e contagem dos últimos 7 dias
+    - remoção do mês mais antigo: DELETE x DROP da partição
+As tabelas ficam no banco para as próximas execuções (--drop remove).
+
+Arquivo (qualquer banco, requer o pyarrow): grava o mesmo volume em arquivos Parquet mensais em uma pasta
+temporária e mede a página do arquivo, uma página profunda (after), cidade em um período, registros por identidade
+e a leitura em streaming de todas as linhas.
+
+Uso:
+    python benchmarks/bench_partitions.py [--cities 10000] [--days 1100] [--repeat 50] [--drop]
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from archive import HistoricArchive, add_months, pa, HISTORIC_ARCHIVE_ROW_GROUP
+
+
+COLUMNS = '''
+    identidade serial,
+    previsao varchar(50), cidade varchar(50), data date, data_current timestamp, pais text, vento varchar(10),
+    icon text, umidade varchar(10), temp varchar(10), temp_max varchar(10), temp_min varchar(10), id int,
+    temp_c double precision, temp_max_c double precision, temp_min_c double precision,
+    umidade_pct double precision, vento_kmh double precision
+'''
+
+
+def percentiles(samples):
+    samples = sorted(samples)
+    return statistics.median(samples), samples[min(len(samples) - 1, int(len(samples) * 0.99))]
+
+
+def timed(func, repeat):
+    samples = []
+    for index in range(repeat):
+        start = time.perf_counter()
+        func(index)
+        samples.append((time.perf_counter() - start) * 1000)
+    return percentiles(samples)
+
+
+def create_tables(connection, first_day, last_day):
+    """Cria e popula bench_plano e bench_particionado se ainda não existirem."""
+    from sqlalchemy import text
+
+    tables = {}
+    for name, partitioned in (('bench_plano', False), ('bench_particionado', True)):
+        exists = connection.execute(text('SELECT to_regclass(:name)'), {"name": name}).scalar()
+        tables[name] = partitioned
+        if exists:
+            continue
+        if partitioned:
+            connection.execute(text(f'CREATE TABLE {name} ({COLUMNS}, PRIMARY KEY (identidade, data)) PARTITION BY RANGE (data)'))
+            month = add_months(first_day, 0)
+            while month <= last_day + timedelta(days=31):
+                connection.execute(text(
+                    f"CREATE TABLE {name}_p{month:%Y%m} PARTITION OF {name} "
+                    f"FOR VALUES FROM ('{month}') TO ('{add_months(month, 1)}')"
+                ))
+                month = add_months(month, 1)
+        else:
+            connection.execute(text(f'CREATE TABLE {name} ({COLUMNS}, PRIMARY KEY (identidade))'))
+        connection.execute(text(f'CREATE UNIQUE INDEX ux_{name}_id_data ON {name} (id, data)'))
+        connection.execute(text(f'CREATE INDEX ix_{name}_id_identidade ON {name} (id, identidade)'))
+        connection.execute(text(f'CREATE INDEX ix_{name}_cidade_identidade ON {name} (cidade, identidade)'))
+        connection.execute(text(f'CREATE INDEX ix_{name}_data ON {name} (data)'))
+        start = time.perf_counter()
+        connection.execute(text(f'''
+            INSERT INTO {name} (previsao, cidade, data, data_current, pais, vento, icon, umidade, temp, temp_max, temp_min,
+                                id, temp_c, temp_max_c, temp_min_c, umidade_pct, vento_kmh)
+            SELECT 'céu limpo', 'Cidade ' || city, day::date, day, 'https://flagsapi.com/BR/shiny/64.png', '3.1 Km/h',
+                   'https://openweathermap.org/img/wn/01d@2x.png', '80%', '20.0 °C', '22.0 °C', '18.0 °C',
+                   city, 20.0, 22.0, 18.0, 80.0, 3.1
+            FROM generate_series(CAST(:first AS date), CAST(:last AS date), interval '1 day') AS day,
+                 generate_series(0, :cities - 1) AS city
+            ORDER BY day, city
+        '''), {"first": first_day, "last": last_day, "cities": args.cities})
+        connection.execute(text(f'ANALYZE {name}'))
+        connection.commit()
+        print(f'{name}: populada em {time.perf_counter() - start:.1f} s')
+    return tables
+
+
+def bench_postgres(engine):
+    from sqlalchemy import text
+
+    last_day = date.today()
+    first_day = last_day - timedelta(days=args.days - 1)
+    with engine.connect() as connection:
+        if args.drop:
+            for name in ('bench_plano', 'bench_particionado'):
+                connection.execute(text(f'DROP TABLE IF EXISTS {name} CASCADE'))
+            connection.commit()
+        tables = create_tables(connection, first_day, last_day)
+
+        for name in tables:
+            rows = connection.execute(text(f'SELECT count(*) FROM {name}')).scalar()
+            size = connection.execute(text(
+                'SELECT coalesce(sum(pg_total_relation_size(relid)), 0) FROM pg_partition_tree(:name)'
+            ), {"name": name}).scalar()
+            print(f'\n{name}: {rows} linhas, {size / 1024 / 1024:.0f} MiB com os índices')
+
+            def insert_batch(index):
+                #lotes de 200 cidades novas no dia seguinte ao último, sem conflito com as linhas existentes
+                connection.execute(text(f'''
+                    INSERT INTO {name} (cidade, data, data_current, id, temp_c)
+                    SELECT 'Nova ' || city, CAST(:day AS date), now(), city, 20.0
+                    FROM generate_series(:first, :first + 199) AS city
+                    ON CONFLICT (id, data) DO NOTHING
+                '''), {"day": last_day + timedelta(days=1), "first": args.cities + index * 200})
+                connection.commit()
+
+            queries = (
+                ('inserção (lote de 200)', insert_batch),
+                ('página recente (limit 100)', lambda index: connection.execute(text(
+                    f'SELECT identidade, cidade, data FROM {name} ORDER BY identidade DESC LIMIT 100')).all()),
+                ('cidade, últimos 30 dias', lambda index: connection.execute(text(
+                    f'SELECT identidade, cidade, data FROM {name} WHERE id = :id AND data >= :start '
+                    'ORDER BY identidade DESC LIMIT 100'), {"id": index % args.cities, "start": last_day - timedelta(days=30)}).all()),
+                ('cidade em um mês antigo', lambda index: connection.execute(text(
+                    f'SELECT identidade, cidade, data FROM {name} WHERE id = :id AND data >= :start AND data < :end '
+                    'ORDER BY identidade DESC LIMIT 100'),
+                    {"id": index % args.cities, "start": add_months(first_day, 1), "end": add_months(first_day, 2)}).all()),
+                ('contagem dos últimos 7 dias', lambda index: connection.execute(text(
+                    f'SELECT count(*) FROM {name} WHERE data >= :start'), {"start": last_day - timedelta(days=7)}).scalar()),
+            )
+            for label, query in queries:
+                p50, p99 = timed(query, args.repeat)
+                print(f'  {label:<30} p50 {p50:>9.2f} ms   p99 {p99:>9.2f} ms')
+            connection.execute(text(f'DELETE FROM {name} WHERE data > :day'), {"day": last_day})
+            connection.commit()
+
+            month = add_months(first_day, 0)
+            start = time.perf_counter()
+            if tables[name]:
+                connection.execute(text(f'DROP TABLE {name}_p{month:%Y%m}'))
+            else:
+                connection.execute(text(f'DELETE FROM {name} WHERE data < :end'), {"end": add_months(month, 1)})
+            connection.commit()
+            print(f'  {"remoção do mês mais antigo":<30} {(time.perf_counter() - start) * 1000:>13.1f} ms'
+                  f' ({"DROP da partição" if tables[name] else "DELETE, sem o VACUUM"})')
+
+
+def bench_archive():
+    if pa is None:
+        print('\npyarrow não instalado, arquivo não medido')
+        return
+    import pyarrow.compute as pc
+    import pyarrow.parquet as pq
+    from archive import ARCHIVE_SCHEMA
+
+    directory = tempfile.mkdtemp(prefix='bench_archive_')
+    archive = HistoricArchive(directory)
+    first_day = date.today() - timedelta(days=args.days - 1)
+    identity = 1
+    start = time.perf_counter()
+    month = add_months(first_day, 0)
+    while month <= date.today():
+        days = [day for day in (month + timedelta(days=offset) for offset in range(31))
+                if day.month == month.month and first_day <= day <= date.today()]
+        count = len(days) * args.cities
+        cities = pa.array(range(args.cities), type=pa.int64())
+        city_ids = pa.concat_arrays([cities] * len(days))
+        columns = {
+            'identidade': pa.array(range(identity, identity + count), type=pa.int64()),
+            'cidade': pc.binary_join_element_wise('Cidade ', pc.cast(city_ids, pa.string()), ''),
+            'data': pa.array([day for day in days for _ in range(args.cities)], type=pa.date32()),
+            'id': city_ids,
+        }
+        arrays = [columns[field.name] if field.name in columns else pa.nulls(count, field.type) for field in ARCHIVE_SCHEMA]
+        table = pa.Table.from_arrays(arrays, schema=ARCHIVE_SCHEMA)
+        #grava a tabela pronta, sem passar pelas linhas como em archive.write_month
+        pq.write_table(table, os.path.join(directory, f'historico_{month:%Y-%m}.parquet'),
+                       compression='zstd', row_group_size=HISTORIC_ARCHIVE_ROW_GROUP)
+        identity += count
+        month = add_months(month, 1)
+    total = identity - 1
+    size = sum(os.path.getsize(os.path.join(directory, name)) for name in os.listdir(directory))
+    print(f'\narquivo: {total} linhas em {len(archive.months())} meses, {size / 1024 / 1024:.0f} MiB'
+          f' (gravado em {time.perf_counter() - start:.1f} s)')
+
+    queries = (
+        ('página (limit 100)', lambda index: archive.select(limit=100)),
+        ('página profunda (after)', lambda index: archive.select(limit=100, after=total // 2 - index)),
+        ('cidade em um período', lambda index: archive.select(
+            limit=100, city_id=index % args.cities, start=first_day + timedelta(days=60), end=first_day + timedelta(days=90))),
+        ('100 registros por identidade', lambda index: archive.records(
+            range(1 + index * 1000, total, total // 100), ['identidade', 'cidade', 'data', 'temp'])),
+    )
+    for label, query in queries:
+        p50, p99 = timed(query, args.repeat)
+        print(f'  {label:<30} p50 {p50:>9.2f} ms   p99 {p99:>9.2f} ms')
+    start = time.perf_counter()
+    rows = sum(len(block) for block in archive.blocks(batch_size=10000))
+    elapsed = time.perf_counter() - start
+    print(f'  {"streaming (todas as linhas)":<30} {rows / elapsed:>13.0f} linhas/s')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Histórico particionado x tabela única e leituras do arquivo')
+    parser.add_argument('--cities', type=int, default=10000)
+    parser.add_argument('--days', type=int, default=1100)
+    parser.add_argument('--repeat', type=int, default=50)
+    parser.add_argument('--drop', action='store_true', help='recria as tabelas do benchmark')
+    args = parser.parse_args()
+
+    import crud
+
+    if crud.DATABASE_URL.startswith('postgresql'):
+        bench_postgres(crud.get_engine())
+    else:
+        print('Particionamento somente no PostgreSQL, defina DATABASE_URL=postgresql://... para medir as tabelas')
+    bench_archive()
@@ -0,0 +1,79 @@
+"""
+Benchmark do pool de conexões do crud.py.
+
+Compara a abordagem antiga (create_engine + sessionmaker a cada chamada) com o engine
+único do processo, usando um banco SQLite local no lugar do PostgreSQL (ou DATABASE_URL, se definido).
+
+Uso:
+    python benchmarks/bench_pool.py [quantidade_de_requisicoes]
+"""
+import os
+import sys
+import tempfile
+import time
+from datetime import date, datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import create_engine, desc
+from sqlalchemy.orm import sessionmaker
+
+import crud
+
+
+def seed(url, rows=500):
+    """Cria a tabela e insere registros de exemplo."""
+    engine = create_engine(url)
+    crud.Base.metadata.create_all(engine)
+    session = sessionmaker(bind=engine)()
+    if session.query(crud.tableHistoric).count() == 0:
+        for i in range(rows):
+            session.add(crud.tableHistoric(
+                cidade=f'Cidade {i % 50}', data=date.today() - timedelta(days=i // 50),
+                data_current=datetime.now(), previsao='céu limpo', pais='BR', vento='3.1 Km/h',
+                icon='01d', umidade='80%', temp='20.0 °C', temp_max='22.0 °C', temp_min='18.0 °C', id=i % 50,
+            ))
+        session.commit()
+    session.close()
+    engine.dispose()
+
+
+def request_per_call_engine(url):
+    """Caminho antigo: um engine novo por requisição."""
+    engine = create_engine(url)
+    session = sessionmaker(bind=engine)()
+    try:
+        session.query(crud.tableHistoric.identidade, crud.tableHistoric.cidade, crud.tableHistoric.data) \
+            .order_by(desc(crud.tableHistoric.identidade)).limit(20).all()
+    finally:
+        session.close()
+        engine.dispose()
+
+
+def request_pooled():
+    """Caminho novo: sessão do pool do processo."""
+    session = crud.open_connection()
+    try:
+        session.query(crud.tableHistoric.identidade, crud.tableHistoric.cidade, crud.tableHistoric.data) \
+            .order_by(desc(crud.tableHistoric.identidade)).limit(20).all()
+    finally:
+        crud.remove_session()
+
+
+def measure(name, func, total):
+    start = time.perf_counter()
+    for _ in range(total):
+        func()
+    elapsed = time.perf_counter() - start
+    print(f'{name:<22} {total / elapsed:>10.1f} req/s')
+
+
+if __name__ == '__main__':
+    total = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    url = os.environ.get('DATABASE_URL') or 'sqlite:///' + os.path.join(tempfile.gettempdir(), 'bench_pool.db')
+    seed(url)
+    crud.init_engine(url)
+
+    measure('engine por chamada', lambda: request_per_call_engine(url), total)
+    measure('engine com pool', request_pooled, total)
+    print(crud.pool_stats())
@@ -0,0 +1,89 @@
+"""
+Benchmark do custo do profiler por amostragem (profiler.py) nas requisições.
+
+Mede requisições por segundo da rota /weather respondida pelo cache (CPU da aplicação, sem esperar a API),
+com --threads threads de clientes, nos casos:
+    - sem os hooks do profiler (o padrão, sem PROFILER_TOKEN e PROFILER_SAMPLE_RATE)
+    - profiler ocioso (PROFILER_TOKEN definido, hooks registrados, nenhuma amostragem)
+    - sessão da rota /profile em andamento (scope requests)
+    - todas as requisições perfiladas (PROFILER_SAMPLE_RATE=1)
+
+Uso:
+    python benchmarks/bench_profiler.py [--seconds 5] [--threads 4] [--interval 0.01]
+"""
+import argparse
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from stub_upstream import start_stub, disable_limits
+
+
+def throughput(app, seconds, threads):
+    """Requisições por segundo de threads clientes chamando /weather por seconds segundos."""
+    counts = [0] * threads
+    deadline = time.monotonic() + seconds
+
+    def worker(index):
+        client = app.test_client()
+        while time.monotonic() < deadline:
+            client.get(f'/weather?city=Cidade {index}')
+            counts[index] += 1
+
+    workers = [threading.Thread(target=worker, args=(index,)) for index in range(threads)]
+    for worker_thread in workers:
+        worker_thread.start()
+    for worker_thread in workers:
+        worker_thread.join()
+    return sum(counts) / seconds
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Custo do profiler por amostragem')
+    parser.add_argument('--seconds', type=float, default=5)
+    parser.add_argument('--threads', type=int, default=4)
+    parser.add_argument('--interval', type=float, default=0.01, help='PROFILER_INTERVAL')
+    args = parser.parse_args()
+
+    stub = start_stub()
+    os.environ['OPENWEATHER_BASE_URL'] = stub.base_url
+    disable_limits()
+    os.environ.setdefault('WRITE_BEHIND', '1')
+    os.environ.setdefault('DATABASE_URL', 'sqlite://')
+    #registra os hooks das requisições (PROFILER_ENABLED)
+    os.environ.setdefault('PROFILER_TOKEN', 'bench')
+
+    import main
+    from profiler import profiler
+
+    app = main.app
+    profiler.interval = args.interval
+    #aquece o cache das cidades usadas
+    throughput(app, 0.5, args.threads)
+
+    hooks = (app.before_request_funcs[None], main.start_profile), (app.teardown_request_funcs[None], main.finish_profile)
+    for functions, hook in hooks:
+        functions.remove(hook)
+    baseline = throughput(app, args.seconds, args.threads)
+    for functions, hook in hooks:
+        functions.append(hook)
+    print(f'{"sem profiler":<28} {baseline:>8.0f} req/s')
+
+    idle = throughput(app, args.seconds, args.threads)
+    print(f'{"ocioso":<28} {idle:>8.0f} req/s   {idle / baseline - 1:>+7.1%}')
+
+    session = profiler.start('requests')
+    active = throughput(app, args.seconds, args.threads)
+    profiler.stop(session)
+    print(f'{"sessão /profile":<28} {active:>8.0f} req/s   {active / baseline - 1:>+7.1%}   ({session.samples} rodadas)')
+
+    profiler.sample_rate = 1
+    sampled = throughput(app, args.seconds, args.threads)
+    profiler.sample_rate = 0
+    print(f'{"todas perfiladas":<28} {sampled:>8.0f} req/s   {sampled / baseline - 1:>+7.1%}'
+          f'   ({profiler.stats()["profiled"]} requisições)')
+    stub.shutdown()
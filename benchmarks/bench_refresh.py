@@ -0,0 +1,121 @@
+"""
+Simulação da renovação do cache em segundo plano (scheduler.RefreshScheduler) com tráfego Zipf.
+
+Gera consultas a api.get_weather_data para 1.000 cidades com popularidade Zipf (poucas cidades recebem
+a maior parte do tráfego) contra o stub local da OpenWeatherMap, com e sem a renovação, e mostra
+a taxa de acertos do cache (total e das HOT cidades mais consultadas, considerando acerto uma resposta em menos
+da metade da latência da API), as chamadas a API (das requisições e da renovação) e a latência das requisições.
+
+Uso:
+    python benchmarks/bench_refresh.py [segundos] [requisicoes_por_segundo]
+"""
+import os
+import random
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from stub_upstream import start_stub, disable_limits
+
+CITIES = 1000
+ZIPF_S = 1.1
+TTL = 15
+LATENCY = 0.1
+#Cidades consideradas quentes na métrica de acertos das mais consultadas
+HOT = 50
+
+
+def zipf_sampler(total, s, seed):
+    """Retorna uma função que sorteia o índice de uma cidade com probabilidade proporcional a 1 / (posição ^ s)."""
+    weights = [1 / (rank ** s) for rank in range(1, total + 1)]
+    rnd = random.Random(seed)
+    return lambda: rnd.choices(range(total), weights)[0]
+
+
+def run(api, cache, stub, seconds, rate, scheduler=None):
+    """Executa a simulação por seconds segundos e retorna as métricas."""
+    api.weather_cache.backend = cache.MemoryBackend()
+    api.REFRESH_ENABLED = scheduler is not None
+    if scheduler is not None:
+        api.refresh_scheduler = scheduler
+    hits_before, misses_before = api.weather_cache.hits, api.weather_cache.misses
+    calls_before = stub.calls
+
+    workers = 8
+    latencies = []
+    hot = []
+    lock = threading.Lock()
+    deadline = time.monotonic() + seconds
+
+    def worker(seed):
+        sample = zipf_sampler(CITIES, ZIPF_S, seed)
+        interval = workers / rate
+        next_at = time.monotonic()
+        local = []
+        local_hot = []
+        while time.monotonic() < deadline:
+            city = sample()
+            start = time.perf_counter()
+            api.get_weather_data(f'Cidade {city}')
+            elapsed = time.perf_counter() - start
+            local.append(elapsed)
+            if city < HOT:
+                local_hot.append(elapsed < LATENCY / 2)
+            next_at += interval
+            time.sleep(max(0.0, next_at - time.monotonic()))
+        with lock:
+            latencies.extend(local)
+            hot.extend(local_hot)
+
+    threads = [threading.Thread(target=worker, args=(seed,)) for seed in range(workers)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    if scheduler is not None:
+        scheduler.stop()
+
+    hits = api.weather_cache.hits - hits_before
+    misses = api.weather_cache.misses - misses_before
+    latencies.sort()
+    return {
+        "requests": len(latencies),
+        "hit_rate": hits / max(1, hits + misses),
+        "hot_hit_rate": sum(hot) / max(1, len(hot)),
+        "upstream_calls": stub.calls - calls_before,
+        "refreshed": scheduler.refreshed if scheduler is not None else 0,
+        "p50_ms": latencies[len(latencies) // 2] * 1000,
+        "p99_ms": latencies[int(len(latencies) * 0.99)] * 1000,
+    }
+
+
+if __name__ == '__main__':
+    seconds = float(sys.argv[1]) if len(sys.argv) > 1 else 60
+    rate = float(sys.argv[2]) if len(sys.argv) > 2 else 100
+
+    stub = start_stub(latency=LATENCY)
+    os.environ['OPENWEATHER_BASE_URL'] = stub.base_url
+    disable_limits()
+    os.environ['CACHE_TTL_WEATHER'] = str(TTL)
+
+    import api
+    import cache
+    from scheduler import RefreshScheduler
+
+    print(f'{CITIES} cidades (Zipf s={ZIPF_S}), {rate:.0f} req/s por {seconds:.0f} s, TTL {TTL} s, API com {LATENCY * 1000:.0f} ms')
+    print(f'{"cenário":<34} {"req":>7} {"acertos":>8} {"acertos top " + str(HOT):>15} {"chamadas API":>13} {"renovadas":>10} {"p50 ms":>8} {"p99 ms":>8}')
+    scenarios = [
+        ('sem renovação', None),
+        ('renovação top 50, 240 chamadas/min', RefreshScheduler(api.fetch_weather_data, top_n=50, calls_per_minute=240,
+                                                                half_life=60, interval=0.5, cacheable=api.is_valid_response)),
+        ('renovação top 200, 600 chamadas/min', RefreshScheduler(api.fetch_weather_data, top_n=200, calls_per_minute=600,
+                                                                 half_life=60, interval=0.5, cacheable=api.is_valid_response)),
+    ]
+    for name, scheduler in scenarios:
+        result = run(api, cache, stub, seconds, rate, scheduler)
+        print(f'{name:<34} {result["requests"]:>7} {result["hit_rate"]:>8.1%} {result["hot_hit_rate"]:>15.1%} {result["upstream_calls"]:>13} '
+              f'{result["refreshed"]:>10} {result["p50_ms"]:>8.2f} {result["p99_ms"]:>8.2f}')
+    stub.shutdown()
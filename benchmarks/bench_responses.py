@@ -0,0 +1,62 @@
+"""
+Benchmark da serialização JSON e da compressão das respostas (responses.py).
+
+Para payloads representativos (/weather, /forecast, /historic com 1.000 registros e /forecastBatch com 50 cidades) mede:
+    - CPU por resposta (time.process_time) do jsonify com o json da biblioteca padrão x orjson
+    - CPU e tamanho da resposta com gzip e brotli (se instalado)
+
+Uso:
+    python benchmarks/bench_responses.py
+"""
+import os
+import sys
+import time
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from flask import Flask
+from flask.json.provider import DefaultJSONProvider
+from stub_upstream import weather_payload, forecast_payload
+from function import convert_api_to_current_city, convert_postgres_historic, forecast, convert_batch
+from responses import FastJSONProvider, compress, brotli
+
+
+def payloads():
+    today = date.today()
+    cities = [f'Cidade {i}' for i in range(50)]
+    return {
+        '/weather': convert_api_to_current_city(weather_payload('Osório')),
+        '/forecast': forecast(forecast_payload('Osório')),
+        '/historic (1.000)': convert_postgres_historic([(i, f'Cidade {i % 500}', today - timedelta(days=i // 500)) for i in range(1000)]),
+        '/forecastBatch (50)': convert_batch([(city, None) for city in cities], [forecast_payload(city) for city in cities], current_day=False),
+    }
+
+
+def cpu(func, repeat):
+    start = time.process_time()
+    for _ in range(repeat):
+        result = func()
+    return (time.process_time() - start) / repeat * 1000, result
+
+
+if __name__ == '__main__':
+    stdlib_app = Flask('stdlib')
+    stdlib_app.json = DefaultJSONProvider(stdlib_app)
+    fast_app = Flask('fast')
+    fast_app.json = FastJSONProvider(fast_app)
+    encodings = ['gzip'] + (['br'] if brotli is not None else [])
+
+    print(f'{"payload":<22} {"json (ms)":>10} {"orjson (ms)":>12} {"bytes":>9}' + ''.join(f' {enc + " (ms)":>10} {enc + " bytes":>11}' for enc in encodings))
+    for name, payload in payloads().items():
+        repeat = 2000 if len(str(payload)) < 10000 else 100
+        with stdlib_app.app_context():
+            stdlib_ms, _ = cpu(lambda: stdlib_app.json.response(payload).get_data(), repeat)
+        with fast_app.app_context():
+            fast_ms, body = cpu(lambda: fast_app.json.response(payload).get_data(), repeat)
+        line = f'{name:<22} {stdlib_ms:>10.3f} {fast_ms:>12.3f} {len(body):>9}'
+        for encoding in encodings:
+            compress_ms, compressed = cpu(lambda: compress(body, encoding), repeat)
+            line += f' {compress_ms:>10.3f} {len(compressed):>11}'
+        print(line)
@@ -0,0 +1,89 @@
+"""
+Verifica o comportamento do api.py contra o stub local da OpenWeatherMap (stub_upstream.py).
+
+Cenários:
+    - conexões reaproveitadas (http_session) x requests.get sem sessão
+    - API lenta acima do HTTP_READ_TIMEOUT
+    - API respondendo 503: novas tentativas, abertura do circuito e valor expirado do cache
+
+Uso:
+    python benchmarks/bench_upstream.py
+"""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from stub_upstream import start_stub, disable_limits
+
+stub = start_stub()
+os.environ['OPENWEATHER_BASE_URL'] = stub.base_url
+disable_limits()
+os.environ.setdefault('HTTP_READ_TIMEOUT', '0.5')
+os.environ.setdefault('HTTP_RETRIES', '2')
+os.environ.setdefault('HTTP_BACKOFF', '0.05')
+os.environ.setdefault('CIRCUIT_FAILURE_THRESHOLD', '3')
+os.environ.setdefault('CIRCUIT_RESET_TIMEOUT', '1')
+
+import requests
+
+import api
+
+
+def keep_alive(total=300):
+    params = {'q': 'Osorio', 'appid': api.API_KEY}
+    start = time.perf_counter()
+    for _ in range(total):
+        requests.get(f'{stub.base_url}/weather', params=params).json()
+    bare = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for _ in range(total):
+        api.http_session.get(f'{stub.base_url}/weather', params=params).json()
+    pooled = time.perf_counter() - start
+    print(f'requests.get sem sessão   {total / bare:>8.1f} req/s')
+    print(f'http_session (keep-alive) {total / pooled:>8.1f} req/s')
+
+
+def slow_upstream():
+    stub.latency = 2.0
+    start = time.perf_counter()
+    try:
+        api.fetch_weather_data('Lenta')
+        result = 'respondeu'
+    except api.UpstreamUnavailable as e:
+        result = f'UpstreamUnavailable({e})'
+    print(f'API lenta (2s, timeout {api.HTTP_READ_TIMEOUT}s): {result} em {time.perf_counter() - start:.2f}s')
+    stub.latency = 0.0
+    api.circuit_breaker.record_success()
+
+
+def failing_upstream():
+    api.get_weather_data('Osorio')
+    api.weather_cache.backend._data.clear()
+    api.weather_cache.set('weather:osorio', api.fetch_weather_data('Osorio'), ttl=-1)
+
+    stub.error_rate = 1.0
+    calls_before = stub.calls
+    for i in range(6):
+        start = time.perf_counter()
+        data = api.get_weather_data('Osorio')
+        origem = 'expirado do cache' if data.get('cod') == 200 else data.get('message')
+        print(f'  chamada {i + 1}: {origem:<45} {1000 * (time.perf_counter() - start):7.1f} ms  circuito={api.circuit_breaker.state}')
+    print(f'  requisições recebidas pelo stub: {stub.calls - calls_before}')
+
+    stub.error_rate = 0.0
+    time.sleep(api.circuit_breaker.reset_timeout)
+    data = api.get_weather_data('Osorio')
+    print(f'  após {api.circuit_breaker.reset_timeout}s e API de volta: cod={data.get("cod")} circuito={api.circuit_breaker.state}')
+
+
+if __name__ == '__main__':
+    keep_alive()
+    slow_upstream()
+    print('API respondendo 503:')
+    failing_upstream()
+    print(api.weather_cache.stats(), api.circuit_breaker.stats())
+    stub.shutdown()
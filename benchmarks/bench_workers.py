@@ -0,0 +1,105 @@
+"""
+Vazão do servidor de produção (server.py, gunicorn) com 1, 2, 4, ... workers, até a quantidade de núcleos.
+
+Cada rodada inicia o server.py em outro processo com WEB_WORKERS workers, o stub da OpenWeatherMap e um banco
+SQLite populado (o mesmo da suite.py), e mede req/s e latência de rotas que usam CPU: /forecast com o cache
+aquecido (agrupamento da previsão + JSON) e /historic?limit=500 (banco + datas + JSON). Com um worker só
+um núcleo é usado, com N workers a vazão deve crescer até a quantidade de núcleos.
+A memória é a soma do PSS (memória proporcional, as páginas compartilhadas pelo preload contam dividido pelos processos).
+
+Uso:
+    python benchmarks/bench_workers.py [--workers 1 2 4] [--threads 8] [--concurrency 32] [--requests 2000]
+"""
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import requests
+
+from stub_upstream import start_stub, disable_limits
+from suite import load_route, seed_database
+
+
+ROUTES = [
+    ('GET /forecast', 'GET', lambda rnd: ('/forecast', {'city': f'Cidade {rnd.randint(0, 19)}'}, None)),
+    ('GET /historic', 'GET', lambda rnd: ('/historic', {'limit': 500}, None)),
+]
+
+
+def process_pss_mb(pid):
+    """Soma do PSS (MiB) do processo e dos filhos (/proc, somente Linux), ou None."""
+    try:
+        with open(f'/proc/{pid}/task/{pid}/children') as file:
+            pids = [pid] + [int(child) for child in file.read().split()]
+        total = 0
+        for item in pids:
+            with open(f'/proc/{item}/smaps_rollup') as file:
+                for line in file:
+                    if line.startswith('Pss:'):
+                        total += int(line.split()[1])
+        return total / 1024
+    except (OSError, ValueError):
+        return None
+
+
+def start_server(workers, threads, port, env):
+    env = dict(env, WEB_WORKERS=str(workers), WEB_THREADS=str(threads), WEB_BIND=f'127.0.0.1:{port}')
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    process = subprocess.Popen([sys.executable, os.path.join(root, 'server.py')], env=env, cwd=root,
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    url = f'http://127.0.0.1:{port}'
+    for _ in range(300):
+        try:
+            if requests.get(url + '/cities', params={'q': 'a'}, timeout=1).status_code == 200:
+                return process, url
+        except requests.RequestException:
+            time.sleep(0.1)
+    process.kill()
+    raise RuntimeError('server.py não iniciou')
+
+
+if __name__ == '__main__':
+    cores = os.cpu_count() or 1
+    parser = argparse.ArgumentParser(description='Vazão do server.py por quantidade de workers')
+    parser.add_argument('--workers', type=int, nargs='*', default=[n for n in (1, 2, 4, 8, 16) if n <= cores] or [1])
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--concurrency', type=int, default=32)
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--app', choices=('flask', 'asgi'), default='flask')
+    args = parser.parse_args()
+
+    stub = start_stub()
+    env = disable_limits(dict(os.environ, OPENWEATHER_BASE_URL=stub.base_url, WEB_APP=args.app))
+    env.setdefault('DATABASE_URL', 'sqlite:///' + os.path.join(tempfile.gettempdir(), 'bench_suite_500x365.db'))
+    os.environ['DATABASE_URL'] = env['DATABASE_URL']
+
+    import crud
+
+    crud.init_engine()
+    seed_database(crud, 500, 365)
+    crud.dispose_engine()
+
+    print(f'{cores} núcleos, {args.app}, {args.threads} threads por worker, {args.concurrency} clientes simultâneos')
+    base = {}
+    for workers in args.workers:
+        process, url = start_server(workers, args.threads, 18000 + workers, env)
+        try:
+            for route in ROUTES:
+                load_route(url, route, args.concurrency, args.concurrency * 4, seed=0)
+                result = load_route(url, route, args.concurrency, args.requests, seed=1)
+                base.setdefault(route[0], result['throughput'])
+                pss = process_pss_mb(process.pid)
+                print(f'  {workers:>2} workers  {route[0]:<15} {result["throughput"]:>9.1f} req/s'
+                      f' ({result["throughput"] / base[route[0]]:.2f}x)   p50 {result["p50_ms"]:>7.2f} ms'
+                      f'   p99 {result["p99_ms"]:>7.2f} ms   erros {result["errors"]}'
+                      + (f'   PSS {pss:.0f} MiB' if pss is not None else ''))
+        finally:
+            process.terminate()
+            process.wait(60)
+    stub.shutdown()
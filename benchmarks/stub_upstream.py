@@ -0,0 +1,224 @@
+"""
+Servidor HTTP local que imita a API da OpenWeatherMap (end-points weather e forecast).
+
+Responde dados realistas para qualquer cidade, com latência e taxa de erro configuráveis,
+para testar o api.py sem depender da API real. Para apontar a aplicação para o stub:
+    OPENWEATHER_BASE_URL=http://127.0.0.1:8081/data/2.5 python main.py
+
+Uso:
+    python benchmarks/stub_upstream.py [--port 8081] [--latency 0.2] [--error-rate 0.1]
+"""
+import argparse
+import json
+import os
+import random
+import threading
+import time
+import zlib
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+
+#Cidade que sempre responde 404, como a API faz com nomes inexistentes
+NOT_FOUND_CITY = 'cidadeinexistente'
+
+CONDITIONS = [
+    (800, 'céu limpo', '01d'),
+    (801, 'algumas nuvens', '02d'),
+    (803, 'nublado', '04d'),
+    (500, 'chuva leve', '10d'),
+    (211, 'trovoada', '11d'),
+]
+
+
+def city_seed(city):
+    """Semente estável por cidade, para que a mesma cidade sempre gere o mesmo id e clima base."""
+    return zlib.crc32(city.strip().casefold().encode('utf-8'))
+
+
+def weather_payload(city, city_id=None, lat=None, lon=None):
+    """Resposta no formato do end-point /data/2.5/weather."""
+    seed = city_seed(city)
+    rnd = random.Random(seed + int(time.time() // 600))
+    condition = CONDITIONS[seed % len(CONDITIONS)]
+    temp = round(10 + seed % 20 + rnd.uniform(-2, 2), 2)
+    return {
+        "coord": {"lon": lon if lon is not None else -50.27, "lat": lat if lat is not None else -29.88},
+        "weather": [{"id": condition[0], "main": "Clouds", "description": condition[1], "icon": condition[2]}],
+        "base": "stations",
+        "main": {
+            "temp": temp, "feels_like": temp, "temp_min": round(temp - 1.5, 2), "temp_max": round(temp + 1.5, 2),
+            "pressure": 1015, "humidity": 50 + seed % 45,
+        },
+        "visibility": 10000,
+        "wind": {"speed": round(1 + (seed % 90) / 10, 2), "deg": seed % 360},
+        "clouds": {"all": seed % 100},
+        "dt": int(time.time()),
+        "sys": {"country": "BR", "sunrise": 1697618000, "sunset": 1697664000},
+        "timezone": -10800,
+        "id": city_id if city_id is not None else 3000000 + seed % 1000000,
+        "name": city.strip().title(),
+        "cod": 200,
+    }
+
+
+def forecast_payload(city, city_id=None, lat=None, lon=None, cnt=40):
+    """Resposta no formato do end-point /data/2.5/forecast (intervalos de 3 horas)."""
+    seed = city_seed(city)
+    rnd = random.Random(seed)
+    now = datetime.now(timezone.utc).replace(minute=0, second=0, microsecond=0)
+    start = now + timedelta(hours=3 - now.hour % 3)
+    items = []
+    for i in range(cnt):
+        slot = start + timedelta(hours=3 * i)
+        condition = CONDITIONS[(seed + i // 8) % len(CONDITIONS)]
+        temp = round(10 + seed % 20 + 5 * rnd.uniform(-1, 1), 2)
+        items.append({
+            "dt": int(slot.timestamp()),
+            "main": {
+                "temp": temp, "feels_like": temp, "temp_min": round(temp - rnd.uniform(0, 2), 2),
+                "temp_max": round(temp + rnd.uniform(0, 2), 2), "pressure": 1015, "humidity": 40 + rnd.randint(0, 55),
+            },
+            "weather": [{"id": condition[0], "main": "Clouds", "description": condition[1], "icon": condition[2]}],
+            "clouds": {"all": rnd.randint(0, 100)},
+            "wind": {"speed": round(rnd.uniform(0.5, 12), 2), "deg": rnd.randint(0, 359)},
+            "visibility": 10000,
+            "pop": round(rnd.random(), 2),
+            "dt_txt": slot.strftime('%Y-%m-%d %H:%M:%S'),
+        })
+    return {
+        "cod": "200",
+        "message": 0,
+        "cnt": cnt,
+        "list": items,
+        "city": {
+            "id": city_id if city_id is not None else 3000000 + seed % 1000000,
+            "name": city.strip().title(),
+            "coord": {"lat": lat if lat is not None else -29.88, "lon": lon if lon is not None else -50.27},
+            "country": "BR",
+            "population": 40000,
+            "timezone": -10800,
+        },
+    }
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    """Atende as requisições do stub usando a configuração do servidor (latency, error_rate, error_status)."""
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+
+    def do_GET(self):
+        server = self.server
+        url = urlparse(self.path)
+        params = {key: values[0] for key, values in parse_qs(url.query).items()}
+        with server.lock:
+            server.calls += 1
+            server.calls_by_path[url.path] = server.calls_by_path.get(url.path, 0) + 1
+
+        if server.latency:
+            time.sleep(server.latency)
+
+        if server.error_rate and random.random() < server.error_rate:
+            if server.error_body is not None:
+                return self.send_body(server.error_status, server.error_body.encode('utf-8'), 'text/html; charset=utf-8')
+            return self.send_json(server.error_status, {"cod": server.error_status, "message": "stub error"})
+
+        city = params.get('q', '')
+        city_id = int(params['id']) if params.get('id') else None
+        lat = float(params['lat']) if params.get('lat') else None
+        lon = float(params['lon']) if params.get('lon') else None
+        if city_id is not None and not city:
+            city = f'cidade {city_id}'
+        if lat is not None and not city:
+            city = f'cidade {lat:.2f} {lon:.2f}'
+        if not city or city.strip().casefold() == NOT_FOUND_CITY:
+            return self.send_json(404, {"cod": "404", "message": "city not found"})
+
+        if url.path.endswith('/weather'):
+            return self.send_json(200, weather_payload(city, city_id, lat, lon))
+        if url.path.endswith('/forecast'):
+            return self.send_json(200, forecast_payload(city, city_id, lat, lon, int(params.get('cnt', 40))))
+        return self.send_json(404, {"cod": "404", "message": "Internal error"})
+
+    def send_json(self, status, payload):
+        self.send_body(status, json.dumps(payload).encode('utf-8'), 'application/json; charset=utf-8')
+
+    def send_body(self, status, body, content_type):
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class StubServer(ThreadingHTTPServer):
+    """Servidor do stub, ignora conexões encerradas pelo cliente (ex: tempo limite do api.py)."""
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        pass
+
+
+def disable_limits(environ=os.environ):
+    """
+    Desativa a cota da chave real e o limite por cliente (quota.py), o stub aceita qualquer volume.
+    Valores já definidos são mantidos. Chamar antes de importar api.py, main.py ou asgi.py.
+
+    Parâmetros:
+    environ (dict, opcional): Variáveis alteradas, por padrão os.environ (ou o ambiente de um subprocesso).
+
+    Retorna:
+    dict: environ.
+    """
+    environ.setdefault('QUOTA_CALLS_PER_MINUTE', '0')
+    environ.setdefault('RATE_LIMIT_PER_MINUTE', '0')
+    return environ
+
+
+def start_stub(port=0, latency=0.0, error_rate=0.0, error_status=503, error_body=None):
+    """
+    Inicia o stub em uma thread e retorna o servidor.
+
+    Parâmetros:
+    port (int, opcional): Porta do servidor, 0 escolhe uma porta livre.
+    latency (float, opcional): Segundos de espera antes de cada resposta.
+    error_rate (float, opcional): Fração das requisições que respondem com error_status.
+    error_status (int, opcional): Status HTTP das respostas de erro.
+    error_body (str, opcional): Corpo em texto das respostas de erro (ex: página de erro de um proxy com status 200),
+                                por padrão o JSON de erro da API.
+
+    Retorna:
+    StubServer: Servidor com os atributos base_url, calls e calls_by_path. Encerrar com server.shutdown().
+    """
+    server = StubServer(('127.0.0.1', port), StubHandler)
+    server.latency = latency
+    server.error_rate = error_rate
+    server.error_status = error_status
+    server.error_body = error_body
+    server.calls = 0
+    server.calls_by_path = {}
+    server.lock = threading.Lock()
+    server.base_url = f'http://127.0.0.1:{server.server_address[1]}/data/2.5'
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Stub local da API OpenWeatherMap')
+    parser.add_argument('--port', type=int, default=8081)
+    parser.add_argument('--latency', type=float, default=0.0)
+    parser.add_argument('--error-rate', type=float, default=0.0)
+    parser.add_argument('--error-status', type=int, default=503)
+    args = parser.parse_args()
+
+    stub = start_stub(args.port, args.latency, args.error_rate, args.error_status)
+    print(f'Stub OpenWeatherMap em {stub.base_url}')
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        stub.shutdown()
@@ -0,0 +1,375 @@
+"""
+Suíte de benchmarks da aplicação, com resultado em JSON e comparação com uma linha de base.
+
+Prepara o ambiente completo localmente:
+    - stub da OpenWeatherMap (stub_upstream.py) com latência e taxa de erro configuráveis
+    - banco SQLite temporário (ou DATABASE_URL) populado com o histórico de N cidades por D dias, com o resumo (/stats)
+    - servidor Flask (main.py) com um número fixo de threads, ou o ASGI (asgi.py) com --server asgi
+
+E mede:
+    - micro: as funções de conversão do function.py (µs por chamada)
+    - macro: carga em cada rota em níveis fixos de concorrência (req/s, p50/p95/p99, erros e RSS do processo)
+
+O resultado é gravado em JSON (--output). Com --baseline, cada medida é comparada com a mesma medida da linha de base
+e as que pioraram mais que --threshold (vazão menor ou p95 maior) são marcadas como regressão, com código de saída 1.
+
+Uso:
+    python benchmarks/suite.py --output resultado.json
+    python benchmarks/suite.py --baseline resultado.json [--threshold 0.15]
+    python benchmarks/suite.py --quick --only micro
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import resource
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, timedelta
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from stub_upstream import start_stub, disable_limits, weather_payload, forecast_payload
+
+
+#Níveis de concorrência da carga nas rotas
+CONCURRENCY_LEVELS = (1, 8, 32)
+
+#Rotas da carga: nome, método, função que monta (caminho, parâmetros, corpo JSON) a partir de um random.Random
+ROUTES = [
+    ('GET /weather', 'GET', lambda rnd: ('/weather', {'city': f'Cidade {rnd.randint(0, 999)}'}, None)),
+    ('GET /forecast', 'GET', lambda rnd: ('/forecast', {'city': f'Cidade {rnd.randint(0, 999)}'}, None)),
+    ('POST /weatherBatch', 'POST', lambda rnd: ('/weatherBatch', None, {'cities': [f'Cidade {rnd.randint(0, 999)}' for _ in range(10)]})),
+    ('GET /historic', 'GET', lambda rnd: ('/historic', {'limit': 100}, None)),
+    ('GET /historic?id', 'GET', lambda rnd: ('/historic', {'limit': 100, 'id': rnd.randint(0, 499)}, None)),
+    ('GET /listHistoric', 'GET', lambda rnd: ('/listHistoric', {'identidade': rnd.randint(1, 5000)}, None)),
+    ('GET /listHistoric?ids', 'GET', lambda rnd: ('/listHistoric', {'identidade': ','.join(str(rnd.randint(1, 5000)) for _ in range(20))}, None)),
+    ('GET /stats', 'GET', lambda rnd: ('/stats', {'id': rnd.randint(0, 499), 'period': 'month'}, None)),
+    ('GET /cities', 'GET', lambda rnd: ('/cities', {'q': f'Cidade {rnd.randint(1, 49)}'}, None)),
+]
+
+
+def percentile(values, fraction):
+    """Percentil pelo método do posto mais próximo, values deve estar ordenado."""
+    if not values:
+        return 0.0
+    return values[min(len(values) - 1, max(0, int(round(fraction * len(values))) - 1))]
+
+
+def rss_mb():
+    """Memória residente atual do processo em MiB (/proc no Linux, ou o pico do getrusage)."""
+    try:
+        with open('/proc/self/statm') as file:
+            return int(file.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 1024 / 1024
+    except (OSError, ValueError):
+        return max_rss_mb()
+
+
+def max_rss_mb():
+    """Pico de memória residente do processo em MiB."""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 1024 / 1024 if sys.platform == 'darwin' else peak / 1024
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def seed_database(crud, cities, days):
+    """
+    Popula o histórico com cities cidades por days dias (se a tabela estiver vazia), gravando pelo mesmo caminho das
+    rotas (crud.write_historic), que também atualiza o resumo usado pela rota /stats.
+    """
+    from sqlalchemy import func, select
+
+    engine = crud.get_engine()
+    crud.Base.metadata.create_all(engine)
+    with engine.begin() as connection:
+        if connection.execute(select(func.count()).select_from(crud.tableHistoricRollup)).scalar():
+            return
+        connection.execute(crud.tableHistoric.__table__.delete())
+    rnd = random.Random(42)
+    today = date.today()
+    now = datetime.now()
+    rows = []
+    for day in range(days, 0, -1):
+        for city in range(cities):
+            temp = round(10 + city % 20 + rnd.uniform(-5, 5), 2)
+            rows.append({
+                "cidade": f'Cidade {city}', "data": today - timedelta(days=day), "data_current": now,
+                "pais": "https://flagsapi.com/BR/shiny/64.png", "vento": "3.1 Km/h",
+                "icon": "https://openweathermap.org/img/wn/01d@2x.png", "previsao": "céu limpo",
+                "umidade": "80%", "temp": f'{temp} °C', "temp_max": f'{temp + 2} °C', "temp_min": f'{temp - 2} °C',
+                "id": city, "temp_c": temp, "temp_max_c": temp + 2, "temp_min_c": temp - 2,
+                "umidade_pct": 80.0, "vento_kmh": 3.1,
+            })
+    session = crud.open_connection()
+    try:
+        for offset in range(0, len(rows), 20000):
+            crud.write_historic(session, rows[offset:offset + 20000])
+            session.commit()
+    finally:
+        crud.remove_session()
+
+
+def measure_micro(name, func, number, repeat):
+    """Executa func number vezes em cada uma das repeat rodadas, retorna o tempo por chamada em µs."""
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(number):
+            func()
+        timings.append((time.perf_counter() - start) / number * 1e6)
+    timings.sort()
+    return {
+        "ops_per_s": round(1e6 / percentile(timings, 0.5), 1),
+        "p50_us": round(percentile(timings, 0.5), 3),
+        "p95_us": round(percentile(timings, 0.95), 3),
+        "p99_us": round(percentile(timings, 0.99), 3),
+    }
+
+
+def run_micro(quick):
+    """Micro-benchmarks das funções de conversão do function.py."""
+    from function import (convert_api_to_current_city, convert_postgres_json, convert_postgres_historic,
+                          forecast, forecast_many, convert_batch, format_datetime)
+
+    weather = weather_payload('Osorio')
+    one_forecast = forecast_payload('Osorio')
+    forecasts = [forecast_payload(f'Cidade {i}') for i in range(100)]
+    weathers = [weather_payload(f'Cidade {i}') for i in range(100)]
+    queries = [(f'Cidade {i}', None) for i in range(100)]
+    today = date.today()
+    now = datetime.now()
+    historic_row = SimpleNamespace(
+        identidade=1, cidade='Osório', data=today, previsao='céu limpo', pais='https://flagsapi.com/BR/shiny/64.png',
+        vento='3.1 Km/h', icon='https://openweathermap.org/img/wn/01d@2x.png', umidade='80%', temp='20.0 °C',
+        temp_max='22.0 °C', temp_min='18.0 °C', id=3455775,
+    )
+    historic_rows = [(i, f'Cidade {i % 500}', today - timedelta(days=i // 500)) for i in range(1000)]
+
+    scale = 10 if quick else 1
+    cases = [
+        ('format_datetime', lambda: format_datetime(now), 20000),
+        ('convert_api_to_current_city', lambda: convert_api_to_current_city(weather), 5000),
+        ('convert_postgres_json', lambda: convert_postgres_json(historic_row), 5000),
+        ('convert_postgres_historic (1.000 linhas)', lambda: convert_postgres_historic(historic_rows), 50),
+        ('forecast', lambda: forecast(one_forecast), 1000),
+        ('forecast_many (100 previsões)', lambda: forecast_many(forecasts), 20),
+        ('convert_batch weather (100 cidades)', lambda: convert_batch(queries, weathers, True), 50),
+        ('convert_batch forecast (100 cidades)', lambda: convert_batch(queries, forecasts, False), 20),
+    ]
+    results = {}
+    for name, func, number in cases:
+        results[name] = measure_micro(name, func, max(1, number // scale), 3 if quick else 7)
+        print(f'  {name:<44} {results[name]["p50_us"]:>12.2f} µs')
+    return results
+
+
+def load_route(base_url, route, concurrency, total, seed):
+    """
+    Envia total requisições a uma rota com concurrency clientes simultâneos (cada um com a sua conexão keep-alive).
+
+    Retorna:
+    dict: vazão (req/s), percentis de latência em ms, erros (status diferente de 200 ou falha de conexão) e RSS.
+    """
+    import requests
+
+    name, method, build = route
+    per_client = [total // concurrency + (1 if i < total % concurrency else 0) for i in range(concurrency)]
+    latencies = []
+    errors = 0
+    lock = threading.Lock()
+
+    def client(index):
+        nonlocal errors
+        rnd = random.Random(seed * 1000 + index)
+        session = requests.Session()
+        local = []
+        local_errors = 0
+        for _ in range(per_client[index]):
+            path, params, body = build(rnd)
+            start = time.perf_counter()
+            try:
+                response = session.request(method, base_url + path, params=params, json=body, timeout=60)
+                response.content
+                if response.status_code != 200:
+                    local_errors += 1
+            except requests.RequestException:
+                local_errors += 1
+            local.append(time.perf_counter() - start)
+        session.close()
+        with lock:
+            latencies.extend(local)
+            errors += local_errors
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(concurrency) as executor:
+        list(executor.map(client, range(concurrency)))
+    elapsed = time.perf_counter() - start
+
+    latencies.sort()
+    return {
+        "route": name,
+        "concurrency": concurrency,
+        "requests": len(latencies),
+        "errors": errors,
+        "throughput": round(len(latencies) / elapsed, 1),
+        "p50_ms": round(percentile(latencies, 0.50) * 1000, 3),
+        "p95_ms": round(percentile(latencies, 0.95) * 1000, 3),
+        "p99_ms": round(percentile(latencies, 0.99) * 1000, 3),
+        "rss_mb": round(rss_mb(), 1),
+        "max_rss_mb": round(max_rss_mb(), 1),
+    }
+
+
+def run_macro(base_url, levels, total, routes):
+    results = {}
+    for route in ROUTES:
+        if routes and route[0] not in routes:
+            continue
+        for concurrency in levels:
+            result = load_route(base_url, route, concurrency, max(total, concurrency), seed=len(results))
+            results[f'{route[0]} c={concurrency}'] = result
+            print(f'  {route[0]:<22} c={concurrency:<4} {result["throughput"]:>9.1f} req/s   p50 {result["p50_ms"]:>8.2f} ms'
+                  f'   p95 {result["p95_ms"]:>8.2f} ms   p99 {result["p99_ms"]:>8.2f} ms   erros {result["errors"]:<4}'
+                  f' RSS {result["rss_mb"]:.0f} MiB')
+    return results
+
+
+def compare(results, baseline, threshold):
+    """
+    Compara os resultados com a linha de base.
+
+    Micro: µs por chamada (p50) maior que a base em mais de threshold.
+    Macro: vazão menor ou p95 maior que a base em mais de threshold.
+
+    Retorna:
+    list: Dicionários com a medida, a métrica, o valor da base, o valor atual e a variação (fração).
+    """
+    regressions = []
+
+    def check(section, name, metric, base, current, higher_is_better):
+        if not base:
+            return
+        change = (current - base) / base
+        if (higher_is_better and change < -threshold) or (not higher_is_better and change > threshold):
+            regressions.append({"section": section, "name": name, "metric": metric,
+                                "baseline": base, "current": current, "change": round(change, 4)})
+
+    for name, current in results.get('micro', {}).items():
+        base = baseline.get('micro', {}).get(name)
+        if base:
+            check('micro', name, 'p50_us', base['p50_us'], current['p50_us'], False)
+    for name, current in results.get('macro', {}).items():
+        base = baseline.get('macro', {}).get(name)
+        if base:
+            check('macro', name, 'throughput', base['throughput'], current['throughput'], True)
+            check('macro', name, 'p95_ms', base['p95_ms'], current['p95_ms'], False)
+    return regressions
+
+
+def start_server(kind, threads):
+    """Inicia o servidor da aplicação ('flask' com threads fixas ou 'asgi') e retorna (url, função para parar)."""
+    from bench_async import PooledWSGIServer, start_asgi
+
+    if kind == 'asgi':
+        import asgi
+
+        server, url = start_asgi(asgi.app)
+        return url, lambda: setattr(server, 'should_exit', True)
+    import main
+
+    server = PooledWSGIServer(main.app, threads)
+    return server.url, server.server.shutdown
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Suíte de benchmarks com resultado em JSON')
+    parser.add_argument('--output', help='Arquivo JSON do resultado')
+    parser.add_argument('--baseline', help='Resultado JSON anterior para comparar')
+    parser.add_argument('--threshold', type=float, default=0.15, help='Piora tolerada antes de marcar regressão (0.15 = 15%%)')
+    parser.add_argument('--only', choices=('micro', 'macro'), help='Executa somente os micro ou os macro benchmarks')
+    parser.add_argument('--routes', nargs='*', help='Rotas da carga, ex: "GET /weather" "GET /stats"')
+    parser.add_argument('--concurrency', type=int, nargs='*', default=list(CONCURRENCY_LEVELS))
+    parser.add_argument('--requests', type=int, default=400, help='Requisições por rota e nível de concorrência')
+    parser.add_argument('--server', choices=('flask', 'asgi'), default='flask')
+    parser.add_argument('--threads', type=int, default=8, help='Threads do servidor Flask')
+    parser.add_argument('--latency', type=float, default=0.02, help='Latência do stub da API em segundos')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='Fração das chamadas a API com erro 503')
+    parser.add_argument('--cities', type=int, default=500, help='Cidades no histórico')
+    parser.add_argument('--days', type=int, default=365, help='Dias de histórico por cidade')
+    parser.add_argument('--quick', action='store_true', help='Menos repetições e requisições, para conferência rápida')
+    args = parser.parse_args()
+    if args.quick:
+        args.requests = min(args.requests, 100)
+        args.days = min(args.days, 30)
+
+    stub = start_stub(latency=args.latency, error_rate=args.error_rate)
+    os.environ['OPENWEATHER_BASE_URL'] = stub.base_url
+    disable_limits()
+    os.environ.setdefault('DATABASE_URL', 'sqlite:///' + os.path.join(
+        tempfile.gettempdir(), f'bench_suite_{args.cities}x{args.days}.db'))
+
+    import crud
+    from cities import load_city_index, historic_cities
+
+    results = {
+        "meta": {
+            "timestamp": datetime.now().isoformat(timespec='seconds'),
+            "commit": git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "server": args.server,
+            "threads": args.threads,
+            "latency": args.latency,
+            "error_rate": args.error_rate,
+            "historic_rows": args.cities * args.days,
+            "requests": args.requests,
+        },
+    }
+
+    if args.only != 'macro':
+        print('micro (µs por chamada, mediana):')
+        results['micro'] = run_micro(args.quick)
+
+    if args.only != 'micro':
+        crud.init_engine()
+        seed_database(crud, args.cities, args.days)
+        load_city_index(entries=historic_cities(crud.list_known_cities()))
+        url, stop = start_server(args.server, args.threads)
+        print(f'macro ({args.server}, {args.requests} requisições por nível, API com {args.latency * 1000:.0f} ms):')
+        results['macro'] = run_macro(url, args.concurrency, args.requests, args.routes)
+        results['meta']['upstream_calls'] = stub.calls
+        stop()
+    stub.shutdown()
+
+    exit_code = 0
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as file:
+            baseline = json.load(file)
+        regressions = compare(results, baseline, args.threshold)
+        results['regressions'] = regressions
+        print(f'comparação com {args.baseline} (commit {baseline.get("meta", {}).get("commit")}, tolerância {args.threshold:.0%}):')
+        for item in regressions:
+            print(f'  REGRESSÃO {item["name"]:<44} {item["metric"]:<10} {item["baseline"]:>10} -> {item["current"]:>10} ({item["change"]:+.1%})')
+        if not regressions:
+            print('  nenhuma regressão')
+        exit_code = 1 if regressions else 0
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as file:
+            json.dump(results, file, indent=2, ensure_ascii=False)
+        print(f'resultado gravado em {args.output}')
+    sys.exit(exit_code)
@@ -0,0 +1,512 @@
+import asyncio
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from cities import normalize_name
+
+
+#Configuração do cache, pode ser ajustada por variáveis de ambiente
+CACHE_BACKEND = os.environ.get('CACHE_BACKEND', 'memory')
+CACHE_REDIS_URL = os.environ.get('CACHE_REDIS_URL', 'redis://localhost:6379/0')
+CACHE_MAX_ENTRIES = int(os.environ.get('CACHE_MAX_ENTRIES', 2048))
+#Segundos que um valor expirado ainda pode ser servido quando a API estiver fora do ar
+CACHE_STALE_TTL = int(os.environ.get('CACHE_STALE_TTL', 86400))
+
+#Memória máxima (bytes) do cache de registros do histórico (/listHistoric), '0' desativa
+RECORD_CACHE_MAX_BYTES = int(os.environ.get('RECORD_CACHE_MAX_BYTES', 16 * 1024 * 1024))
+
+#Tempo de vida em segundos de cada end-point da OpenWeather
+CACHE_TTL = {
+    'weather': int(os.environ.get('CACHE_TTL_WEATHER', 300)),
+    'forecast': int(os.environ.get('CACHE_TTL_FORECAST', 1800)),
+}
+
+#Modo combinado: '1' responde /weather e /forecast com a mesma resposta do end-point forecast, uma chamada a API por cidade
+WEATHER_COMBINED = os.environ.get('WEATHER_COMBINED', '0') == '1'
+#Idade máxima em segundos da resposta do forecast usada para as condições atuais no modo combinado (limita o TTL do forecast)
+WEATHER_COMBINED_MAX_AGE = int(os.environ.get('WEATHER_COMBINED_MAX_AGE', 1800))
+if WEATHER_COMBINED:
+    CACHE_TTL['forecast'] = min(CACHE_TTL['forecast'], WEATHER_COMBINED_MAX_AGE)
+
+
+def normalize_city(city_name):
+    """
+    Normaliza o nome da cidade para uso como chave de cache (cities.normalize_name, sem acentos).
+
+    Exemplo de Uso:
+    - normalize_city("  São   Paulo ") retorna "sao paulo"
+    """
+    return normalize_name(city_name)
+
+
+def cache_key(city_name, endpoint, city_id=None, cell=None):
+    """
+    Monta a chave de cache a partir do end-point ('weather' ou 'forecast') e do nome da cidade normalizado,
+    do ID da cidade na OpenWeather quando informado, ou da célula do geohash nas consultas por coordenadas.
+    """
+    if city_id is not None:
+        return f'{endpoint}:#{city_id}'
+    if cell is not None:
+        return f'{endpoint}:@{cell}'
+    return f'{endpoint}:{normalize_city(city_name)}'
+
+
+class CachedResponse(dict):
+    """
+    Resposta da API guardada pelo WeatherCache: o próprio dicionário da API, com o atributo model para o modelo
+    normalizado (models.weather_model). O modelo vive o mesmo tempo que a resposta, ao ser removida ou substituída
+    no cache os dois são liberados juntos.
+    """
+    __slots__ = ('model',)
+
+
+def cached_response(value):
+    """Converte um dicionário da API em CachedResponse, uma única vez, os demais valores são retornados iguais."""
+    if type(value) is dict:
+        return CachedResponse(value)
+    return value
+
+
+class MemoryBackend:
+    """
+    Armazenamento do cache em memória do processo, com expiração (TTL) e remoção LRU.
+    Valores expirados continuam guardados até serem removidos pelo LRU, para uso com allow_stale.
+
+    Atributos:
+        max_entries (int): Quantidade máxima de chaves, ao exceder a menos usada é removida.
+        evictions (int): Quantidade de chaves removidas pelo limite de tamanho.
+        blocking (bool): False, as operações não fazem I/O e rodam direto no loop do modo ASGI.
+    """
+    blocking = False
+
+    def __init__(self, max_entries=CACHE_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self.evictions = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, allow_stale=False):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            value, expires_at = item
+            if expires_at < time.monotonic() and not allow_stale:
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def ttl_remaining(self, key):
+        """Retorna os segundos até a chave expirar (negativo se já expirou), ou None se não existir."""
+        item = self._data.get(key)
+        if item is None:
+            return None
+        return item[1] - time.monotonic()
+
+    def set(self, key, value, ttl):
+        with self._lock:
+            self._data[key] = (value, time.monotonic() + ttl)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def __len__(self):
+        return len(self._data)
+
+
+class RedisBackend:
+    """
+    Armazenamento do cache em um servidor compatível com Redis, compartilhado entre processos.
+    A chave fica no Redis por ttl + CACHE_STALE_TTL (SETEX) e o vencimento do ttl é guardado junto com o valor,
+    a remoção por tamanho fica a cargo da política maxmemory do servidor.
+
+    Observação:
+    Requer a biblioteca redis (python -m pip install redis). O cliente é síncrono (blocking), no modo ASGI
+    as operações rodam em uma thread (WeatherCache.backend_async).
+    """
+    blocking = True
+
+    def __init__(self, url=CACHE_REDIS_URL, prefix='weather_cache:'):
+        import redis
+
+        self.client = redis.Redis.from_url(url)
+        self.prefix = prefix
+        self.evictions = 0
+
+    def get(self, key, allow_stale=False):
+        item = self.client.get(self.prefix + key)
+        if item is None:
+            return None
+        item = json.loads(item)
+        if item['expires_at'] < time.time() and not allow_stale:
+            return None
+        return item['value']
+
+    def ttl_remaining(self, key):
+        """Retorna os segundos até a chave expirar (negativo se já expirou), ou None se não existir."""
+        item = self.client.get(self.prefix + key)
+        if item is None:
+            return None
+        return json.loads(item)['expires_at'] - time.time()
+
+    def set(self, key, value, ttl):
+        item = {'value': value, 'expires_at': time.time() + ttl}
+        self.client.setex(self.prefix + key, ttl + CACHE_STALE_TTL, json.dumps(item))
+
+    def __len__(self):
+        return sum(1 for _ in self.client.scan_iter(match=self.prefix + '*'))
+
+
+class _Flight:
+    """Requisição em andamento para uma chave, compartilhada pelas threads que aguardam o mesmo resultado."""
+    def __init__(self):
+        self.event = threading.Event()
+        self.value = None
+        self.error = None
+
+
+class WeatherCache:
+    """
+    Cache com TTL na frente das chamadas da API, com agrupamento de requisições (single-flight):
+    várias requisições simultâneas para a mesma chave ausente fazem apenas uma chamada a API.
+    Os dicionários da API são guardados como CachedResponse, o mesmo objeto é retornado a todas as requisições.
+
+    Atributos:
+        backend: Armazenamento usado (MemoryBackend ou RedisBackend).
+        hits (int): Consultas respondidas pelo cache.
+        misses (int): Consultas que chamaram a API.
+        coalesced (int): Consultas que aguardaram uma chamada já em andamento.
+        stale_served (int): Valores expirados servidos enquanto a API estava indisponível.
+        refreshes (int): Valores renovados em segundo plano (refresh), fora das requisições.
+    """
+    def __init__(self, backend):
+        self.backend = backend
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.stale_served = 0
+        self.refreshes = 0
+        self._lock = threading.Lock()
+        self._inflight = {}
+        self._async_inflight = {}
+
+    def get(self, key):
+        """Retorna o valor da chave, ou None se não existir ou estiver expirado."""
+        value = self.backend.get(key)
+        with self._lock:
+            if value is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return value
+
+    def set(self, key, value, ttl):
+        """
+        Grava o valor na chave.
+
+        Retorna:
+        O valor guardado (dicionários viram CachedResponse, ver cached_response()).
+        """
+        value = cached_response(value)
+        self.backend.set(key, value, ttl)
+        return value
+
+    def get_stale(self, key):
+        """Retorna o último valor guardado para a chave, mesmo expirado, ou None."""
+        value = self.backend.get(key, allow_stale=True)
+        if value is not None:
+            with self._lock:
+                self.stale_served += 1
+        return value
+
+    async def get_stale_async(self, key):
+        """Versão assíncrona de get_stale(), para uso no modo ASGI (asgi.py)."""
+        value = await self.backend_async(self.backend.get, key, allow_stale=True)
+        if value is not None:
+            with self._lock:
+                self.stale_served += 1
+        return value
+
+    def ttl_remaining(self, key):
+        """Retorna os segundos até a chave expirar (negativo se já expirou), ou None se não existir."""
+        return self.backend.ttl_remaining(key)
+
+    def refresh(self, key, ttl, fetch, cacheable=lambda value: True):
+        """
+        Busca o valor da chave com fetch() e grava no cache mesmo que ainda esteja válido, usado pelo scheduler.RefreshScheduler.
+        As requisições que chegarem para a mesma chave durante a busca aguardam o resultado (single-flight).
+
+        Retorna:
+        bool: True se o valor foi renovado, False se já havia uma busca em andamento ou o valor não pode ser guardado.
+
+        Exceções:
+        Repassa as exceções de fetch().
+        """
+        with self._lock:
+            if key in self._inflight:
+                return False
+            flight = _Flight()
+            self._inflight[key] = flight
+
+        try:
+            value = cached_response(fetch())
+            flight.value = value
+            if not cacheable(value):
+                return False
+            self.backend.set(key, value, ttl)
+            with self._lock:
+                self.refreshes += 1
+            return True
+        except Exception as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._inflight[key]
+            flight.event.set()
+
+    def get_or_fetch(self, key, ttl, fetch, cacheable=lambda value: True):
+        """
+        Retorna o valor da chave pelo cache ou chama fetch() uma única vez por chave ausente.
+
+        Parâmetros:
+        key (str): Chave do cache, ver cache_key().
+        ttl (int): Tempo de vida em segundos do valor obtido.
+        fetch (callable): Função sem parâmetros que busca o valor na API.
+        cacheable (callable, opcional): Recebe o valor e retorna se ele pode ser guardado (ex: não guardar erros).
+
+        Retorna:
+        O valor do cache ou o retorno de fetch().
+        """
+        value = self.backend.get(key)
+        if value is not None:
+            with self._lock:
+                self.hits += 1
+            return value
+
+        with self._lock:
+            flight = self._inflight.get(key)
+            leader = flight is None
+            if leader:
+                flight = _Flight()
+                self._inflight[key] = flight
+                self.misses += 1
+            else:
+                self.coalesced += 1
+
+        if not leader:
+            flight.event.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.value
+
+        try:
+            value = cached_response(fetch())
+            flight.value = value
+            if cacheable(value):
+                self.backend.set(key, value, ttl)
+            return value
+        except Exception as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._inflight[key]
+            flight.event.set()
+
+    async def backend_async(self, method, *args, **kwargs):
+        """Chama uma operação do backend no modo ASGI, em uma thread quando ela bloqueia (RedisBackend) para não parar o loop."""
+        if self.backend.blocking:
+            return await asyncio.to_thread(method, *args, **kwargs)
+        return method(*args, **kwargs)
+
+    async def get_or_fetch_async(self, key, ttl, fetch, cacheable=lambda value: True):
+        """
+        Versão assíncrona de get_or_fetch(), para uso no modo ASGI (asgi.py).
+
+        Parâmetros:
+        fetch (callable): Função sem parâmetros que retorna uma corrotina que busca o valor na API.
+        Os demais parâmetros são iguais aos de get_or_fetch().
+        """
+        value = await self.backend_async(self.backend.get, key)
+        if value is not None:
+            with self._lock:
+                self.hits += 1
+            return value
+
+        with self._lock:
+            future = self._async_inflight.get(key)
+            leader = future is None
+            if leader:
+                future = asyncio.get_running_loop().create_future()
+                self._async_inflight[key] = future
+                self.misses += 1
+            else:
+                self.coalesced += 1
+
+        if not leader:
+            return await asyncio.shield(future)
+
+        try:
+            value = cached_response(await fetch())
+            future.set_result(value)
+            if cacheable(value):
+                await self.backend_async(self.backend.set, key, value, ttl)
+            return value
+        except BaseException as e:
+            #a gravação no backend pode falhar depois do resultado entregue às demais requisições
+            if not future.done():
+                future.set_exception(e)
+                #marca a exceção como lida caso nenhuma outra requisição esteja aguardando
+                future.exception()
+            raise
+        finally:
+            with self._lock:
+                del self._async_inflight[key]
+
+    def stats(self):
+        """
+        Retorna os contadores do cache.
+
+        Retorna:
+        dict: hits, misses, coalesced, evictions, entries e hit_ratio.
+        """
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "backend": type(self.backend).__name__,
+                "hits": self.hits,
+                "misses": self.misses,
+                "coalesced": self.coalesced,
+                "stale_served": self.stale_served,
+                "refreshes": self.refreshes,
+                "evictions": self.backend.evictions,
+                "entries": len(self.backend),
+                "hit_ratio": round(self.hits / total, 4) if total else 0.0,
+            }
+
+
+class RecordCache:
+    """
+    Cache dos registros do histórico já convertidos em JSON (bytes), pela identidade e pelo idioma da data.
+    Os registros do histórico não mudam depois de gravados, então não expiram, só são removidos pelo LRU
+    quando a soma dos tamanhos passa de max_bytes.
+
+    Atributos:
+        max_bytes (int): Memória máxima aproximada (JSON + 100 bytes por registro).
+        size (int): Memória usada.
+        hits (int): Registros respondidos pelo cache.
+        misses (int): Registros buscados no banco.
+        evictions (int): Registros removidos pelo limite de memória.
+    """
+
+    #Custo aproximado da chave e da entrada do OrderedDict, somado ao tamanho do JSON
+    overhead = 100
+
+    def __init__(self, max_bytes=RECORD_CACHE_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get_many(self, identities, language):
+        """
+        Retorna os registros encontrados no cache.
+
+        Retorna:
+        tuple: (dicionário identidade -> JSON em bytes, lista das identidades ausentes)
+        """
+        found = {}
+        missing = []
+        with self._lock:
+            for identity in identities:
+                body = self._data.get((identity, language))
+                if body is None:
+                    missing.append(identity)
+                else:
+                    self._data.move_to_end((identity, language))
+                    found[identity] = body
+            self.hits += len(found)
+            self.misses += len(missing)
+        return found, missing
+
+    def set(self, identity, language, body):
+        cost = len(body) + self.overhead
+        if cost > self.max_bytes:
+            return
+        with self._lock:
+            old = self._data.pop((identity, language), None)
+            if old is not None:
+                self.size -= len(old) + self.overhead
+            self._data[(identity, language)] = body
+            self.size += cost
+            while self.size > self.max_bytes:
+                _, removed = self._data.popitem(last=False)
+                self.size -= len(removed) + self.overhead
+                self.evictions += 1
+
+    def get_or_load(self, identities, language, load, encode):
+        """
+        Retorna o JSON dos registros, buscando no banco de uma vez só os ausentes no cache.
+
+        Parâmetros:
+        identities (list): Identidades (PK) dos registros.
+        language (str): Idioma da data formatada (dates.current_language).
+        load (callable): Recebe a lista de identidades ausentes e retorna as linhas do banco (com o campo identidade).
+        encode (callable): Recebe uma linha e retorna o JSON em bytes.
+
+        Retorna:
+        dict: identidade -> JSON em bytes, sem as identidades que não existem no banco.
+        """
+        found, missing = self.get_many(identities, language)
+        if missing:
+            for row in load(missing) or []:
+                body = encode(row)
+                found[row.identidade] = body
+                self.set(row.identidade, language, body)
+        return found
+
+    async def get_or_load_async(self, identities, language, load, encode):
+        """Versão assíncrona de get_or_load(), load retorna uma corrotina."""
+        found, missing = self.get_many(identities, language)
+        if missing:
+            for row in await load(missing) or []:
+                body = encode(row)
+                found[row.identidade] = body
+                self.set(row.identidade, language, body)
+        return found
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "entries": len(self._data),
+                "bytes": self.size,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_ratio": round(self.hits / total, 4) if total else 0.0,
+            }
+
+
+def build_backend(name=CACHE_BACKEND):
+    """
+    Cria o armazenamento do cache pelo nome configurado em CACHE_BACKEND ('memory' ou 'redis').
+    """
+    if name == 'redis':
+        return RedisBackend()
+    return MemoryBackend()
+
+
+#Cache único do processo usado pelo api.get_weather_data
+weather_cache = WeatherCache(build_backend())
+
+#Cache único do processo dos registros do histórico (/listHistoric)
+record_cache = RecordCache()
@@ -0,0 +1,297 @@
+import gzip
+import json
+import os
+import sys
+import threading
+import unicodedata
+from array import array
+from bisect import bisect_left, bisect_right, insort
+from heapq import merge
+from geo import geo_index
+
+
+#Arquivo com a lista de cidades da OpenWeather (city.list.json ou city.list.json.gz)
+#documentação = https://bulk.openweathermap.org/sample/
+CITY_LIST_FILE = os.environ.get('CITY_LIST_FILE', '')
+#País preferido quando o mesmo nome existe em mais de um país (ex: 'Osorio' no BR)
+CITY_DEFAULT_COUNTRY = os.environ.get('CITY_DEFAULT_COUNTRY', 'BR').upper()
+#Resolve o nome da cidade para o ID da OpenWeather antes de chamar a API ('0' desativa)
+CITY_RESOLVE_IDS = os.environ.get('CITY_RESOLVE_IDS', '1') != '0'
+#Máximo de cidades retornadas pelo autocompletar
+CITY_SUGGEST_LIMIT = int(os.environ.get('CITY_SUGGEST_LIMIT', 10))
+#Cidades aprendidas guardadas à parte antes de serem incorporadas aos arrays ordenados do índice
+CITY_PENDING_MAX = int(os.environ.get('CITY_PENDING_MAX', 256))
+
+
+def normalize_name(name):
+    """
+    Normaliza o nome da cidade para busca: sem acentos, minúsculo e com espaços simples.
+
+    Exemplo de Uso:
+    - normalize_name("  Osório ") retorna "osorio"
+    """
+    text = unicodedata.normalize('NFKD', str(name))
+    text = ''.join(char for char in text if not unicodedata.combining(char))
+    return ' '.join(text.split()).casefold()
+
+
+def split_country(query):
+    """
+    Separa o país do nome no formato aceito pela OpenWeather ('cidade,BR').
+
+    Retorna:
+    tuple: (nome, país em maiúsculas ou None)
+    """
+    name, _, country = str(query).rpartition(',')
+    country = country.strip()
+    if name.strip() and len(country) == 2 and country.isalpha():
+        return name, country.upper()
+    return str(query), None
+
+
+class CityIndex:
+    """
+    Índice de cidades em memória para converter nomes em IDs da OpenWeather e para o autocompletar.
+
+    As cidades ficam em arrays paralelos ordenados pelo nome normalizado (keys), a busca por nome exato
+    e por prefixo é feita com busca binária (bisect), sem percorrer a lista.
+
+    As cidades aprendidas (add) vão para uma lista pequena e ordenada à parte (pending), consultada junto com os
+    arrays pelo lookup e pelo suggest. Ao passar de pending_max cidades a lista é incorporada aos arrays de uma vez
+    (uma intercalação O(n)), no lugar de uma inserção O(n) em cada array a cada cidade nova.
+
+    Atributos:
+        keys (list): Nomes normalizados (normalize_name), em ordem.
+        names (list): Nomes originais das cidades.
+        countries (list): Siglas dos países.
+        ids (array): IDs das cidades na OpenWeather.
+        pending_max (int): Cidades aprendidas guardadas à parte antes de incorporar aos arrays.
+        learned (int): Cidades acrescentadas a partir das respostas da API.
+        merges (int): Incorporações da lista à parte nos arrays.
+    """
+    def __init__(self, entries=(), pending_max=CITY_PENDING_MAX):
+        self._lock = threading.Lock()
+        self.pending_max = pending_max
+        self.learned = 0
+        self.merges = 0
+        self.build(entries)
+
+    def build(self, entries):
+        """
+        Recria o índice.
+
+        Parâmetros:
+        entries (iterable): Tuplas (nome, país, id).
+        """
+        rows = sorted({(normalize_name(name), name, (country or '').upper(), int(city_id)) for name, country, city_id in entries})
+        with self._lock:
+            self.keys = [row[0] for row in rows]
+            self.names = [row[1] for row in rows]
+            #poucas siglas diferentes, sys.intern guarda uma cópia de cada
+            self.countries = [sys.intern(row[2]) for row in rows]
+            self.ids = array('q', (row[3] for row in rows))
+            #(nome normalizado, ordem de chegada, nome, país, id), em ordem
+            self._pending = []
+
+    def __len__(self):
+        return len(self.keys) + len(self._pending)
+
+    def _pending_run(self, key):
+        """Posição da primeira cidade da lista à parte com nome >= key."""
+        return bisect_left(self._pending, (key,))
+
+    def _merge_pending(self):
+        """Incorpora a lista à parte aos arrays ordenados, as cidades aprendidas ficam depois das de mesmo nome."""
+        keys, names, countries, ids = [], [], [], array('q')
+        start = 0
+        for key, _, name, country, city_id in self._pending:
+            #copia por fatias até a posição da cidade, sem percorrer os arrays em Python
+            position = bisect_right(self.keys, key, start)
+            keys += self.keys[start:position]
+            names += self.names[start:position]
+            countries += self.countries[start:position]
+            ids += self.ids[start:position]
+            keys.append(key)
+            names.append(name)
+            countries.append(country)
+            ids.append(city_id)
+            start = position
+        keys += self.keys[start:]
+        names += self.names[start:]
+        countries += self.countries[start:]
+        ids += self.ids[start:]
+        self.keys, self.names, self.countries, self.ids = keys, names, countries, ids
+        self._pending = []
+        self.merges += 1
+
+    def add(self, name, country, city_id):
+        """
+        Acrescenta uma cidade ao índice, mantendo a ordem, se ainda não existir.
+
+        Retorna:
+        bool: True se a cidade foi acrescentada.
+        """
+        key = normalize_name(name)
+        country = (country or '').upper()
+        city_id = int(city_id)
+        with self._lock:
+            position = bisect_left(self.keys, key)
+            while position < len(self.keys) and self.keys[position] == key:
+                if self.ids[position] == city_id:
+                    return False
+                position += 1
+            position = self._pending_run(key)
+            while position < len(self._pending) and self._pending[position][0] == key:
+                if self._pending[position][4] == city_id:
+                    return False
+                position += 1
+            insort(self._pending, (key, self.learned, name, sys.intern(country), city_id))
+            self.learned += 1
+            if len(self._pending) > self.pending_max:
+                self._merge_pending()
+            return True
+
+    def learn(self, data):
+        """
+        Acrescenta a cidade de uma resposta de sucesso da API (end-point weather ou forecast) ao índice.
+        """
+        if not isinstance(data, dict):
+            return False
+        city = data.get('city') if isinstance(data.get('city'), dict) else data
+        country = city.get('country') or (city.get('sys') or {}).get('country')
+        if city.get('id') and city.get('name'):
+            return self.add(city['name'], country, city['id'])
+        return False
+
+    def lookup(self, query, country=None):
+        """
+        Retorna o ID da OpenWeather da cidade pelo nome, sem diferenciar acentos e maiúsculas.
+
+        Parâmetros:
+        query (str): Nome da cidade, aceita o país no formato 'cidade,BR'.
+        country (str, opcional): Sigla do país preferido, por padrão CITY_DEFAULT_COUNTRY.
+
+        Retorna:
+        int: ID da cidade, ou None se não estiver no índice. Com o mesmo nome em vários países é escolhida a do país
+             preferido, sem ela retorna None (o nome é ambíguo, a consulta usa q= na OpenWeather).
+
+        Exemplo de Uso:
+        - city_index.lookup('osorio') retorna 3455775
+        """
+        name, query_country = split_country(query)
+        key = normalize_name(name)
+        wanted = query_country or (country or CITY_DEFAULT_COUNTRY).upper()
+        with self._lock:
+            position = bisect_left(self.keys, key)
+            found = set()
+            while position < len(self.keys) and self.keys[position] == key:
+                if self.countries[position] == wanted:
+                    return self.ids[position]
+                found.add(self.ids[position])
+                position += 1
+            position = self._pending_run(key)
+            while position < len(self._pending) and self._pending[position][0] == key:
+                _, _, _, city_country, city_id = self._pending[position]
+                if city_country == wanted:
+                    return city_id
+                found.add(city_id)
+                position += 1
+        #sem o país pedido na consulta ('cidade,XX'), somente um nome único no índice
+        if query_country is None and len(found) == 1:
+            return found.pop()
+        return None
+
+    def suggest(self, prefix, limit=CITY_SUGGEST_LIMIT, country=None):
+        """
+        Retorna as cidades cujo nome começa com o prefixo, para o autocompletar.
+
+        Parâmetros:
+        prefix (str): Início do nome, sem diferenciar acentos e maiúsculas.
+        limit (int, opcional): Máximo de cidades retornadas.
+        country (str, opcional): Filtra pela sigla do país.
+
+        Retorna:
+        list: Dicionários com id, cidade e pais, em ordem alfabética.
+        """
+        key = normalize_name(prefix)
+        if not key:
+            return []
+        country = country.upper() if country else None
+        result = []
+        learned = []
+        with self._lock:
+            position = bisect_left(self.keys, key)
+            while position < len(self.keys) and len(result) < limit and self.keys[position].startswith(key):
+                if country is None or self.countries[position] == country:
+                    result.append((self.keys[position], self.ids[position], self.names[position], self.countries[position]))
+                position += 1
+            position = self._pending_run(key)
+            while position < len(self._pending) and len(learned) < limit and self._pending[position][0].startswith(key):
+                city_key, _, name, city_country, city_id = self._pending[position]
+                if country is None or city_country == country:
+                    learned.append((city_key, city_id, name, city_country))
+                position += 1
+        if learned:
+            result = list(merge(result, learned, key=lambda row: row[0]))[:limit]
+        return [{"id": city_id, "cidade": name, "pais": city_country} for _, city_id, name, city_country in result]
+
+    def stats(self):
+        with self._lock:
+            return {"cities": len(self.keys) + len(self._pending), "pending": len(self._pending),
+                    "learned": self.learned, "merges": self.merges}
+
+
+def read_city_list(path, locations=None):
+    """
+    Lê o arquivo de cidades da OpenWeather (lista JSON de {id, name, country, coord, ...}, pode estar em .gz).
+
+    Parâmetros:
+    path (str): Caminho do arquivo.
+    locations (list, opcional): Recebe as tuplas (lat, lon, id) das cidades com coordenadas, na mesma leitura.
+
+    Retorna:
+    generator: Tuplas (nome, país, id).
+    """
+    opener = gzip.open if path.endswith('.gz') else open
+    with opener(path, 'rt', encoding='utf-8') as file:
+        for city in json.load(file):
+            coord = city.get('coord')
+            if locations is not None and coord:
+                locations.append((coord['lat'], coord['lon'], city['id']))
+            yield city['name'], city.get('country', ''), city['id']
+
+
+def historic_cities(rows):
+    """
+    Converte as cidades do histórico (crud.list_known_cities) em tuplas (nome, país, id) para o índice.
+    O país vem da url da bandeira gravada (ex: 'https://flagsapi.com/BR/shiny/64.png').
+    """
+    for name, flag, city_id in rows:
+        if name and city_id:
+            parts = (flag or '').split('/')
+            yield name, parts[3] if len(parts) > 3 else '', city_id
+
+
+def load_city_index(path=CITY_LIST_FILE, entries=()):
+    """
+    Carrega o índice de cidades do processo com o arquivo de cidades (se configurado) e as cidades informadas,
+    e o índice espacial (geo.geo_index) com as coordenadas do arquivo.
+
+    Parâmetros:
+    path (str, opcional): Caminho do city.list.json, por padrão CITY_LIST_FILE.
+    entries (iterable, opcional): Tuplas (nome, país, id) a mais, ex: as cidades já gravadas no histórico.
+
+    Retorna:
+    CityIndex: O índice do processo (city_index).
+    """
+    rows = list(entries)
+    locations = []
+    if path:
+        rows.extend(read_city_list(path, locations))
+    city_index.build(rows)
+    geo_index.build(locations)
+    return city_index
+
+
+#Índice de cidades único do processo, preenchido por load_city_index() e pelas respostas da API
+city_index = CityIndex()
@@ -0,0 +1,105 @@
+import os
+from contextvars import ContextVar
+from datetime import date
+from functools import lru_cache
+
+
+#Nomes dos dias da semana (segunda-feira primeiro, igual a date.weekday()) e dos meses de cada idioma suportado
+WEEKDAYS = {
+    'pt': ('segunda-feira', 'terça-feira', 'quarta-feira', 'quinta-feira', 'sexta-feira', 'sábado', 'domingo'),
+    'es': ('lunes', 'martes', 'miércoles', 'jueves', 'viernes', 'sábado', 'domingo'),
+    'en': ('Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday'),
+}
+MONTHS = {
+    'pt': ('janeiro', 'fevereiro', 'março', 'abril', 'maio', 'junho',
+           'julho', 'agosto', 'setembro', 'outubro', 'novembro', 'dezembro'),
+    'es': ('enero', 'febrero', 'marzo', 'abril', 'mayo', 'junio',
+           'julio', 'agosto', 'septiembre', 'octubre', 'noviembre', 'diciembre'),
+    'en': ('January', 'February', 'March', 'April', 'May', 'June',
+           'July', 'August', 'September', 'October', 'November', 'December'),
+}
+
+#Formato da data de cada idioma, 'pt' é o mesmo do antigo strftime("%A, %d de %B de %Y") com o locale pt_BR
+PATTERNS = {
+    'pt': '{weekday}, {day:02d} de {month} de {year}',
+    'es': '{weekday}, {day:02d} de {month} de {year}',
+    'en': '{weekday}, {month} {day:02d}, {year}',
+}
+
+#Idioma usado quando a requisição não informa um idioma suportado
+DEFAULT_LANGUAGE = os.environ.get('DEFAULT_LANGUAGE', 'pt')
+if DEFAULT_LANGUAGE not in PATTERNS:
+    DEFAULT_LANGUAGE = 'pt'
+#Quantidade de datas formatadas mantidas em memória (por idioma)
+DATE_CACHE_SIZE = int(os.environ.get('DATE_CACHE_SIZE', 4096))
+
+#Idioma da requisição atual, isolado por thread (Flask) e por tarefa (asyncio/Quart)
+current_language = ContextVar('current_language', default=DEFAULT_LANGUAGE)
+
+
+def resolve_language(value):
+    """
+    Escolhe o idioma suportado a partir do parâmetro lang ou do cabeçalho Accept-Language.
+
+    Parâmetros:
+    value (str): Ex: 'en', 'pt-BR' ou 'es-AR,es;q=0.9,en;q=0.8'.
+
+    Retorna:
+    str: O primeiro idioma suportado na ordem de preferência, ou DEFAULT_LANGUAGE.
+
+    Exemplo de Uso:
+    - resolve_language('en-US,en;q=0.9') retorna 'en'
+    """
+    candidates = []
+    for position, part in enumerate((value or '').split(',')):
+        tag, _, params = part.strip().partition(';')
+        quality = 1.0
+        if params.strip().startswith('q='):
+            try:
+                quality = float(params.strip()[2:])
+            except ValueError:
+                quality = 0.0
+        candidates.append((-quality, position, tag.split('-')[0].strip().lower()))
+    for quality, _, language in sorted(candidates):
+        if quality < 0 and language in PATTERNS:
+            return language
+    return DEFAULT_LANGUAGE
+
+
+def set_language(value):
+    """
+    Define o idioma da requisição atual (ver resolve_language).
+
+    Retorna:
+    str: O idioma escolhido.
+    """
+    language = resolve_language(value)
+    current_language.set(language)
+    return language
+
+
+@lru_cache(maxsize=DATE_CACHE_SIZE)
+def format_ordinal(ordinal, language):
+    """Formata a data do dia ordinal (date.toordinal()) no idioma informado, com cache em memória."""
+    day = date.fromordinal(ordinal)
+    return PATTERNS[language].format(
+        weekday=WEEKDAYS[language][day.weekday()],
+        day=day.day,
+        month=MONTHS[language][day.month - 1],
+        year=day.year,
+    )
+
+
+def format_date(value, language=None):
+    """
+    Formata uma data (date ou datetime, o horário é ignorado) por extenso, sem depender do locale do sistema.
+
+    Parâmetros:
+    value (date): Data a ser formatada.
+    language (str, opcional): 'pt', 'es' ou 'en', por padrão o idioma da requisição atual.
+
+    Retorna:
+    str: Ex: 'domingo, 20 de agosto de 2023'.
+    """
+    language = language if language in PATTERNS else current_language.get()
+    return format_ordinal(value.toordinal(), language)
@@ -0,0 +1,198 @@
+"""
+Exportação do histórico completo em streaming (/export), em CSV, NDJSON ou Arrow IPC (formato stream).
+
+Todas as colunas da tabela (crud.EXPORT_COLUMNS) em ordem crescente de identidade, com os filtros city, id, start e end:
+primeiro os meses arquivados (archive.py), lidos como tabelas do Arrow, depois as linhas do banco, lidas com um cursor
+no servidor em blocos de HISTORIC_EXPORT_BATCH linhas, sem objetos do ORM. No PostgreSQL o CSV do banco vem direto
+do COPY (SELECT ...) TO STDOUT. A memória usada é a de um bloco, qualquer que seja a quantidade de linhas.
+"""
+import asyncio
+import io
+import json
+import math
+from datetime import date, datetime
+
+from archive import historic_archive, archive_table, ARCHIVE_SCHEMA, pa
+from crud import EXPORT_COLUMNS, live_filters, stream_export_rows, copy_export_csv, get_engine
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+#Formatos da exportação e o tipo de conteúdo da resposta
+EXPORT_FORMATS = {
+    'csv': 'text/csv',
+    'ndjson': 'application/x-ndjson',
+    'arrow': 'application/vnd.apache.arrow.stream',
+}
+
+COLUMN_NAMES = [column.name for column in EXPORT_COLUMNS]
+
+
+def json_line(record):
+    """Uma linha do NDJSON, datas em ISO 8601."""
+    if orjson is not None:
+        return orjson.dumps(record, option=orjson.OPT_APPEND_NEWLINE)
+    return (json.dumps(record, ensure_ascii=False, default=lambda value: value.isoformat()) + '\n').encode()
+
+
+#Valores de float que o PostgreSQL escreve por extenso
+FLOAT_NAMES = {'nan': 'NaN', 'inf': 'Infinity', '-inf': '-Infinity'}
+
+
+def csv_field(value):
+    """
+    Um campo do CSV no formato do COPY ... (FORMAT csv) do PostgreSQL: nulo vazio, texto entre aspas somente quando
+    necessário (vírgula, aspas, quebra de linha ou texto vazio), datas 'AAAA-MM-DD HH:MM:SS[.ffffff]' sem zeros
+    finais nos microssegundos e floats sem '.0' (ex: 50 e 81.5).
+
+    Exemplo de Uso:
+    - csv_field(50.0) retorna '50'
+    - csv_field(datetime(2025, 10, 5, 10, 0)) retorna '2025-10-05 10:00:00'
+    """
+    if value is None:
+        return ''
+    if isinstance(value, float):
+        text = repr(value)
+        if not math.isfinite(value):
+            return FLOAT_NAMES[text]
+        return text[:-2] if text.endswith('.0') else text
+    if isinstance(value, datetime):
+        text = value.isoformat(' ')
+        return text.rstrip('0') if '.' in text else text
+    if isinstance(value, date):
+        return value.isoformat()
+    text = str(value)
+    if not text or ',' in text or '"' in text or '\n' in text or '\r' in text:
+        return '"' + text.replace('"', '""') + '"'
+    return text
+
+
+class CsvEncoder:
+    """
+    CSV com cabeçalho, no mesmo formato do COPY do PostgreSQL (csv_field). As linhas do banco e os meses
+    arquivados passam pela mesma formatação, a resposta não muda no limite do arquivo.
+    """
+
+    def header(self):
+        return (','.join(COLUMN_NAMES) + '\n').encode()
+
+    def rows(self, rows):
+        return ''.join(','.join(map(csv_field, row)) + '\n' for row in rows).encode()
+
+    def table(self, table):
+        #colunas na ordem de COLUMN_NAMES (ARCHIVE_SCHEMA)
+        return self.rows(zip(*(column.to_pylist() for column in table.columns)))
+
+    def footer(self):
+        return b''
+
+
+class NdjsonEncoder:
+    """Um objeto JSON por linha, com os nomes das colunas."""
+
+    def header(self):
+        return b''
+
+    def rows(self, rows):
+        return b''.join(json_line(dict(zip(COLUMN_NAMES, row))) for row in rows)
+
+    def table(self, table):
+        return b''.join(json_line(record) for record in table.to_pylist())
+
+    def footer(self):
+        return b''
+
+
+class ArrowEncoder:
+    """Arrow IPC em formato stream: o esquema (ARCHIVE_SCHEMA), um lote por bloco de linhas e o marcador de fim."""
+
+    def __init__(self):
+        self.sink = io.BytesIO()
+        self.writer = pa.ipc.new_stream(self.sink, ARCHIVE_SCHEMA)
+
+    def take(self):
+        data = self.sink.getvalue()
+        self.sink.seek(0)
+        self.sink.truncate()
+        return data
+
+    def header(self):
+        return self.take()
+
+    def rows(self, rows):
+        return self.table(archive_table(rows))
+
+    def table(self, table):
+        self.writer.write_table(table)
+        return self.take()
+
+    def footer(self):
+        self.writer.close()
+        return self.take()
+
+
+ENCODERS = {'csv': CsvEncoder, 'ndjson': NdjsonEncoder, 'arrow': ArrowEncoder}
+
+
+def export_available(export_format):
+    """True se o formato pode ser exportado, o formato arrow requer o pyarrow."""
+    return export_format in EXPORT_FORMATS and (export_format != 'arrow' or pa is not None)
+
+
+def export_historic(export_format, **filters):
+    """
+    Gera a exportação do histórico em partes (bytes), para uma resposta em streaming.
+
+    Parâmetros:
+    export_format (str): 'csv', 'ndjson' ou 'arrow'.
+    filters: Filtros de crud.historic_select() (city, city_id, start, end).
+
+    Retorna:
+    generator: Partes da resposta.
+    """
+    encoder = ENCODERS[export_format]()
+    yield encoder.header()
+    if historic_archive.reaches(filters.get('start')):
+        for table in historic_archive.export_tables(**filters):
+            yield encoder.table(table)
+    live = live_filters(filters)
+    if live is not None:
+        if export_format == 'csv' and get_engine().dialect.name == 'postgresql':
+            yield from copy_export_csv(**live)
+        else:
+            for rows in stream_export_rows(**live):
+                yield encoder.rows(rows)
+    yield encoder.footer()
+
+
+def encode_next(tables, encoder):
+    """Lê e converte a próxima tabela do arquivo, ou None no fim."""
+    table = next(tables, None)
+    return None if table is None else encoder.table(table)
+
+
+async def export_historic_async(export_format, **filters):
+    """
+    Versão assíncrona de export_historic() com o crud_async. A leitura do arquivo e a conversão dos blocos
+    rodam em uma thread, sem bloquear o loop.
+    """
+    import crud_async
+
+    encoder = ENCODERS[export_format]()
+    yield encoder.header()
+    if historic_archive.reaches(filters.get('start')):
+        tables = historic_archive.export_tables(**filters)
+        while (data := await asyncio.to_thread(encode_next, tables, encoder)) is not None:
+            yield data
+    live = live_filters(filters)
+    if live is not None:
+        if export_format == 'csv' and crud_async.ASYNC_DATABASE_URL.startswith('postgresql'):
+            async for data in crud_async.copy_export_csv(**live):
+                yield data
+        else:
+            async for rows in crud_async.stream_export_rows(**live):
+                yield await asyncio.to_thread(encoder.rows, rows)
+    yield encoder.footer()
@@ -1,10 +1,9 @@
-import requests
-from collections import defaultdict
+import json
 from datetime import datetime
-import locale
-
-#configração de localização para uso do datetime
-locale.setlocale(locale.LC_TIME, 'pt_BR')
+from aggregation import aggregate_forecasts
+from models import weather_model
+from dates import format_date
+from geo import valid_coordinates
 
 #Função anônima que retorna o icone do clima da api da open weather  - icon = codigo do icon recebido
 #documentação = https://openweathermap.org/weather-conditions#How-to-get-icon-URL
@@ -20,9 +19,12 @@ def convert_api_to_current_city(json):
 
     Esta função recebe os dados obtidos da API d e os converte em um dicionário
     para representar informações sobre a cidade atual.
+    Os valores vêm do modelo normalizado da resposta (models.weather_model), convertido uma vez por resposta do cache,
+    e são formatados somente aqui. Com a resposta do end-point forecast (WEATHER_COMBINED=1) as condições atuais
+    são interpoladas entre as previsões de 3 horas (models.CityWeather.conditions_at).
 
     Parâmetros:
-    json (dict): Dados obtidos da API  em formato JSON.
+    json (dict): Dados obtidos da API  em formato JSON (end-point weather ou forecast).
 
     Retorna:
     dict: Um dicionário contendo informações sobre a cidade atual.
@@ -34,50 +36,47 @@ def convert_api_to_current_city(json):
       
 
     """
-    try:
-        extrated_data = {
-            "code": 1,
-            "previsao": json["weather"][0]["description"],
-            "icon": format_logo(json["weather"][0]["icon"]),
-            "pais": format_country(json["sys"]["country"]),
-            "vento": f'{json["wind"]["speed"]} Km/h',
-            "umidade": f'{json["main"]["humidity"]}%',
-            "temp": f'{json["main"]["temp"]} °C',
-            "temp_max": f'{json["main"]["temp_max"]} °C',
-            "temp_min": f'{json["main"]["temp_min"]} °C',
-            "data": format_datetime(datetime.now()),
-            "id": json["id"],
-            "cidade": json.get("name", "")
-        }
-        return extrated_data
-    except:
+    model = weather_model(json)
+    conditions = model.conditions_at() if model is not None else None
+    if conditions is None:
         return {"code": 0, "msg": "Desculpe, não encontramos essa cidade, tente novamente!"}
+    extrated_data = {
+        "code": 1,
+        "previsao": conditions.description,
+        "icon": format_logo(conditions.icon),
+        "pais": format_country(model.country),
+        "vento": f'{conditions.wind} Km/h',
+        "umidade": f'{conditions.humidity}%',
+        "temp": f'{conditions.temp} °C',
+        "temp_max": f'{conditions.temp_max} °C',
+        "temp_min": f'{conditions.temp_min} °C',
+        "data": format_datetime(datetime.now()),
+        "id": model.id,
+        "cidade": model.name
+    }
+    return extrated_data
 
     
 
 
-def format_datetime(data):
+def format_datetime(data, language=None):
     """
     Esta função recebe um objeto de data/hora e formata a data.
+    Os nomes dos dias e meses vêm das tabelas do dates.py (sem locale.setlocale), com cache por data.
     
     Parâmetros:
     data (datetime): Objeto de data/hora a ser formatado
+    language (str, opcional): 'pt', 'es' ou 'en', por padrão o idioma da requisição atual (?lang= ou Accept-Language).
 
     Retorna:
     str: Uma string contendo a data formatada no formato desejado no formato dia da semana(string), dia do mês(número), mês (string) ano(número).
 
     Exemplo de Uso:
     - data = datetime.datetime(2023, 8, 20, 14, 30)
-      format_datetime(data) retorna "sábado, 20 de agosto de 2023"
+      format_datetime(data) retorna "domingo, 20 de agosto de 2023"
 
     """
-    # formato da dara
-    format_desired = "%A, %d de %B de %Y"
-    
-    # convertendo a data na data formatada
-    formatted_date = data.strftime(format_desired)
-
-    return formatted_date
+    return format_date(data, language)
 
     
 def convert_postgres_json(json):
@@ -118,7 +117,7 @@ def convert_postgres_json(json):
 
 
 
-def convert_postgres_historic(dados):
+def convert_postgres_historic(dados, language=None):
     """
     Converte os dados  obtidos do banco de dados em uma lista limpa.
 
@@ -128,6 +127,7 @@ def convert_postgres_historic(dados):
 
     Parâmetros:
     dados (list): Uma lista de tuplas contendo os dados obtivo na consulta postgres
+    language (str, opcional): Idioma da data (format_datetime), por padrão o idioma da requisição atual.
 
     Retorna:
     list: Uma lista de dicionários contendo os dados pronto para ser consumido pela API.
@@ -144,16 +144,112 @@ def convert_postgres_historic(dados):
         data_dict = {
             "identidade": identity,
             "cidade": city,
-            "data": format_datetime(date)
+            "data": format_datetime(date, language)
         }
         clean_data.append(data_dict)
     return clean_data
 
 
+def dumps_sorted(item):
+    """Serializa um item em JSON compacto com as chaves ordenadas, como o jsonify."""
+    return json.dumps(item, ensure_ascii=False, separators=(',', ':'), sort_keys=True)
+
+
+def historic_json_block(rows, language=None, dumps=dumps_sorted):
+    """
+    Converte um bloco de registros do histórico (convert_postgres_historic) nos itens de um array JSON, separados por vírgula.
+
+    Parâmetros:
+    dumps (callable, opcional): Serializa um registro, use app.json.dumps_compact (responses.FastJSONProvider)
+                                para o mesmo texto do jsonify da aplicação.
+    """
+    return ','.join(dumps(item) for item in convert_postgres_historic(rows, language))
+
+
+def iter_historic_json(blocks, language=None, dumps=dumps_sorted):
+    """
+    Gera o JSON do histórico em partes, um bloco de registros por vez, para respostas em streaming.
+    Com dumps=app.json.dumps_compact o resultado concatenado é igual ao jsonify(convert_postgres_historic(dados)),
+    inclusive na ordem das chaves (o jsonify do json da biblioteca padrão só acrescenta uma quebra de linha no final).
+
+    Parâmetros:
+    blocks (iterable): Blocos (listas) de tuplas (identidade, cidade, data), ex: crud.stream_data_historic().
+    language (str, opcional): Idioma das datas, informe o da requisição pois o gerador é lido depois da rota retornar.
+    dumps (callable, opcional): Serializa um registro (ver historic_json_block).
+
+    Retorna:
+    generator: Partes do array JSON como strings.
+    """
+    yield '['
+    separator = ''
+    for rows in blocks:
+        if rows:
+            yield separator + historic_json_block(rows, language, dumps)
+            separator = ','
+    yield ']'
+
+
+def parse_historic_filters(args):
+    """
+    Lê a paginação e os filtros do histórico da query string.
+
+    Parâmetros:
+    args (MultiDict): Parâmetros da requisição (request.args), aceitos:
+        limit (int), after (int), city (str), id (int), start (AAAA-MM-DD), end (AAAA-MM-DD).
+
+    Retorna:
+    dict: Parâmetros para crud.historic_select(), somente os informados.
+
+    Exceções:
+    ValueError: Se algum número ou data estiver em formato inválido.
+    """
+    filters = {}
+    for name, key in (('limit', 'limit'), ('after', 'after'), ('id', 'city_id')):
+        if args.get(name):
+            filters[key] = int(args[name])
+    if args.get('city'):
+        filters['city'] = args['city']
+    for name in ('start', 'end'):
+        if args.get(name):
+            filters[name] = datetime.strptime(args[name], '%Y-%m-%d').date()
+    if filters.get('limit') is not None and filters['limit'] <= 0:
+        raise ValueError('limit deve ser maior que zero')
+    return filters
+
+
+def parse_coordinates(args):
+    """
+    Lê as coordenadas das rotas /weather e /forecast da query string.
+
+    Parâmetros:
+    args (MultiDict): Parâmetros da requisição (request.args), lat e lon em graus decimais.
+
+    Retorna:
+    tuple: (lat, lon), ou None se não foram informadas.
+
+    Exceções:
+    ValueError: Se somente uma foi informada, se não forem números ou se estiverem fora dos limites.
+    """
+    lat, lon = args.get('lat'), args.get('lon')
+    if not lat and not lon:
+        return None
+    if not lat or not lon:
+        raise ValueError('informe lat e lon')
+    coords = float(lat), float(lon)
+    if not valid_coordinates(*coords):
+        raise ValueError('coordenadas fora dos limites')
+    return coords
+
+
+FORECAST_ERROR = {"code": 0, "msg": "Desculpe, houve um erro ao tentar carregar as cidades, tente novamente!"}
+
+
 def forecast(data):
     """
     Esta função recebe os dados de previsão do tempo em formato JSON e os processa para gerar uma lista de previsões
-    diárias. Exclui a previsão do dia atual e agrupa as previsões por dia, pegando a temperatura maxima e minima.
+    diárias. Exclui a previsão do dia atual e agrupa as previsões por dia no fuso horário da cidade (aggregation.aggregate_forecasts),
+    com a temperatura máxima, mínima e média, a umidade média, o vento máximo e a condição do tempo predominante do dia.
+    O agrupamento fica no modelo normalizado da resposta (models.weather_model), calculado uma vez por dia local da cidade.
 
     Parâmetros:
     data (dict): Dados recebido na chamada da função
@@ -167,49 +263,201 @@ def forecast(data):
       forecast(json_data) retorna uma lista de dicionários com previsões diárias formatadas.
 
     """
-    try: 
-        daily_data = {}
-        data_clean = []
-
-        for item in data['list']:
-            dt_txt = item['dt_txt']
-            date = dt_txt.split()[0]
-            
-            #ignora se for o dia atual
-            if date != str(datetime.now().date()):
-                #se não tiver uma lista do dia atual, inseri
-                if date not in daily_data:
-                    daily_data[date] = {
-                        'temp_max': item['main']['temp_max'],
-                        'temp_min': item['main']['temp_min'],
-                        'previsao': item['weather'][0]['description'],
-                        'icon': format_logo(item['weather'][0]['icon']),
-                        'vento': item['wind']['speed'],
-                        'umidade': item['main']['humidity'],
-                        'temp': item['main']['temp']
-                    }
-                else:
-                    # Se já existe um registro para esse dia, atualize apenas se a temperatura máxima for maior
-                    if item['main']['temp_max'] > daily_data[date]['temp_max']:
-                        daily_data[date]['temp_max'] = item['main']['temp_max']
-                    
-                    # Atualize a temperatura mínima se for menor
-                    if item['main']['temp_min'] < daily_data[date]['temp_min']:
-                        daily_data[date]['temp_min'] = item['main']['temp_min']
-
-        # Percorre a lista de item de dia, e inseri na lista para retornar a ApI
-        for date, values in daily_data.items():
-            format_data = {
-                "previsao": values["previsao"],
-                "vento": f'{values["vento"]} Km/h',
-                "icon": values['icon'],
-                "umidade": f'{values["umidade"]}%',
-                "temp": f'{values["temp"]} °C',
-                "temp_max": f'{values["temp_max"]} °C',
-                "temp_min": f'{values["temp_min"]} °C',
-                "data": format_datetime(datetime.strptime(date, '%Y-%m-%d')),   
-            }
-            data_clean.append(format_data)
-        return data_clean
-    except:
-        return {"code": 0, "msg": "Desculpe, houve um erro ao tentar carregar as cidades, tente novamente!"}
+    model = weather_model(data)
+    if model is None or model.series is None:
+        return dict(FORECAST_ERROR)
+    return [format_forecast_day(values) for values in model.days()]
+
+
+def forecast_many(datas):
+    """
+    Versão de forecast() para várias cidades, agrupadas em uma única passada vetorizada.
+
+    Parâmetros:
+    datas (list): Dados do end-point forecast de cada cidade.
+
+    Retorna:
+    list: Para cada cidade, na mesma ordem, a lista de previsões diárias formatadas ou o dicionário de erro.
+    """
+    valid = [i for i, data in enumerate(datas) if isinstance(data, dict) and isinstance(data.get('list'), list)]
+    try:
+        days = aggregate_forecasts([datas[i] for i in valid])
+    except (KeyError, IndexError, TypeError, ValueError):
+        #algum dado inválido no lote, agrupa uma cidade por vez para isolar o erro
+        return [forecast_many([data])[0] if len(datas) > 1 else dict(FORECAST_ERROR) for data in datas]
+
+    data_clean = [dict(FORECAST_ERROR) for _ in datas]
+    for index, city_days in zip(valid, days):
+        data_clean[index] = [format_forecast_day(values) for values in city_days]
+    return data_clean
+
+
+def format_forecast_day(values):
+    """
+    Formata um dia da previsão (aggregation.aggregate_forecasts) para a API, no mesmo formato da previsão por item.
+    A umidade média do dia é arredondada para inteiro, como a umidade da API.
+    """
+    return {
+        "previsao": values["description"],
+        "vento": f'{values["wind"]} Km/h',
+        "icon": format_logo(values["icon"]),
+        "umidade": f'{round(values["humidity"])}%',
+        "temp": f'{values["temp"]} °C',
+        "temp_max": f'{values["temp_max"]} °C',
+        "temp_min": f'{values["temp_min"]} °C',
+        "data": format_datetime(values["date"]),
+    }
+
+
+def parse_batch_values(values):
+    """
+    Separa a lista de cidades ou IDs recebida nas rotas em lote, aceitando valores separados por vírgula.
+    Valores vazios e repetidos são removidos, mantendo a ordem.
+
+    Parâmetros:
+    values (list): Valores recebidos (ex: ['Osorio,Torres', 'Tramandai']).
+
+    Retorna:
+    list: Lista de valores limpos.
+
+    Exemplo de Uso:
+    - parse_batch_values(['Osorio, Torres', 'osorio']) retorna ['Osorio', 'Torres', 'osorio']
+    """
+    clean_values = []
+    for value in values:
+        for item in str(value).split(','):
+            item = item.strip()
+            if item and item not in clean_values:
+                clean_values.append(item)
+    return clean_values
+
+
+def parse_identities(value):
+    """
+    Separa as identidades (PK do histórico) recebidas na rota /listHistoric, separadas por vírgula.
+
+    Exemplo de Uso:
+    - parse_identities('1, 2,3') retorna [1, 2, 3]
+
+    Exceções:
+    ValueError: Se alguma identidade não for um número inteiro.
+    """
+    return [int(item) for item in parse_batch_values([value])]
+
+
+def join_historic_records(identities, records, missing, many=True):
+    """
+    Monta a resposta da rota /listHistoric com o JSON (bytes) de cada registro, sem converter os registros novamente.
+
+    Parâmetros:
+    identities (list): Identidades consultadas, na ordem da resposta.
+    records (dict): identidade -> JSON do registro (cache.RecordCache.get_or_load).
+    missing (bytes): JSON usado para as identidades não encontradas.
+    many (bool, opcional): True retorna uma lista JSON, False somente o primeiro registro.
+
+    Retorna:
+    bytes: O corpo da resposta em JSON.
+    """
+    if not many:
+        return records.get(identities[0], missing)
+    return b'[' + b','.join(records.get(identity, missing) for identity in identities) + b']'
+
+
+def build_batch_queries(cities, ids):
+    """
+    Monta as consultas das rotas em lote a partir dos nomes de cidades e IDs recebidos.
+
+    Parâmetros:
+    cities (list): Nomes de cidades, aceita valores separados por vírgula.
+    ids (list): IDs de cidades da OpenWeather, aceita valores separados por vírgula.
+
+    Retorna:
+    list: Lista de tuplas (city_name, city_id).
+
+    Exceções:
+    ValueError: Se algum ID não for um número inteiro.
+    """
+    queries = [(city, None) for city in parse_batch_values(cities)]
+    queries += [(None, int(city_id)) for city_id in parse_batch_values(ids)]
+    return queries
+
+
+def convert_batch(queries, results, current_day=True):
+    """
+    Converte os dados da API de várias cidades para a resposta das rotas em lote.
+
+    Parâmetros:
+    queries (list): Lista de tuplas (city_name, city_id) consultadas.
+    results (list): Dicionários da API na mesma ordem de queries.
+    current_day (bool, opcional): True converte com convert_api_to_current_city, False com forecast_many (todas as cidades de uma vez)
+
+    Retorna:
+    list: Um dicionário por cidade com a consulta ('consulta') e o código ('code'), sendo 1 para sucesso
+          com os dados da cidade (ou 'dias' com a lista da previsão), e 0 com a mensagem de erro ('msg').
+    """
+    clean_data = []
+    forecasts = None if current_day else forecast_many(results)
+    for index, ((city_name, city_id), data) in enumerate(zip(queries, results)):
+        consulta = city_id if city_id is not None else city_name
+        if current_day:
+            clean_data.append({"consulta": consulta, **convert_api_to_current_city(data)})
+        else:
+            days = forecasts[index]
+            if isinstance(days, list):
+                clean_data.append({"consulta": consulta, "code": 1, "dias": days})
+            else:
+                clean_data.append({"consulta": consulta, **days})
+    return clean_data
+
+
+def convert_rollup_stats(dados):
+    """
+    Converte as linhas do resumo do histórico (crud.get_weather_stats) em uma lista para a API.
+
+    Parâmetros:
+    dados (list): Objetos da classe tableHistoricRollup.
+
+    Retorna:
+    list: Um dicionário por período com os valores numéricos (temperaturas em °C, umidade em %, vento em Km/h).
+    """
+    clean_data = []
+    for row in dados:
+        clean_data.append({
+            "id": row.id,
+            "cidade": row.cidade,
+            "periodo": row.periodo,
+            "inicio": row.inicio.isoformat(),
+            "registros": row.registros,
+            "temp_min": row.temp_min,
+            "temp_max": row.temp_max,
+            "temp_media": round(row.temp_soma / row.registros, 2),
+            "umidade_media": round(row.umidade_soma / row.registros, 2),
+            "vento_max": row.vento_max,
+        })
+    return clean_data
+
+
+def parse_stats_filters(args):
+    """
+    Lê os filtros da rota de estatísticas da query string.
+
+    Parâmetros:
+    args (MultiDict): Parâmetros da requisição (request.args), aceitos:
+        city (str), id (int), period ('week' ou 'month', padrão 'month'), last (int, padrão 12).
+
+    Retorna:
+    dict: Parâmetros para crud.rollup_select().
+
+    Exceções:
+    ValueError: Se a cidade não for informada ou algum valor for inválido.
+    """
+    filters = {"period": args.get('period', 'month'), "last": int(args.get('last', 12))}
+    if filters['period'] not in ('week', 'month') or not 1 <= filters['last'] <= 520:
+        raise ValueError('period ou last inválido')
+    if args.get('id'):
+        filters['city_id'] = int(args['id'])
+    elif args.get('city'):
+        filters['city'] = args['city']
+    else:
+        raise ValueError('cidade não informada')
+    return filters
@@ -0,0 +1,210 @@
+import math
+import os
+import threading
+from array import array
+
+
+#Precisão do geohash usado como célula do cache nas consultas por coordenadas (lat/lon)
+#4 = ~39 x 20 km, 5 = ~4,9 x 4,9 km, 6 = ~1,2 x 0,6 km (no equador)
+GEO_GRID_PRECISION = int(os.environ.get('GEO_GRID_PRECISION', 5))
+#Distância máxima em km do centro da célula até a cidade conhecida mais próxima, acima dela a API é consultada
+#pelas coordenadas do centro da célula ('0' não usa as cidades conhecidas)
+GEO_NEAREST_MAX_KM = float(os.environ.get('GEO_NEAREST_MAX_KM', 10))
+#Tamanho em graus dos quadrados do índice espacial de cidades
+GEO_INDEX_CELL = float(os.environ.get('GEO_INDEX_CELL', 0.25))
+
+EARTH_RADIUS_KM = 6371.0088
+GEOHASH_ALPHABET = '0123456789bcdefghjkmnpqrstuvwxyz'
+
+
+def valid_coordinates(lat, lon):
+    """True se a latitude está entre -90 e 90 e a longitude entre -180 e 180."""
+    return -90 <= lat <= 90 and -180 <= lon <= 180
+
+
+def geohash_encode(lat, lon, precision=GEO_GRID_PRECISION):
+    """
+    Codifica as coordenadas em um geohash de precision caracteres (5 bits por caractere, alternando longitude e latitude).
+
+    Exemplo de Uso:
+    - geohash_encode(-29.8864, -50.2697, 5) retorna '6fsmb'
+    """
+    lat_range = [-90.0, 90.0]
+    lon_range = [-180.0, 180.0]
+    result = []
+    even = True
+    for _ in range(precision):
+        value = 0
+        for _ in range(5):
+            limits, coordinate = (lon_range, lon) if even else (lat_range, lat)
+            middle = (limits[0] + limits[1]) / 2
+            value <<= 1
+            if coordinate >= middle:
+                value |= 1
+                limits[0] = middle
+            else:
+                limits[1] = middle
+            even = not even
+        result.append(GEOHASH_ALPHABET[value])
+    return ''.join(result)
+
+
+def geohash_bounds(geohash):
+    """
+    Retorna os limites da célula do geohash.
+
+    Retorna:
+    tuple: (lat_min, lat_max, lon_min, lon_max)
+    """
+    lat_range = [-90.0, 90.0]
+    lon_range = [-180.0, 180.0]
+    even = True
+    for char in geohash:
+        value = GEOHASH_ALPHABET.index(char)
+        for bit in range(4, -1, -1):
+            limits = lon_range if even else lat_range
+            middle = (limits[0] + limits[1]) / 2
+            if value >> bit & 1:
+                limits[0] = middle
+            else:
+                limits[1] = middle
+            even = not even
+    return lat_range[0], lat_range[1], lon_range[0], lon_range[1]
+
+
+def snap(lat, lon, precision=GEO_GRID_PRECISION):
+    """
+    Ajusta as coordenadas ao centro da célula do geohash, todas as coordenadas da célula usam o mesmo valor.
+
+    Retorna:
+    tuple: (geohash, latitude do centro, longitude do centro), o centro com 4 casas decimais.
+    """
+    geohash = geohash_encode(lat, lon, precision)
+    lat_min, lat_max, lon_min, lon_max = geohash_bounds(geohash)
+    return geohash, round((lat_min + lat_max) / 2, 4), round((lon_min + lon_max) / 2, 4)
+
+
+def distance_km(lat1, lon1, lat2, lon2):
+    """Distância em km entre dois pontos (fórmula de haversine)."""
+    lat1, lon1, lat2, lon2 = map(math.radians, (lat1, lon1, lat2, lon2))
+    a = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+
+
+class GeoIndex:
+    """
+    Índice espacial em memória das cidades conhecidas (ID da OpenWeather e coordenadas), para encontrar a cidade
+    mais próxima de um ponto.
+
+    As coordenadas ficam em arrays paralelos e as posições são agrupadas em quadrados de cell graus (buckets),
+    a busca lê somente os quadrados que alcançam o raio pedido, sem percorrer todas as cidades.
+
+    Atributos:
+        lats, lons (array): Coordenadas das cidades.
+        ids (array): IDs das cidades na OpenWeather.
+        learned (int): Cidades acrescentadas a partir das respostas da API.
+        hits (int): Buscas com uma cidade dentro do raio.
+        misses (int): Buscas sem cidade dentro do raio.
+    """
+    def __init__(self, entries=(), cell=GEO_INDEX_CELL):
+        self.cell = cell
+        self._lock = threading.Lock()
+        self.learned = 0
+        self.hits = 0
+        self.misses = 0
+        self.build(entries)
+
+    def _bucket(self, lat, lon):
+        return int(math.floor(lat / self.cell)), int(math.floor(lon / self.cell))
+
+    def build(self, entries):
+        """
+        Recria o índice.
+
+        Parâmetros:
+        entries (iterable): Tuplas (lat, lon, id).
+        """
+        lats, lons, ids, buckets = array('d'), array('d'), array('q'), {}
+        for lat, lon, city_id in entries:
+            buckets.setdefault(self._bucket(lat, lon), array('l')).append(len(ids))
+            lats.append(lat)
+            lons.append(lon)
+            ids.append(int(city_id))
+        with self._lock:
+            self.lats, self.lons, self.ids, self.buckets = lats, lons, ids, buckets
+
+    def __len__(self):
+        return len(self.ids)
+
+    def add(self, lat, lon, city_id):
+        """
+        Acrescenta uma cidade ao índice, se o ID ainda não estiver no mesmo quadrado.
+
+        Retorna:
+        bool: True se a cidade foi acrescentada.
+        """
+        city_id = int(city_id)
+        with self._lock:
+            bucket = self.buckets.setdefault(self._bucket(lat, lon), array('l'))
+            if any(self.ids[position] == city_id for position in bucket):
+                return False
+            bucket.append(len(self.ids))
+            self.lats.append(lat)
+            self.lons.append(lon)
+            self.ids.append(city_id)
+            self.learned += 1
+            return True
+
+    def learn(self, data):
+        """
+        Acrescenta a cidade de uma resposta de sucesso da API (end-point weather ou forecast) ao índice.
+        """
+        if not isinstance(data, dict):
+            return False
+        city = data.get('city') if isinstance(data.get('city'), dict) else data
+        coord = city.get('coord')
+        if city.get('id') and isinstance(coord, dict) and coord.get('lat') is not None and coord.get('lon') is not None:
+            return self.add(float(coord['lat']), float(coord['lon']), city['id'])
+        return False
+
+    def nearest(self, lat, lon, max_km=GEO_NEAREST_MAX_KM):
+        """
+        Retorna a cidade conhecida mais próxima do ponto, dentro do raio.
+
+        Parâmetros:
+        lat, lon (float): Coordenadas do ponto.
+        max_km (float, opcional): Raio da busca em km.
+
+        Retorna:
+        tuple: (id da cidade, distância em km), ou None se não houver cidade dentro do raio.
+        """
+        #quadrados que cobrem o raio, a largura em longitude diminui com a latitude
+        lat_span = max_km / (EARTH_RADIUS_KM * math.pi / 180)
+        lon_span = lat_span / max(math.cos(math.radians(min(89.0, abs(lat) + lat_span))), 1e-6)
+        first_row, first_column = self._bucket(lat - lat_span, lon - min(180.0, lon_span))
+        last_row, last_column = self._bucket(lat + lat_span, lon + min(180.0, lon_span))
+        columns = round(360 / self.cell)
+        best = None
+        with self._lock:
+            for row in range(first_row, last_row + 1):
+                for column in range(first_column, last_column + 1):
+                    #a longitude continua do outro lado de 180
+                    column = (column + columns // 2) % columns - columns // 2
+                    for position in self.buckets.get((row, column), ()):
+                        distance = distance_km(lat, lon, self.lats[position], self.lons[position])
+                        if distance <= max_km and (best is None or distance < best[1]):
+                            best = (self.ids[position], distance)
+            if best is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return best
+
+    def stats(self):
+        with self._lock:
+            return {"cities": len(self.ids), "buckets": len(self.buckets), "learned": self.learned,
+                    "hits": self.hits, "misses": self.misses}
+
+
+#Índice espacial único do processo, preenchido por cities.load_city_index() e pelas respostas da API
+geo_index = GeoIndex()
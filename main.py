@@ -1,29 +1,145 @@
 #Import de bibliotecas e modulos
-from flask import Flask, jsonify, request
-from api import get_weather_data
+from functools import wraps
+from flask import Flask, Response, g, jsonify, request, stream_with_context
+from api import get_weather_data, get_weather_data_batch, circuit_breaker, refresh_scheduler, BATCH_MAX_CITIES
+from cache import weather_cache, record_cache
 from function import (
     convert_api_to_current_city,
     convert_postgres_historic,
     convert_postgres_json,
-    forecast
+    forecast,
+    build_batch_queries,
+    convert_batch,
+    iter_historic_json,
+    parse_historic_filters,
+    convert_rollup_stats,
+    parse_stats_filters,
+    parse_identities,
+    parse_coordinates,
+    join_historic_records
 )
 from crud import (
-    insert_weather_historic,
     get_data_historic,
-    list_historic_identify
+    stream_data_historic,
+    get_weather_stats,
+    list_historic_many,
+    init_engine,
+    remove_session,
+    pool_stats,
+    list_known_cities,
+    HISTORIC_MAX_LIMIT
 )
+from writer import save_weather_historic, save_weather_historic_many, historic_writer
+from dates import current_language, set_language
+from cities import city_index, load_city_index, historic_cities, CITY_SUGGEST_LIMIT
+from geo import geo_index
+from models import model_cache
+from profiler import profiler, wants_profile, access_error, parse_session, render_collapsed, PROFILER_ENABLED
+from metrics import stage, request_started, request_finished, register_stats, render, recent_traces, admin_error
+from responses import FastJSONProvider, finalize_response
+from quota import upstream_quota, rate_limiter
+from archive import historic_archive
+from export import export_historic, export_available, EXPORT_FORMATS
 
 
 #cria uma intância do Flask
 app = Flask(__name__)
 
+#JSON das respostas com orjson quando instalado (JSON_PROVIDER)
+app.json = FastJSONProvider(app)
+
+#devolve a sessão do banco de dados ao pool ao final de cada requisição
+app.teardown_appcontext(remove_session)
+
+#contadores dos componentes publicados em /metrics
+register_stats('cache', weather_cache.stats, 'Cache da API OpenWeather')
+register_stats('record_cache', record_cache.stats, 'Cache dos registros do histórico')
+register_stats('db_pool', pool_stats, 'Pool de conexões do banco de dados')
+register_stats('writer', historic_writer.stats, 'Gravação do histórico em segundo plano')
+register_stats('circuit', circuit_breaker.stats, 'Disjuntor das chamadas a API OpenWeather')
+register_stats('refresh', refresh_scheduler.stats, 'Renovação do cache em segundo plano')
+register_stats('quota', upstream_quota.stats, 'Cota de chamadas da API OpenWeather')
+register_stats('rate_limit', rate_limiter.stats, 'Limite de requisições por cliente')
+register_stats('archive', historic_archive.stats, 'Arquivo do histórico')
+register_stats('geo', geo_index.stats, 'Índice espacial de cidades')
+register_stats('profiler', profiler.stats, 'Profiler por amostragem')
+register_stats('models', model_cache.stats, 'Modelos normalizados das respostas da API')
+
+
+@app.before_request
+def start_metrics():
+    """Inicia a medição da requisição (latência por rota, requisições em andamento e rastreamento por amostragem)."""
+    g.metrics = request_started(request.url_rule.rule if request.url_rule else 'unmatched')
+
+
+@app.after_request
+def response_metrics(response):
+    """Guarda o status da resposta para o registro em finish_metrics."""
+    g.status = response.status_code
+    return response
+
+
+@app.teardown_request
+def finish_metrics(exception=None):
+    """Registra a latência e o status da requisição, depois da resposta (inclusive em streaming) ou de um erro (500)."""
+    request_finished(g.pop('metrics', None), request.method, g.pop('status', 500))
+
+
+def start_profile():
+    """
+    Registra a rota da thread para o profiler por amostragem (profiler.py). A requisição é perfilada com os cabeçalhos
+    X-Profile: 1 e X-Profile-Token, ou com a chance PROFILER_SAMPLE_RATE, e as pilhas vão para /profile/requests.
+    """
+    environ = request.environ
+    profiler.enter(environ, 'HTTP_X_PROFILE' in environ and wants_profile(request.headers))
+
+
+def finish_profile(exception=None):
+    """Remove o registro da thread no profiler ao final da requisição (inclusive em streaming)."""
+    profiler.leave()
+
+
+#somente com o profiler configurado (PROFILER_TOKEN ou PROFILER_SAMPLE_RATE), sem custo nas requisições caso contrário
+if PROFILER_ENABLED:
+    app.before_request(start_profile)
+    app.teardown_request(finish_profile)
+
+
+@app.before_request
+def limit_client():
+    """
+    Limita as requisições por cliente (IP) a RATE_LIMIT_PER_MINUTE por minuto, com rajadas de até RATE_LIMIT_BURST.
+    Acima do limite responde 429 com o cabeçalho Retry-After. As rotas de monitoramento (RATE_LIMIT_EXEMPT) não têm limite.
+    """
+    return rate_limiter.check(request)
+
+
+@app.before_request
+def select_language():
+    """
+    Define o idioma das datas da requisição pelo parâmetro lang (ex: ?lang=en) ou pelo cabeçalho Accept-Language.
+    Idiomas suportados: pt (padrão), es e en.
+    """
+    set_language(request.args.get('lang') or request.headers.get('Accept-Language'))
+
+
+@app.after_request
+def compress_response(response):
+    """
+    Acrescenta ETag às respostas (If-None-Match igual retorna 304 sem corpo) e comprime com brotli ou gzip
+    conforme o Accept-Encoding, a partir de COMPRESS_MIN_SIZE bytes. Respostas em streaming são comprimidas em partes.
+    """
+    return finalize_response(response, request)
+
+
 @app.route('/weather', methods=['GET'])
 def get_weather():
     """
     Rota para obter a previsão do tempo atual de uma cidade.
 
     Esta rota recebe o nome de uma cidade como parâmetro de consulta ('city') e faz uma requisição à API do OpenWeather para obter os dados da cidade fornecida, get_weather_data()
-    Os dados são extraidos somente o necessário (convert_api_to_current_city()) e inseridos no banco de dados postgres, insert_weather_historic()
+    Os dados são extraidos somente o necessário (convert_api_to_current_city()) e inseridos no banco de dados postgres, save_weather_historic()
+    (direto no banco, ou na fila de gravação em segundo plano com WRITE_BEHIND=1)
     
     Retorna:
     JSON: Dados da previsão do tempo atual da cidade fornecida.
@@ -34,17 +150,26 @@ def get_weather():
 
     Parâmetros de Consulta:
     - city (str): O nome da cidade para obter a previsão do tempo.
+    - lat, lon (float): Coordenadas, no lugar do nome. São ajustadas a uma célula (geohash) e convertidas na cidade
+      conhecida mais próxima, usuários próximos usam a mesma resposta do cache (api.resolve_coordinates).
 
     Exemplo de Uso:
     - URL: /weather?city=Osorio
     - Retorna: JSON com dados da previsão do tempo atual de Osorio.
+    - URL: /weather?lat=-29.8864&lon=-50.2697
+    - Retorna: JSON com dados da previsão do tempo atual da cidade mais próxima das coordenadas.
 
     """
     city_name = request.args.get('city')
-    if city_name:
-        weather_data = get_weather_data(city_name)
-        extracted_weather_data = convert_api_to_current_city(weather_data)
-        insert_weather_historic(extracted_weather_data)
+    try:
+        coords = parse_coordinates(request.args)
+    except ValueError:
+        return jsonify({'error': 'lat e lon devem ser números, com lat entre -90 e 90 e lon entre -180 e 180'}), 400
+    if city_name or coords:
+        weather_data = get_weather_data(city_name, coords=coords)
+        with stage('convert'):
+            extracted_weather_data = convert_api_to_current_city(weather_data)
+        save_weather_historic(extracted_weather_data)
         return jsonify(extracted_weather_data)
     else:
         return jsonify({'error': 'Nome da cidade incorreto ou não encontrado'}), 400
@@ -60,6 +185,17 @@ def get_historic():
     Ela faz uma chamada à função get_data_history() para buscar os dados do histórico.
     Os dados são convertidos para um formato JSON através da função converte_postgres_historico().
 
+    Sem o parâmetro limit o histórico inteiro é enviado em streaming, lido do banco em blocos (stream_data_historic()),
+    com uso de memória constante. Com limit é retornada uma página (paginação por cursor na identidade),
+    o cursor da próxima página vem no cabeçalho X-Next-After, usado como after na próxima requisição.
+
+    Parâmetros de Consulta (opcionais):
+    - limit (int): Registros por página (máximo HISTORIC_MAX_LIMIT).
+    - after (int): Cursor da página, retorna registros com identidade menor que after.
+    - city (str): Nome da cidade.
+    - id (int): ID da cidade na OpenWeather.
+    - start, end (AAAA-MM-DD): Intervalo de datas.
+
     Retorna:
     JSON: Retorna um JSON limpo com dados de hisótirco de pesquisa
 
@@ -69,41 +205,107 @@ def get_historic():
     Exemplo de Uso:
     - URL: /historic
     - Retorna: JSON com os dados históricos de previsões de tempo.
+    - URL: /historic?limit=50&after=1200&city=Osório&start=2023-08-01
+    - Retorna: os 50 registros seguintes ao 1200, da cidade e período informados.
+
+    """
+    try:
+        filters = parse_historic_filters(request.args)
+    except ValueError:
+        return jsonify({'error': 'Parâmetros de filtro ou paginação inválidos'}), 400
+
+    if 'limit' not in filters:
+        return Response(stream_with_context(iter_historic_json(stream_data_historic(**filters), current_language.get(), app.json.dumps_compact)),
+                        mimetype='application/json')
+
+    filters['limit'] = min(filters['limit'], HISTORIC_MAX_LIMIT)
+    data_historic = get_data_historic(**filters)
+    #None: erro no banco de dados (get_data_historic já fez o rollback)
+    if data_historic is None:
+        return jsonify({'error': 'Histórico indisponível, tente novamente'}), 503
+    with stage('convert'):
+        json_historic = convert_postgres_historic(data_historic)
+    response = jsonify(json_historic)
+    if len(data_historic) == filters['limit']:
+        response.headers['X-Next-After'] = str(data_historic[-1][0])
+    return response
+
+@app.route('/export', methods=['GET'])
+def get_export():
+    """
+    Rota para exportar o histórico inteiro (ou filtrado) em streaming, em CSV, NDJSON ou Arrow IPC.
+
+    Todas as colunas da tabela, em ordem crescente de identidade, incluindo os meses arquivados (archive.py).
+    As linhas são lidas em blocos com um cursor no servidor (export.py) e enviadas conforme são lidas, substituindo
+    a paginação de /historic seguida de uma chamada a /listHistoric por registro.
+
+    Parâmetros de Consulta (opcionais):
+    - format (str): csv (padrão), ndjson ou arrow (requer o pyarrow).
+    - city (str): Nome da cidade.
+    - id (int): ID da cidade na OpenWeather.
+    - start, end (AAAA-MM-DD): Intervalo de datas.
+
+    Exemplo de Uso:
+    - URL: /export?format=ndjson&city=Osório&start=2023-08-01
+    - Retorna: um registro JSON por linha, da cidade a partir da data informada.
 
     """
-    data_historic = get_data_historic()
-    json_historic = convert_postgres_historic(data_historic)
-    return jsonify(json_historic)
+    export_format = request.args.get('format', 'csv')
+    if not export_available(export_format):
+        return jsonify({'error': f'Formato inválido ou indisponível, use um de: {", ".join(EXPORT_FORMATS)}'}), 400
+    try:
+        filters = parse_historic_filters(request.args)
+    except ValueError:
+        return jsonify({'error': 'Parâmetros de filtro inválidos'}), 400
+    filters.pop('limit', None)
+    filters.pop('after', None)
+
+    response = Response(stream_with_context(export_historic(export_format, **filters)), mimetype=EXPORT_FORMATS[export_format])
+    response.headers['Content-Disposition'] = f'attachment; filename=historico.{export_format}'
+    return response
+
 
 @app.route('/listHistoric', methods=['GET'])
 def get_list_historic():
     """
     Esta rota busca os dados de previsão do tempo da tabela de historco do postgres.
-    A rota recebe o ID de identificação como um parâmetro de consulta ('identidade') na URL. Se o ID de identificação
-    for fornecido, a função list_historic_identify() é chamada para buscar os dados históricos correspondentes e,
-    em seguida, os dados são convertidos para o formato JSON usando a função convert_postgres_json().
+    A rota recebe o ID de identificação como um parâmetro de consulta ('identidade') na URL, ou vários separados por vírgula.
+    Os registros do histórico não mudam, então o JSON de cada registro (convert_postgres_json) fica guardado no
+    record_cache pela identidade e idioma: os registros já consultados são respondidos sem ir ao banco, e os ausentes
+    são buscados todos de uma vez (list_historic_many).
 
     Métodos HTTP:
     - GET: Obtém os dados do banco de dados postgres.
 
     Parâmetros de Consulta:
-    - identidade (int): O ID de identificação usado para buscar os dados históricos.
+    - identidade (int): O ID de identificação usado para buscar os dados históricos, ou vários separados por vírgula
+      (no máximo HISTORIC_MAX_LIMIT).
 
     Retorna:
-    JSON: Dados da consulta no formato JSON pronta para ser consumida pela API
+    JSON: Dados da consulta no formato JSON pronta para ser consumida pela API. Com vários IDs, uma lista na mesma ordem,
+          os IDs não encontrados vêm com code 0.
 
     Exemplo de Uso:
     - URL: /listHistoric?identidade=1
     - Retorna: JSON com os dados históricos de previsões de tempo correspondentes ao ID de identificação.
+    - URL: /listHistoric?identidade=1,2,3
+    - Retorna: Lista JSON com os registros 1, 2 e 3.
 
     """
     identify = request.args.get('identidade')
-    if identify:
-        data_historic = list_historic_identify(identify)
-        json_historic = convert_postgres_json(data_historic)
-        return jsonify(json_historic)
-    else:
+    if not identify:
         return jsonify({'error': 'Erro ao buscar histórico'}), 400
+    try:
+        identities = parse_identities(identify)
+    except ValueError:
+        return jsonify({'error': 'identidade deve ser um número, ou números separados por vírgula'}), 400
+    if not identities or len(identities) > HISTORIC_MAX_LIMIT:
+        return jsonify({'error': f'Informe de 1 a {HISTORIC_MAX_LIMIT} identidades'}), 400
+
+    encode = lambda row: app.json.dumps(convert_postgres_json(row)).encode()
+    records = record_cache.get_or_load(identities, current_language.get(), list_historic_many, encode)
+    body = join_historic_records(identities, records, encode(None), many=',' in identify)
+    return Response(body, mimetype='application/json')
 
     
 @app.route('/forecast', methods=['GET'])
@@ -119,6 +321,7 @@ def get_forecast():
 
     Parâmetros de Consulta:
     - city (str): O nome da cidade para a qual deseja obter a previsão do tempo.
+    - lat, lon (float): Coordenadas, no lugar do nome (ver /weather).
 
     Retorna:
     JSON: Uma lista de dicionários, onde cada dicionário contém informações de previsão para um dia específico.
@@ -126,18 +329,364 @@ def get_forecast():
     Exemplo de Uso:
     - URL: /forecast?city=Osorio
     - Retorna: JSON com a previsão detalhada do tempo para os próximos dias em Osorio(5 dias max).
+    - URL: /forecast?lat=-29.8864&lon=-50.2697
+    - Retorna: a previsão da cidade mais próxima das coordenadas.
 
     """
     city_name = request.args.get('city')
-    if city_name:
+    try:
+        coords = parse_coordinates(request.args)
+    except ValueError:
+        return jsonify({'error': 'lat e lon devem ser números, com lat entre -90 e 90 e lon entre -180 e 180'}), 400
+    if city_name or coords:
         #current_day = False, usado quando a requisição requer mais de um dia
-        weather_data = get_weather_data(city_name, current_day=False)
-        extracted_weather_data = forecast(weather_data)
+        weather_data = get_weather_data(city_name, current_day=False, coords=coords)
+        with stage('convert'):
+            extracted_weather_data = forecast(weather_data)
         return jsonify(extracted_weather_data)
     else:
         return jsonify({'error': 'Nome da cidade incorreto ou não encontrado'}), 400
 
 
+@app.route('/stats', methods=['GET'])
+def get_stats():
+    """
+    Rota para obter as estatísticas do histórico de uma cidade por semana ou mês:
+    temperatura mínima, máxima e média, umidade média e vento máximo.
+
+    Os valores vêm do resumo (historico_resumo), atualizado a cada inserção no histórico,
+    sem percorrer os registros do histórico.
+
+    Parâmetros de Consulta:
+    - city (str) ou id (int): Nome da cidade ou ID da cidade na OpenWeather.
+    - period (str, opcional): 'week' ou 'month' (padrão).
+    - last (int, opcional): Quantidade de períodos, contando o atual (padrão 12).
+
+    Exemplo de Uso:
+    - URL: /stats?city=Osório&period=month&last=12
+    - Retorna: JSON com os últimos 12 meses de Osório.
+
+    """
+    try:
+        filters = parse_stats_filters(request.args)
+    except ValueError:
+        return jsonify({'error': 'Informe city ou id, period (week ou month) e last válidos'}), 400
+
+    data_stats = get_weather_stats(**filters)
+    return jsonify(convert_rollup_stats(data_stats or []))
+
+
+def get_batch(current_day):
+    """
+    Atende as rotas em lote (weatherBatch e forecastBatch).
+
+    Lê as cidades ('cities') e os IDs ('ids') da query string ou do corpo JSON, busca todas na API em paralelo
+    (get_weather_data_batch) e converte cada resultado (convert_batch). No lote do dia atual o histórico
+    das cidades encontradas é gravado com uma única inserção (save_weather_historic_many).
+    """
+    body = request.get_json(silent=True) or {}
+    try:
+        queries = build_batch_queries(
+            request.args.getlist('cities') + list(body.get('cities', [])),
+            request.args.getlist('ids') + [str(city_id) for city_id in body.get('ids', [])],
+        )
+    except ValueError:
+        return jsonify({'error': 'IDs de cidade devem ser números'}), 400
+
+    if not queries:
+        return jsonify({'error': 'Nenhuma cidade informada'}), 400
+    if len(queries) > BATCH_MAX_CITIES:
+        return jsonify({'error': f'Máximo de {BATCH_MAX_CITIES} cidades por requisição'}), 400
+
+    weather_data = get_weather_data_batch(queries, current_day)
+    with stage('convert'):
+        extracted_weather_data = convert_batch(queries, weather_data, current_day)
+    if current_day:
+        save_weather_historic_many(extracted_weather_data)
+    return jsonify(extracted_weather_data)
+
+
+@app.route('/weatherBatch', methods=['GET', 'POST'])
+def get_weather_batch():
+    """
+    Rota para obter a previsão do tempo atual de várias cidades em uma requisição.
+
+    Parâmetros de Consulta (ou corpo JSON):
+    - cities (str): Nomes das cidades separados por vírgula (ou lista no JSON).
+    - ids (str): IDs das cidades na OpenWeather separados por vírgula (ou lista no JSON).
+
+    Retorna:
+    JSON: Uma lista com um item por cidade, com os mesmos campos da rota /weather mais 'consulta'.
+          Cidades não encontradas vêm com code 0 e 'msg', sem afetar as demais.
+
+    Exemplo de Uso:
+    - URL: /weatherBatch?cities=Osorio,Torres&ids=3455775
+    - POST /weatherBatch {"cities": ["Osorio", "Torres"], "ids": [3455775]}
+
+    """
+    return get_batch(current_day=True)
+
+
+@app.route('/forecastBatch', methods=['GET', 'POST'])
+def get_forecast_batch():
+    """
+    Rota para obter a previsão dos próximos dias de várias cidades em uma requisição.
+
+    Recebe os mesmos parâmetros da rota /weatherBatch.
+
+    Retorna:
+    JSON: Uma lista com um item por cidade, com 'consulta', 'code' e 'dias' (mesma lista da rota /forecast).
+
+    Exemplo de Uso:
+    - URL: /forecastBatch?cities=Osorio,Torres
+
+    """
+    return get_batch(current_day=False)
+
+
+@app.route('/cities', methods=['GET'])
+def get_cities():
+    """
+    Rota de autocompletar: cidades do índice local cujo nome começa com o texto digitado, sem diferenciar acentos e maiúsculas.
+
+    Parâmetros de Consulta:
+    - q (str): Início do nome da cidade.
+    - limit (int, opcional): Máximo de cidades (padrão CITY_SUGGEST_LIMIT).
+    - country (str, opcional): Sigla do país, ex: BR.
+
+    Exemplo de Uso:
+    - URL: /cities?q=oso
+    - Retorna: [{"id": 3455775, "cidade": "Osório", "pais": "BR"}, ...]
+
+    """
+    prefix = request.args.get('q')
+    try:
+        limit = min(int(request.args.get('limit', CITY_SUGGEST_LIMIT)), 100)
+    except ValueError:
+        return jsonify({'error': 'limit deve ser um número'}), 400
+    if not prefix:
+        return jsonify({'error': 'Informe o início do nome da cidade em q'}), 400
+    return jsonify(city_index.suggest(prefix, limit, request.args.get('country')))
+
+
+def admin_route(view):
+    """
+    Decorador das rotas de monitoramento: responde o erro de admin_error (404 sem ADMIN_TOKEN, 403 com o token
+    inválido) antes de chamar a rota. Toda rota nova de estatísticas deve usá-lo.
+    """
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        error = admin_error(request.headers)
+        if error:
+            return jsonify({'error': error[0]}), error[1]
+        return view(*args, **kwargs)
+    return wrapper
+
+
+@app.route('/poolStats', methods=['GET'])
+@admin_route
+def get_pool_stats():
+    """
+    Rota para consultar as estatísticas do pool de conexões do banco de dados.
+
+    Usada para dimensionar DB_POOL_SIZE e DB_MAX_OVERFLOW: conexões em uso, overflow e tempo de espera por conexão.
+
+    Requer o cabeçalho X-Admin-Token (ou Authorization: Bearer) igual a ADMIN_TOKEN, sem ADMIN_TOKEN responde 404.
+
+    Exemplo de Uso:
+    - URL: /poolStats
+    - Retorna: JSON com as estatísticas do pool do processo atual.
+
+    """
+    return jsonify(pool_stats())
+
+
+@app.route('/cacheStats', methods=['GET'])
+@admin_route
+def get_cache_stats():
+    """
+    Rota para consultar os contadores do cache da API OpenWeather (acertos, faltas, agrupamentos e remoções).
+
+    Requer o cabeçalho X-Admin-Token (ou Authorization: Bearer) igual a ADMIN_TOKEN, sem ADMIN_TOKEN responde 404.
+
+    Exemplo de Uso:
+    - URL: /cacheStats
+    - Retorna: JSON com as estatísticas do cache do processo atual.
+
+    """
+    return jsonify(weather_cache.stats())
+
+
+@app.route('/writerStats', methods=['GET'])
+@admin_route
+def get_writer_stats():
+    """
+    Rota para consultar as métricas da gravação do histórico em segundo plano (WRITE_BEHIND=1):
+    tamanho da fila, registros gravados e descartados e latência dos lotes.
+
+    Requer o cabeçalho X-Admin-Token (ou Authorization: Bearer) igual a ADMIN_TOKEN, sem ADMIN_TOKEN responde 404.
+
+    Exemplo de Uso:
+    - URL: /writerStats
+    - Retorna: JSON com as métricas do processo atual.
+
+    """
+    return jsonify(historic_writer.stats())
+
+
+@app.route('/upstreamStats', methods=['GET'])
+@admin_route
+def get_upstream_stats():
+    """
+    Rota para consultar o estado do disjuntor das chamadas a API OpenWeather (closed, open ou half_open).
+
+    Requer o cabeçalho X-Admin-Token (ou Authorization: Bearer) igual a ADMIN_TOKEN, sem ADMIN_TOKEN responde 404.
+
+    Exemplo de Uso:
+    - URL: /upstreamStats
+    - Retorna: JSON com o estado do circuito, falhas seguidas e chamadas recusadas.
+
+    """
+    return jsonify(circuit_breaker.stats())
+
+
+@app.route('/refreshStats', methods=['GET'])
+@admin_route
+def get_refresh_stats():
+    """
+    Rota para consultar as métricas da renovação do cache em segundo plano (REFRESH_ENABLED=1):
+    cidades acompanhadas e quentes, renovações feitas, com erro e adiadas pelo limite de chamadas por minuto.
+
+    Requer o cabeçalho X-Admin-Token (ou Authorization: Bearer) igual a ADMIN_TOKEN, sem ADMIN_TOKEN responde 404.
+
+    Exemplo de Uso:
+    - URL: /refreshStats
+    - Retorna: JSON com as métricas do processo atual.
+
+    """
+    return jsonify(refresh_scheduler.stats())
+
+
+@app.route('/quotaStats', methods=['GET'])
+@admin_route
+def get_quota_stats():
+    """
+    Rota para consultar a cota de chamadas da API OpenWeather (fichas restantes por minuto e por dia, compartilhadas
+    entre os processos) e o limite de requisições por cliente (requisições liberadas e recusadas com 429).
+
+    Requer o cabeçalho X-Admin-Token (ou Authorization: Bearer) igual a ADMIN_TOKEN, sem ADMIN_TOKEN responde 404.
+
+    Exemplo de Uso:
+    - URL: /quotaStats
+    - Retorna: JSON com upstream (cota da API) e inbound (limite por cliente).
+
+    """
+    return jsonify({"upstream": upstream_quota.stats(), "inbound": rate_limiter.stats()})
+
+
+@app.route('/archiveStats', methods=['GET'])
+@admin_route
+def get_archive_stats():
+    """
+    Rota para consultar o arquivo do histórico: meses e registros arquivados, bytes em disco, início da janela
+    do banco (live_start) e as leituras que usaram o arquivo.
+
+    Requer o cabeçalho X-Admin-Token (ou Authorization: Bearer) igual a ADMIN_TOKEN, sem ADMIN_TOKEN responde 404.
+
+    Exemplo de Uso:
+    - URL: /archiveStats
+    - Retorna: JSON com as estatísticas de historic_archive.
+
+    """
+    return jsonify(historic_archive.stats())
+
+
+
+@app.route('/metrics', methods=['GET'])
+@admin_route
+def get_metrics():
+    """
+    Rota com as métricas do processo no formato texto do Prometheus: latência por rota e por etapa
+    (upstream, convert, db, serialize, compress), status e latência da API OpenWeather por end-point,
+    latência das consultas ao banco, requisições em andamento e os contadores do cache, pool, fila e disjuntor.
+
+    Requer o cabeçalho X-Admin-Token (ou Authorization: Bearer) igual a ADMIN_TOKEN, sem ADMIN_TOKEN responde 404.
+
+    Exemplo de Uso:
+    - URL: /metrics
+    - Configuração do Prometheus: scrape_configs: - job_name: weather  static_configs: - targets: ['127.0.0.1:5000']
+
+    """
+    return Response(render(), mimetype='text/plain; version=0.0.4')
+
+
+@app.route('/traces', methods=['GET'])
+@admin_route
+def get_traces():
+    """
+    Rota com os últimos rastros das requisições amostradas (TRACE_SAMPLE_RATE > 0 e TRACE_BACKEND=memory),
+    cada rastro é a lista de spans da requisição com os campos do OpenTelemetry (trace_id, span_id, parent_span_id).
+
+    Requer o cabeçalho X-Admin-Token (ou Authorization: Bearer) igual a ADMIN_TOKEN, sem ADMIN_TOKEN responde 404.
+
+    Exemplo de Uso:
+    - URL: /traces
+
+    """
+    return jsonify(recent_traces())
+
+
+@app.route('/profile', methods=['GET'])
+def get_profile():
+    """
+    Rota de administração que amostra as pilhas das threads deste processo por alguns segundos e retorna as pilhas
+    no formato collapsed ('pilha amostras' por linha), lido pelo flamegraph.pl, speedscope e inferno.
+    Requer o cabeçalho X-Profile-Token igual a PROFILER_TOKEN (sem PROFILER_TOKEN a rota responde 404).
+    Com vários workers (server.py) cada requisição perfila somente o worker que a recebeu.
+
+    Parâmetros de Consulta (opcionais):
+    - seconds (float): Duração da amostragem, padrão 10 (máximo PROFILER_MAX_SECONDS).
+    - scope (str): 'requests' (padrão) amostra as threads atendendo requisições, 'all' todas as threads do processo.
+
+    Exemplo de Uso:
+    - URL: /profile?seconds=30 (com o cabeçalho X-Profile-Token)
+    - Retorna: arquivo profile.collapsed, ex: flamegraph.pl profile.collapsed > profile.svg
+
+    """
+    error = access_error(request.headers)
+    if error:
+        return jsonify({'error': error[0]}), error[1]
+    try:
+        seconds, scope = parse_session(request.args)
+    except ValueError:
+        return jsonify({'error': 'seconds deve ser um número entre 0 e PROFILER_MAX_SECONDS, scope requests ou all'}), 400
+
+    response = Response(render_collapsed(profiler.profile(seconds, scope)), mimetype='text/plain')
+    response.headers['Content-Disposition'] = 'attachment; filename=profile.collapsed'
+    return response
+
+
+@app.route('/profile/requests', methods=['GET'])
+def get_profile_requests():
+    """
+    Rota de administração com as pilhas somadas das requisições perfiladas (cabeçalho X-Profile ou PROFILER_SAMPLE_RATE)
+    deste processo, no formato collapsed. Requer o cabeçalho X-Profile-Token.
+
+    Parâmetros de Consulta (opcionais):
+    - reset (int): 1 apaga as pilhas depois de retornar.
+
+    Exemplo de Uso:
+    - URL: /profile/requests?reset=1
+
+    """
+    error = access_error(request.headers)
+    if error:
+        return jsonify({'error': error[0]}), error[1]
+    stacks = profiler.take_request_stacks(reset=request.args.get('reset') == '1')
+    response = Response(render_collapsed(stacks), mimetype='text/plain')
+    response.headers['Content-Disposition'] = 'attachment; filename=requests.collapsed'
+    return response
+
 
 if __name__ == '__main__':
     """
@@ -153,4 +702,6 @@ if __name__ == '__main__':
     - Inicia o servidor Flask para a aplicação web na máquina local, no host 127.0.0.1 (localhost), na porta 5000.
 
     """
+    init_engine()
+    load_city_index(entries=historic_cities(list_known_cities()))
     app.run(host='127.0.0.1', port=5000)
@@ -0,0 +1,383 @@
+import hmac
+import os
+import random
+import threading
+import time
+from bisect import bisect_left
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+
+#Configuração das métricas e do rastreamento (tracing), pode ser ajustada por variáveis de ambiente
+METRICS_ENABLED = os.environ.get('METRICS_ENABLED', '1') != '0'
+#Fração das requisições rastreadas com spans (0 desativa, 1 rastreia todas)
+TRACE_SAMPLE_RATE = float(os.environ.get('TRACE_SAMPLE_RATE', 0))
+#'memory' guarda os últimos TRACE_BUFFER rastros para a rota /traces, 'otel' envia os spans ao OpenTelemetry
+TRACE_BACKEND = os.environ.get('TRACE_BACKEND', 'memory')
+TRACE_BUFFER = int(os.environ.get('TRACE_BUFFER', 100))
+#Token das rotas de monitoramento (/metrics, /traces e /*Stats), vazio desativa as rotas
+ADMIN_TOKEN = os.environ.get('ADMIN_TOKEN', '')
+
+#Limites (segundos) dos histogramas de latência
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+#Rota da requisição atual, usada como rótulo das etapas; fora de uma requisição (threads de fundo) é 'background'
+current_route = ContextVar('current_route', default='background')
+
+
+def escape_label(value):
+    """Escapa barras, aspas e quebras de linha do valor de um rótulo."""
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def format_labels(names, values, extra=''):
+    """Monta os rótulos no formato do Prometheus, ex: {route="/weather",status="200"}."""
+    pairs = [f'{name}="{escape_label(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def admin_error(headers):
+    """
+    Verifica o acesso às rotas de monitoramento, pelo cabeçalho X-Admin-Token ou Authorization: Bearer
+    (bearer_token do scrape_config do Prometheus).
+
+    Retorna:
+    tuple: (mensagem, status) do erro, 404 sem ADMIN_TOKEN e 403 com o token inválido, ou None.
+    """
+    if not ADMIN_TOKEN:
+        return 'Rota de monitoramento desativada, defina ADMIN_TOKEN', 404
+    token = headers.get('X-Admin-Token', '')
+    if not token:
+        scheme, _, value = headers.get('Authorization', '').partition(' ')
+        token = value.strip() if scheme.lower() == 'bearer' else ''
+    if not hmac.compare_digest(token.encode(), ADMIN_TOKEN.encode()):
+        return 'Token de administração inválido', 403
+    return None
+
+
+class Metric:
+    """
+    Métrica com rótulos, base de Counter, Gauge e Histogram.
+
+    Atributos:
+        name (str): Nome da métrica no Prometheus.
+        help (str): Descrição da métrica.
+        labelnames (tuple): Nomes dos rótulos, os valores são informados na mesma ordem.
+    """
+    type = 'untyped'
+
+    def __init__(self, name, help, labelnames=()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+        registry.append(self)
+
+    def samples(self):
+        """Retorna as linhas da métrica no formato texto do Prometheus."""
+        with self._lock:
+            items = list(self._values.items())
+        return [f'{self.name}{format_labels(self.labelnames, labels)} {value}' for labels, value in items]
+
+
+class Counter(Metric):
+    """Contador que só aumenta, ex: requisições por rota e status."""
+    type = 'counter'
+
+    def inc(self, *labels, amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+
+class Gauge(Metric):
+    """Valor que sobe e desce, ex: requisições em andamento."""
+    type = 'gauge'
+
+    def inc(self, *labels, amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def dec(self, *labels, amount=1):
+        self.inc(*labels, amount=-amount)
+
+
+class Histogram(Metric):
+    """Histograma de latências com limites fixos (buckets), soma e contagem por combinação de rótulos."""
+    type = 'histogram'
+
+    def __init__(self, name, help, labelnames=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, *labels):
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            item = self._values.get(labels)
+            if item is None:
+                item = self._values[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            item[0][index] += 1
+            item[1] += value
+            item[2] += 1
+
+    def samples(self):
+        with self._lock:
+            items = [(labels, list(counts), total, count) for labels, (counts, total, count) in self._values.items()]
+        lines = []
+        for labels, counts, total, count in items:
+            cumulative = 0
+            for bound, amount in zip(self.buckets + ('+Inf',), counts):
+                cumulative += amount
+                le = 'le="%s"' % bound
+                lines.append(f'{self.name}_bucket{format_labels(self.labelnames, labels, le)} {cumulative}')
+            lines.append(f'{self.name}_sum{format_labels(self.labelnames, labels)} {round(total, 6)}')
+            lines.append(f'{self.name}_count{format_labels(self.labelnames, labels)} {count}')
+        return lines
+
+
+#Métricas do processo, na ordem em que aparecem em /metrics
+registry = []
+#Funções chamadas a cada leitura de /metrics que retornam métricas calculadas na hora (cache, pool, fila, disjuntor)
+collectors = []
+
+http_requests = Counter('weather_http_requests_total', 'Requisições atendidas por rota, método e status', ('route', 'method', 'status'))
+http_duration = Histogram('weather_http_request_duration_seconds', 'Latência das requisições por rota', ('route', 'method'))
+http_in_flight = Gauge('weather_http_requests_in_flight', 'Requisições em andamento por rota', ('route',))
+stage_duration = Histogram('weather_stage_duration_seconds', 'Latência das etapas (upstream, convert, db, serialize, compress) por rota', ('route', 'stage'))
+upstream_responses = Counter('weather_upstream_responses_total', 'Respostas da API OpenWeather por end-point e status', ('endpoint', 'status'))
+upstream_duration = Histogram('weather_upstream_request_duration_seconds', 'Latência das chamadas a API OpenWeather por end-point', ('endpoint',))
+db_duration = Histogram('weather_db_query_duration_seconds', 'Latência das consultas ao banco de dados por operação', ('operation',))
+
+
+@contextmanager
+def stage(name):
+    """
+    Mede uma etapa da requisição atual no histograma weather_stage_duration_seconds (e em um span, se a requisição for rastreada).
+
+    Exemplo de Uso:
+    - with stage('convert'):
+          extracted_weather_data = convert_api_to_current_city(weather_data)
+    """
+    if not METRICS_ENABLED:
+        yield
+        return
+    span = start_span(name)
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        stage_duration.observe(time.perf_counter() - start, current_route.get(), name)
+        if span is not None:
+            end_span(span)
+
+
+def observe_upstream(endpoint, status, elapsed):
+    """Registra uma chamada a API OpenWeather: status ('200', '404', '503' ou o nome do erro de conexão) e latência."""
+    if METRICS_ENABLED:
+        upstream_responses.inc(endpoint, status)
+        upstream_duration.observe(elapsed, endpoint)
+
+
+def observe_db(statement, elapsed):
+    """Registra uma consulta ao banco de dados, a operação é a primeira palavra do SQL (SELECT, INSERT, ...)."""
+    if METRICS_ENABLED:
+        operation = statement.lstrip().split(None, 1)[0].upper() if statement.strip() else 'OTHER'
+        db_duration.observe(elapsed, operation)
+        stage_duration.observe(elapsed, current_route.get(), 'db')
+        span = start_span('db')
+        if span is not None:
+            span.start -= int(elapsed * 1e9)
+            span.attributes['db.operation'] = operation
+            end_span(span)
+
+
+def instrument_engine(engine):
+    """
+    Mede as consultas de um engine do SQLAlchemy (síncrono, ou o sync_engine do assíncrono) com eventos do cursor.
+    """
+    from sqlalchemy import event
+
+    @event.listens_for(engine, 'before_cursor_execute')
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault('query_start', []).append(time.perf_counter())
+
+    @event.listens_for(engine, 'after_cursor_execute')
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        starts = conn.info.get('query_start')
+        if starts:
+            observe_db(statement, time.perf_counter() - starts.pop())
+
+    @event.listens_for(engine, 'handle_error')
+    def handle_error(context):
+        #a consulta falhou e after_cursor_execute não será chamado, descarta o início guardado
+        if context.connection is not None and context.connection.info.get('query_start'):
+            context.connection.info['query_start'].pop()
+
+
+def register_stats(prefix, stats, help):
+    """
+    Publica em /metrics os valores de uma função stats() já existente (ex: weather_cache.stats), lida a cada leitura.
+    Números viram gauges weather_<prefix>_<chave>, textos (ex: estado do disjuntor) viram gauges com o rótulo value.
+
+    Exemplo de Uso:
+    - register_stats('cache', weather_cache.stats, 'Cache da API OpenWeather')
+    """
+    def collect():
+        items = []
+        for key, value in stats().items():
+            name = f'weather_{prefix}_{key}'
+            if isinstance(value, str):
+                items.append((name, 'gauge', f'{help} ({key})', [({'value': value}, 1)]))
+            elif isinstance(value, (int, float)):
+                items.append((name, 'gauge', f'{help} ({key})', [({}, int(value) if isinstance(value, bool) else value)]))
+        return items
+
+    collectors.append(collect)
+
+
+def request_started(route):
+    """
+    Início de uma requisição: define a rota atual, soma em andamento e decide se a requisição será rastreada.
+
+    Retorna:
+    tuple: Estado usado por request_finished (início, rota, span raiz).
+    """
+    current_route.set(route)
+    if not METRICS_ENABLED:
+        return None
+    http_in_flight.inc(route)
+    return time.perf_counter(), route, start_trace(route)
+
+
+def request_finished(state, method, status):
+    """Fim de uma requisição: registra a latência e o status e fecha o span raiz."""
+    if state is None:
+        return
+    start, route, span = state
+    http_in_flight.dec(route)
+    http_requests.inc(route, method, str(status))
+    http_duration.observe(time.perf_counter() - start, route, method)
+    if span is not None:
+        span.attributes['http.status_code'] = status
+        end_span(span)
+
+
+def render():
+    """
+    Retorna todas as métricas no formato texto do Prometheus (text/plain; version=0.0.4).
+    """
+    lines = []
+    for metric in registry:
+        samples = metric.samples()
+        if samples:
+            lines.append(f'# HELP {metric.name} {metric.help}')
+            lines.append(f'# TYPE {metric.name} {metric.type}')
+            lines.extend(samples)
+    for collect in collectors:
+        try:
+            items = collect()
+        except Exception as e:
+            continue
+        for name, kind, help, values in items:
+            lines.append(f'# HELP {name} {help}')
+            lines.append(f'# TYPE {name} {kind}')
+            for labels, value in values:
+                lines.append(f'{name}{format_labels(tuple(labels), tuple(labels.values()))} {value}')
+    return '\n'.join(lines) + '\n'
+
+
+#Rastreamento (tracing): spans com os campos do OpenTelemetry (trace_id, span_id, parent_span_id, nome, início, fim)
+current_span = ContextVar('current_span', default=None)
+traces = deque(maxlen=TRACE_BUFFER)
+_otel_tracer = None
+if TRACE_BACKEND == 'otel' and TRACE_SAMPLE_RATE > 0:
+    try:
+        from opentelemetry import trace as otel_trace
+        _otel_tracer = otel_trace.get_tracer('weather_back-end')
+    except ImportError:
+        _otel_tracer = None
+
+
+class Span:
+    """
+    Span de uma requisição rastreada. Com TRACE_BACKEND=otel cada Span também abre um span no OpenTelemetry.
+
+    Atributos:
+        trace_id (str): ID do rastro (32 hexadecimais), igual em todos os spans da requisição.
+        span_id (str): ID do span (16 hexadecimais).
+        parent_span_id (str): ID do span pai, None no span raiz.
+        spans (list): No span raiz, os spans filhos já finalizados.
+    """
+    __slots__ = ('name', 'trace_id', 'span_id', 'parent_span_id', 'start', 'end', 'attributes', 'root', 'spans', 'token', 'otel')
+
+    def __init__(self, name, parent=None):
+        self.name = name
+        self.trace_id = parent.trace_id if parent is not None else f'{random.getrandbits(128):032x}'
+        self.span_id = f'{random.getrandbits(64):016x}'
+        self.parent_span_id = parent.span_id if parent is not None else None
+        self.root = parent.root if parent is not None else self
+        self.spans = [] if parent is None else None
+        self.attributes = {}
+        self.start = time.time_ns()
+        self.end = None
+        self.otel = None
+        if _otel_tracer is not None:
+            context = otel_trace.set_span_in_context(parent.otel) if parent is not None and parent.otel is not None else None
+            self.otel = _otel_tracer.start_span(name, context=context)
+        self.token = current_span.set(self)
+
+    def as_dict(self):
+        return {
+            "name": self.name,
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_span_id": self.parent_span_id,
+            "start_time_unix_nano": self.start,
+            "end_time_unix_nano": self.end,
+            "duration_ms": round((self.end - self.start) / 1e6, 3) if self.end else None,
+            "attributes": self.attributes,
+        }
+
+
+def start_trace(route):
+    """Inicia o span raiz da requisição com probabilidade TRACE_SAMPLE_RATE, retorna None se não for rastreada."""
+    current_span.set(None)
+    if TRACE_SAMPLE_RATE <= 0 or random.random() >= TRACE_SAMPLE_RATE:
+        return None
+    span = Span(route)
+    span.attributes['http.route'] = route
+    return span
+
+
+def start_span(name):
+    """Inicia um span filho do span atual, somente se a requisição estiver sendo rastreada."""
+    parent = current_span.get()
+    if parent is None:
+        return None
+    return Span(name, parent)
+
+
+def end_span(span):
+    """Finaliza o span e, no span raiz, guarda o rastro completo em traces (rota /traces)."""
+    span.end = time.time_ns()
+    if span.otel is not None:
+        for key, value in span.attributes.items():
+            span.otel.set_attribute(key, value)
+        span.otel.end()
+    try:
+        current_span.reset(span.token)
+    except ValueError:
+        #span finalizado em outro contexto (ex: resposta em streaming), apenas volta para o pai
+        current_span.set(None)
+    if span.root is span:
+        traces.append([span.as_dict()] + [child.as_dict() for child in span.spans])
+    else:
+        span.root.spans.append(span)
+
+
+def recent_traces():
+    """Retorna os últimos rastros guardados (TRACE_BACKEND=memory), cada um uma lista de spans."""
+    return list(traces)
@@ -0,0 +1,205 @@
+import os
+import threading
+import time
+import numpy as np
+from aggregation import forecast_arrays, aggregate_arrays
+from cache import CachedResponse
+
+
+#'0' desativa o modelo normalizado guardado junto da resposta do cache (model_cache), convertendo a cada requisição
+MODEL_CACHE = os.environ.get('MODEL_CACHE', '1') == '1'
+
+
+class Conditions:
+    """
+    Condições do tempo em um momento, com os valores numéricos da API (sem formatação).
+
+    Os valores da resposta do end-point weather são guardados como vieram (int ou float), assim o texto
+    formatado nas rotas é igual ao da resposta (ex: '20 °C' e não '20.0 °C').
+
+    Atributos:
+        dt (int): Timestamp UTC da medição ou da previsão.
+        temp, temp_max, temp_min (float): Temperaturas em °C.
+        humidity (int): Umidade em %.
+        wind (float): Velocidade do vento.
+        condition (int): ID da condição do tempo na OpenWeather.
+        description (str): Descrição da condição do tempo.
+        icon (str): Código do ícone da condição do tempo.
+    """
+    __slots__ = ('dt', 'temp', 'temp_max', 'temp_min', 'humidity', 'wind', 'condition', 'description', 'icon')
+
+    def __init__(self, dt, temp, temp_max, temp_min, humidity, wind, condition, description, icon):
+        self.dt = dt
+        self.temp = temp
+        self.temp_max = temp_max
+        self.temp_min = temp_min
+        self.humidity = humidity
+        self.wind = wind
+        self.condition = condition
+        self.description = description
+        self.icon = icon
+
+    @classmethod
+    def from_item(cls, item):
+        """Lê as condições da resposta do end-point weather ou de um item da lista do end-point forecast."""
+        main, weather = item['main'], item['weather'][0]
+        return cls(item.get('dt', 0), main['temp'], main['temp_max'], main['temp_min'], main['humidity'],
+                   item['wind']['speed'], weather.get('id', 0), weather['description'], weather['icon'])
+
+
+class CityWeather:
+    """
+    Modelo normalizado de uma resposta da API (end-point weather ou forecast), usado pelas rotas /weather e /forecast
+    no lugar do JSON da API. A formatação dos textos da resposta fica no function.py.
+
+    A previsão de 3 horas fica em arrays colunares (aggregation.forecast_arrays) e o agrupamento por dia é
+    calculado uma vez por dia local da cidade (days).
+
+    Atributos:
+        id (int): ID da cidade na OpenWeather.
+        name (str): Nome da cidade.
+        country (str): Sigla do país.
+        timezone (int): Fuso da cidade em segundos.
+        current (Conditions): Condições atuais, somente nas respostas do end-point weather.
+        series (dict): Arrays da previsão, somente nas respostas do end-point forecast.
+    """
+    __slots__ = ('id', 'name', 'country', 'timezone', 'current', 'series', '_days', '_lock')
+
+    def __init__(self, id, name, country, timezone=0, current=None, series=None):
+        self.id = id
+        self.name = name
+        self.country = country
+        self.timezone = timezone
+        self.current = current
+        self.series = series
+        self._days = None
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_payload(cls, data):
+        """
+        Converte a resposta da API no modelo, pelo formato: 'list' é do end-point forecast, senão do weather.
+
+        Exceções:
+        KeyError, IndexError, TypeError, ValueError: Se a resposta não for de sucesso ou estiver incompleta.
+        """
+        if isinstance(data.get('list'), list):
+            city = data['city']
+            return cls(city['id'], city.get('name', ''), city['country'], city.get('timezone', 0),
+                       series=forecast_arrays([data]))
+        return cls(data['id'], data.get('name', ''), data['sys']['country'], data.get('timezone', 0),
+                   current=Conditions.from_item(data))
+
+    def conditions_at(self, now=None):
+        """
+        Condições atuais da cidade.
+
+        Nas respostas do end-point forecast (modo combinado, WEATHER_COMBINED=1) os valores numéricos são interpolados
+        entre as duas previsões de 3 horas em volta de agora, e a descrição e o ícone vêm da previsão mais próxima.
+
+        Parâmetros:
+        now (float, opcional): Timestamp usado como agora, por padrão time.time().
+
+        Retorna:
+        Conditions: As condições, ou None se a previsão não tiver itens.
+        """
+        if self.current is not None:
+            return self.current
+        series = self.series
+        now = time.time() if now is None else now
+        dt = series["dt"]
+        if not len(dt):
+            return None
+        after = min(int(np.searchsorted(dt, now)), len(dt) - 1)
+        before = max(after - 1, 0)
+        span = dt[after] - dt[before]
+        weight = min(max((now - dt[before]) / span, 0.0), 1.0) if span > 0 else 1.0
+        nearest = after if weight >= 0.5 else before
+
+        def value(name):
+            return float(series[name][before] + (series[name][after] - series[name][before]) * weight)
+
+        return Conditions(int(now), round(value("temp"), 2), round(value("temp_max"), 2), round(value("temp_min"), 2),
+                          round(value("humidity")), round(value("wind"), 2), int(series["condition"][nearest]),
+                          series["description"][nearest], series["icon"][nearest])
+
+    def days(self, now=None):
+        """
+        Previsão por dia, sem o dia atual (aggregation.aggregate_arrays), calculada uma vez por dia local da cidade.
+
+        Retorna:
+        list: Um dicionário numérico por dia (date, temp, temp_max, temp_min, humidity, wind, description, icon).
+        """
+        now = time.time() if now is None else now
+        today = (int(now) + self.timezone) // 86400
+        memo = self._days
+        if memo is not None and memo[0] == today:
+            return memo[1]
+        with self._lock:
+            if self._days is None or self._days[0] != today:
+                self._days = (today, aggregate_arrays(self.series, 1, now=now)[0])
+            return self._days[1]
+
+
+class ModelCache:
+    """
+    Modelos normalizados das respostas da API, para converter cada resposta uma única vez.
+
+    O modelo fica guardado na própria resposta do cache da API (cache.CachedResponse.model), assim vive somente
+    enquanto o cache.weather_cache mantiver a resposta: ao ser removida pelo LRU ou substituída por uma resposta nova,
+    o modelo é liberado junto. Dicionários fora do cache (ex: cada leitura do CACHE_BACKEND=redis) são convertidos
+    a cada requisição.
+
+    Atributos:
+        enabled (bool): Guarda os modelos nas respostas, False converte a cada requisição.
+        hits (int): Requisições atendidas por um modelo já convertido.
+        misses (int): Respostas convertidas.
+    """
+    def __init__(self, enabled=MODEL_CACHE):
+        self.enabled = enabled
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def get(self, data):
+        """
+        Retorna o modelo da resposta da API, convertido somente na primeira vez.
+
+        Exceções:
+        KeyError, IndexError, TypeError, ValueError: Se a resposta não for de sucesso ou estiver incompleta.
+        """
+        cacheable = self.enabled and isinstance(data, CachedResponse)
+        model = getattr(data, 'model', None) if cacheable else None
+        with self._lock:
+            if model is not None:
+                self.hits += 1
+                return model
+            self.misses += 1
+        model = CityWeather.from_payload(data)
+        if cacheable:
+            #em conversões simultâneas da mesma resposta fica a última, as duas são equivalentes
+            data.model = model
+        return model
+
+    def stats(self):
+        with self._lock:
+            return {"enabled": self.enabled, "hits": self.hits, "misses": self.misses}
+
+
+#Cache único de modelos do processo
+model_cache = ModelCache()
+
+
+def weather_model(data):
+    """
+    Modelo normalizado (CityWeather) de uma resposta da API, pelo model_cache.
+
+    Retorna:
+    CityWeather: O modelo, ou None se a resposta for de erro ou estiver incompleta.
+    """
+    if not isinstance(data, dict):
+        return None
+    try:
+        return model_cache.get(data)
+    except (KeyError, IndexError, TypeError, ValueError):
+        return None
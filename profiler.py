@@ -0,0 +1,291 @@
+import hmac
+import os
+import random
+import sys
+import threading
+import time
+from collections import Counter
+
+
+#Configuração do profiler por amostragem, pode ser ajustada por variáveis de ambiente
+#Chave das rotas de profiling (cabeçalho X-Profile-Token), vazio desativa as rotas e o cabeçalho X-Profile
+PROFILER_TOKEN = os.environ.get('PROFILER_TOKEN', '')
+#Intervalo em segundos entre as amostras das pilhas
+PROFILER_INTERVAL = float(os.environ.get('PROFILER_INTERVAL', 0.01))
+#Duração máxima em segundos de uma sessão da rota /profile
+PROFILER_MAX_SECONDS = float(os.environ.get('PROFILER_MAX_SECONDS', 60))
+#Fração das requisições perfiladas sem o cabeçalho X-Profile (0 desativa)
+PROFILER_SAMPLE_RATE = float(os.environ.get('PROFILER_SAMPLE_RATE', 0))
+#Máximo de pilhas diferentes guardadas das requisições perfiladas, as novas são contadas como '(outras)'
+PROFILER_MAX_STACKS = int(os.environ.get('PROFILER_MAX_STACKS', 5000))
+#Sem a chave e sem amostragem os hooks das requisições não são registrados, o profiler não custa nada
+PROFILER_ENABLED = bool(PROFILER_TOKEN) or PROFILER_SAMPLE_RATE > 0
+
+
+#Nome de cada objeto de código já visto nas pilhas, calculado uma vez
+_labels = {}
+
+
+def frame_label(code):
+    """Nome da função na pilha, 'arquivo.py:Classe.funcao'."""
+    label = _labels.get(code)
+    if label is None:
+        label = f'{os.path.basename(code.co_filename)}:{getattr(code, "co_qualname", code.co_name)}'
+        _labels[code] = label
+    return label
+
+
+def collapse(frame, root):
+    """
+    Converte a pilha de um frame no formato collapsed (funções da raiz até a folha separadas por ';').
+
+    Parâmetros:
+    frame (frame): Frame atual da thread (sys._current_frames).
+    root (str): Primeiro item da pilha, a rota da requisição ou o nome da thread.
+    """
+    labels = []
+    while frame is not None:
+        labels.append(frame_label(frame.f_code))
+        frame = frame.f_back
+    labels.append(root.replace(';', ','))
+    return ';'.join(reversed(labels))
+
+
+def render_collapsed(stacks):
+    """Texto no formato collapsed ('pilha quantidade' por linha), lido pelo flamegraph.pl, speedscope e inferno."""
+    return ''.join(f'{stack} {count}\n' for stack, count in stacks.most_common())
+
+
+class Session:
+    """
+    Sessão de amostragem da rota /profile.
+
+    Atributos:
+        scope (str): 'requests' amostra somente as threads atendendo requisições, 'all' todas as threads.
+        exclude (set): Threads ignoradas (a thread que aguarda a sessão).
+        stacks (Counter): Pilha -> amostras.
+        samples (int): Rodadas de amostragem.
+    """
+    def __init__(self, scope, exclude):
+        self.scope = scope
+        self.exclude = exclude
+        self.stacks = Counter()
+        self.samples = 0
+
+
+class SamplingProfiler:
+    """
+    Profiler por amostragem das pilhas de todas as threads do processo (sys._current_frames), sem instrumentar
+    as funções: a cada interval segundos uma thread lê a pilha das threads amostradas e soma uma amostra por pilha.
+
+    A thread de amostragem roda somente enquanto há uma sessão (/profile) ou uma requisição perfilada em andamento.
+    Sem profiling o custo por requisição é registrar a thread e a rota (enter/leave) em um dicionário.
+
+    Atributos:
+        requests (dict): Thread -> environ WSGI das requisições em andamento.
+        watched (set): Threads das requisições perfiladas (cabeçalho X-Profile ou PROFILER_SAMPLE_RATE).
+        request_stacks (Counter): Pilhas somadas das requisições perfiladas.
+        profiled (int): Requisições perfiladas.
+        sessions_run (int): Sessões da rota /profile.
+    """
+    def __init__(self, interval=PROFILER_INTERVAL, max_stacks=PROFILER_MAX_STACKS, sample_rate=PROFILER_SAMPLE_RATE):
+        self.interval = interval
+        self.max_stacks = max_stacks
+        self.sample_rate = sample_rate
+        self.requests = {}
+        self.watched = set()
+        self.request_stacks = Counter()
+        self.profiled = 0
+        self.sessions_run = 0
+        self.samples = 0
+        self._sessions = []
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def enter(self, environ, profile=False):
+        """
+        Registra a requisição da thread atual, chamado no início da requisição.
+
+        Parâmetros:
+        environ (dict): environ WSGI da requisição, o método e o caminho (ex: 'GET /weather') são o primeiro item
+                        das pilhas, lidos somente nas amostras.
+        profile (bool, opcional): True perfila a requisição (cabeçalho X-Profile), senão com a chance sample_rate.
+
+        Retorna:
+        bool: True se a requisição é perfilada.
+        """
+        thread_id = threading.get_ident()
+        self.requests[thread_id] = environ
+        if not profile and not (self.sample_rate and random.random() < self.sample_rate):
+            return False
+        with self._lock:
+            self.watched.add(thread_id)
+            self.profiled += 1
+            self._ensure_running()
+        return True
+
+    def leave(self):
+        """Remove o registro da requisição da thread atual, chamado no fim da requisição."""
+        thread_id = threading.get_ident()
+        self.requests.pop(thread_id, None)
+        if self.watched:
+            with self._lock:
+                self.watched.discard(thread_id)
+
+    def start(self, scope='requests', exclude=None):
+        """
+        Inicia uma sessão de amostragem, encerrada por stop().
+
+        Parâmetros:
+        scope (str, opcional): 'requests' ou 'all'.
+        exclude (set, opcional): Threads ignoradas, por padrão a thread atual (que aguarda a sessão).
+        """
+        session = Session(scope, {threading.get_ident()} if exclude is None else set(exclude))
+        with self._lock:
+            self._sessions.append(session)
+            self.sessions_run += 1
+            self._ensure_running()
+        return session
+
+    def stop(self, session):
+        """Encerra a sessão e retorna as pilhas amostradas (Counter)."""
+        with self._lock:
+            if session in self._sessions:
+                self._sessions.remove(session)
+        return session.stacks
+
+    def profile(self, seconds, scope='requests'):
+        """
+        Amostra as pilhas por seconds segundos, bloqueando a thread atual (que não é amostrada).
+
+        Retorna:
+        Counter: Pilha (formato collapsed) -> amostras.
+        """
+        session = self.start(scope)
+        try:
+            time.sleep(seconds)
+        finally:
+            self.stop(session)
+        return session.stacks
+
+    def take_request_stacks(self, reset=False):
+        """Retorna uma cópia das pilhas das requisições perfiladas, e as apaga com reset=True."""
+        with self._lock:
+            stacks = Counter(self.request_stacks)
+            if reset:
+                self.request_stacks.clear()
+        return stacks
+
+    def _ensure_running(self):
+        #chamado com o _lock
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run, name='sampling-profiler', daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        own = threading.get_ident()
+        while True:
+            with self._lock:
+                if not self._sessions and not self.watched:
+                    self._thread = None
+                    return
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            requests = dict(self.requests)
+            frames = sys._current_frames()
+            frames.pop(own, None)
+            collapsed = {}
+
+            def stack(thread_id):
+                if thread_id not in collapsed:
+                    environ = requests.get(thread_id)
+                    if environ is not None:
+                        root = f'{environ.get("REQUEST_METHOD")} {environ.get("PATH_INFO")}'
+                    else:
+                        root = names.get(thread_id, str(thread_id))
+                    collapsed[thread_id] = collapse(frames[thread_id], root)
+                return collapsed[thread_id]
+
+            #as pilhas são somadas com o _lock, depois de stop() a sessão não recebe mais amostras
+            with self._lock:
+                for session in self._sessions:
+                    for thread_id in frames:
+                        if thread_id in session.exclude or (session.scope == 'requests' and thread_id not in requests):
+                            continue
+                        session.stacks[stack(thread_id)] += 1
+                    session.samples += 1
+                for thread_id in self.watched:
+                    if thread_id in frames:
+                        key = stack(thread_id)
+                        if key not in self.request_stacks and len(self.request_stacks) >= self.max_stacks:
+                            key = '(outras)'
+                        self.request_stacks[key] += 1
+                self.samples += 1
+            #libera os frames antes de esperar, para não manter vivos os objetos das pilhas
+            del frames, collapsed
+            time.sleep(self.interval)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "running": int(self._thread is not None),
+                "sessions": len(self._sessions),
+                "sessions_run": self.sessions_run,
+                "profiled": self.profiled,
+                "watched": len(self.watched),
+                "samples": self.samples,
+                "stacks": len(self.request_stacks),
+            }
+
+
+def authorized(headers):
+    """
+    Verifica o cabeçalho X-Profile-Token das rotas de profiling.
+
+    Retorna:
+    bool: True se PROFILER_TOKEN está configurado e o cabeçalho é igual.
+    """
+    token = headers.get('X-Profile-Token', '')
+    return bool(PROFILER_TOKEN) and hmac.compare_digest(token.encode(), PROFILER_TOKEN.encode())
+
+
+def wants_profile(headers):
+    """True se a requisição pede para ser perfilada (X-Profile: 1 com o X-Profile-Token válido)."""
+    return headers.get('X-Profile') == '1' and authorized(headers)
+
+
+def access_error(headers):
+    """
+    Verifica o acesso às rotas de profiling.
+
+    Retorna:
+    tuple: (mensagem, status) do erro, 404 sem PROFILER_TOKEN e 403 com o X-Profile-Token inválido, ou None.
+    """
+    if not PROFILER_TOKEN:
+        return 'Profiler desativado, defina PROFILER_TOKEN', 404
+    if not authorized(headers):
+        return 'X-Profile-Token inválido', 403
+    return None
+
+
+def parse_session(args):
+    """
+    Lê os parâmetros da rota /profile.
+
+    Parâmetros:
+    args (MultiDict): seconds (padrão 10, até PROFILER_MAX_SECONDS) e scope ('requests' ou 'all').
+
+    Retorna:
+    tuple: (seconds, scope)
+
+    Exceções:
+    ValueError: Se seconds não for um número no intervalo ou scope for inválido.
+    """
+    seconds = float(args.get('seconds', 10))
+    scope = args.get('scope', 'requests')
+    if not 0 < seconds <= PROFILER_MAX_SECONDS or scope not in ('requests', 'all'):
+        raise ValueError('parâmetros da sessão inválidos')
+    return seconds, scope
+
+
+#Profiler único do processo (cada worker do server.py tem o seu)
+profiler = SamplingProfiler()
@@ -0,0 +1,431 @@
+import asyncio
+import math
+import mmap
+import os
+import struct
+import tempfile
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from cache import CACHE_REDIS_URL
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+
+#Cota da API OpenWeather (chave gratuita: 60 chamadas por minuto), respeitada por todos os workers do servidor ('0' desativa).
+#O balde acumula até QUOTA_BURST chamadas, então em qualquer minuto são feitas no máximo QUOTA_CALLS_PER_MINUTE + QUOTA_BURST
+QUOTA_CALLS_PER_MINUTE = float(os.environ.get('QUOTA_CALLS_PER_MINUTE', 0))
+QUOTA_BURST = float(os.environ.get('QUOTA_BURST', 10))
+#Chamadas por dia ('0' sem limite), o balde acumula até 1 hora de chamadas
+QUOTA_CALLS_PER_DAY = float(os.environ.get('QUOTA_CALLS_PER_DAY', 0))
+#Segundos que uma requisição espera por uma ficha antes de desistir (e responder com o cache expirado)
+QUOTA_WAIT = float(os.environ.get('QUOTA_WAIT', 0.5))
+#Fração do balde reservada para as requisições, a renovação em segundo plano só usa fichas acima dessa reserva
+QUOTA_RESERVE = float(os.environ.get('QUOTA_RESERVE', 0.5))
+#Onde fica o estado dos baldes: 'file' (arquivo compartilhado pelos processos da máquina), 'redis' (entre máquinas) ou 'memory'
+QUOTA_BACKEND = os.environ.get('QUOTA_BACKEND', 'file')
+#Diretório do arquivo de estado (backend 'file'), por padrão um diretório da aplicação por usuário dentro do temporário
+QUOTA_STATE_DIR = os.environ.get(
+    'QUOTA_STATE_DIR', os.path.join(tempfile.gettempdir(), f'weather_back-end-{os.getuid() if hasattr(os, "getuid") else 0}')
+)
+QUOTA_REDIS_URL = os.environ.get('QUOTA_REDIS_URL', CACHE_REDIS_URL)
+
+#Limite de requisições por cliente (IP) nas rotas da aplicação ('0' desativa). Atrás de um proxy reverso
+#configure RATE_LIMIT_TRUSTED_PROXIES, senão todos os clientes dividem o balde do IP do proxy
+RATE_LIMIT_PER_MINUTE = float(os.environ.get('RATE_LIMIT_PER_MINUTE', 0))
+RATE_LIMIT_BURST = float(os.environ.get('RATE_LIMIT_BURST', 60))
+#Quantidade de proxies reversos na frente da aplicação, o IP do cliente é lido do X-Forwarded-For ('0' usa o IP da conexão)
+RATE_LIMIT_TRUSTED_PROXIES = int(os.environ.get('RATE_LIMIT_TRUSTED_PROXIES', 0))
+#Rotas sem limite (monitoramento)
+RATE_LIMIT_EXEMPT = tuple(os.environ.get(
+    'RATE_LIMIT_EXEMPT', '/metrics,/traces,/poolStats,/cacheStats,/writerStats,/upstreamStats,/refreshStats,/quotaStats,/archiveStats'
+).split(','))
+#Posições do arquivo de estado dos clientes (file) ou clientes guardados em memória (memory)
+RATE_LIMIT_SLOTS = int(os.environ.get('RATE_LIMIT_SLOTS', 65536))
+
+
+def take_tokens(states, buckets, cost, keep, now):
+    """
+    Retira cost fichas de todos os baldes de uma vez, somente se todos tiverem fichas suficientes.
+
+    Parâmetros:
+    states (list): (fichas, atualizado_em) de cada balde, ou None se o balde ainda não existe (cheio).
+    buckets (list): Tuplas (chave, fichas por segundo, capacidade).
+    cost (float): Fichas retiradas, 0 somente consulta.
+    keep (float): Fração da capacidade que deve sobrar em cada balde depois da retirada.
+    now (float): Instante atual em segundos (time.time()).
+
+    Retorna:
+    tuple: (permitido, fichas de cada balde após a retirada, segundos até haver fichas suficientes)
+    """
+    tokens = []
+    wait = 0.0
+    for state, (key, rate, capacity) in zip(states, buckets):
+        value = capacity if state is None else min(capacity, state[0] + max(0.0, now - state[1]) * rate)
+        needed = cost + keep * capacity
+        if value < needed:
+            wait = max(wait, (needed - value) / rate)
+        tokens.append(value)
+    if wait == 0:
+        tokens = [value - cost for value in tokens]
+    return wait == 0, tokens, wait
+
+
+class MemoryBuckets:
+    """
+    Baldes de fichas em memória do processo, cada worker do servidor com os seus.
+    Guarda no máximo max_keys baldes, ao exceder o menos usado é removido (volta cheio).
+    """
+    name = 'memory'
+
+    def __init__(self, max_keys=RATE_LIMIT_SLOTS):
+        self.max_keys = max_keys
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def take(self, buckets, cost=1, keep=0.0):
+        now = time.time()
+        with self._lock:
+            allowed, tokens, wait = take_tokens([self._data.get(key) for key, _, _ in buckets], buckets, cost, keep, now)
+            for (key, _, _), value in zip(buckets, tokens):
+                self._data[key] = (value, now)
+                self._data.move_to_end(key)
+            while len(self._data) > self.max_keys:
+                self._data.popitem(last=False)
+        return allowed, tokens, wait
+
+
+class FileBuckets:
+    """
+    Baldes de fichas em um arquivo mapeado em memória (mmap), compartilhado por todos os processos da máquina
+    (ex: workers do gunicorn), com trava do arquivo (flock) durante a leitura e a gravação.
+
+    O arquivo tem slots posições de 16 bytes (fichas, atualizado_em), a posição de cada chave é crc32(chave) % slots.
+    Chaves na mesma posição dividem o balde, com slots bem maior que a quantidade de clientes isso é raro.
+    Se o arquivo não puder ser aberto (ex: criado por outro usuário) os baldes passam a ficar em memória do
+    processo (MemoryBuckets), com o erro em error.
+
+    Observação:
+    Requer fcntl (Linux/macOS), em outros sistemas build_buckets usa MemoryBuckets.
+    """
+    name = 'file'
+    slot = struct.Struct('dd')
+
+    def __init__(self, path, slots=RATE_LIMIT_SLOTS):
+        self.path = path
+        self.slots = slots
+        self.error = None
+        self._lock = threading.Lock()
+        self._pid = None
+        self._fd = None
+        self._map = None
+        self._fallback = None
+
+    def _open(self):
+        """Abre o arquivo no processo atual, reabrindo após um fork (a trava flock é por arquivo aberto)."""
+        if self._pid == os.getpid():
+            return
+        size = self.slots * self.slot.size
+        os.makedirs(os.path.dirname(self.path), mode=0o700, exist_ok=True)
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o600)
+        if os.fstat(fd).st_size < size:
+            os.ftruncate(fd, size)
+        self._map = mmap.mmap(fd, size)
+        self._fd = fd
+        self._pid = os.getpid()
+
+    def take(self, buckets, cost=1, keep=0.0):
+        with self._lock:
+            if self._fallback is None:
+                try:
+                    self._open()
+                except OSError as e:
+                    self.error = f'{type(e).__name__}: {e}'
+                    self.name = 'memory'
+                    self._fallback = MemoryBuckets(self.slots)
+        if self._fallback is not None:
+            return self._fallback.take(buckets, cost, keep)
+        with self._lock:
+            offsets = [zlib.crc32(key.encode()) % self.slots * self.slot.size for key, _, _ in buckets]
+            fcntl.flock(self._fd, fcntl.LOCK_EX)
+            try:
+                now = time.time()
+                states = [self.slot.unpack_from(self._map, offset) for offset in offsets]
+                allowed, tokens, wait = take_tokens([state if state[1] else None for state in states], buckets, cost, keep, now)
+                for offset, value in zip(offsets, tokens):
+                    self.slot.pack_into(self._map, offset, value, now)
+            finally:
+                fcntl.flock(self._fd, fcntl.LOCK_UN)
+        return allowed, tokens, wait
+
+
+class RedisBuckets:
+    """
+    Baldes de fichas em um servidor compatível com Redis, compartilhados entre máquinas.
+    A retirada é feita por um script Lua (atômico) com o relógio do servidor Redis.
+
+    Observação:
+    Requer a biblioteca redis (python -m pip install redis).
+    """
+    name = 'redis'
+    script = """
+    local now = redis.call('TIME')
+    now = tonumber(now[1]) + tonumber(now[2]) / 1000000
+    local cost = tonumber(ARGV[1])
+    local keep = tonumber(ARGV[2])
+    local tokens = {}
+    local wait = 0
+    for i, key in ipairs(KEYS) do
+        local rate = tonumber(ARGV[1 + 2 * i])
+        local capacity = tonumber(ARGV[2 + 2 * i])
+        local state = redis.call('HMGET', key, 't', 'u')
+        local value = capacity
+        if state[1] then
+            value = math.min(capacity, tonumber(state[1]) + math.max(0, now - tonumber(state[2])) * rate)
+        end
+        local needed = cost + keep * capacity
+        if value < needed then
+            wait = math.max(wait, (needed - value) / rate)
+        end
+        tokens[i] = value
+    end
+    for i, key in ipairs(KEYS) do
+        local rate = tonumber(ARGV[1 + 2 * i])
+        local capacity = tonumber(ARGV[2 + 2 * i])
+        if wait == 0 then
+            tokens[i] = tokens[i] - cost
+        end
+        redis.call('HSET', key, 't', tokens[i], 'u', now)
+        redis.call('EXPIRE', key, math.ceil(capacity / rate) + 1)
+        tokens[i] = tostring(tokens[i])
+    end
+    return {tostring(wait), unpack(tokens)}
+    """
+
+    def __init__(self, url=QUOTA_REDIS_URL, prefix='weather_quota:'):
+        import redis
+
+        self.client = redis.Redis.from_url(url)
+        self.prefix = prefix
+        self._script = self.client.register_script(self.script)
+
+    def take(self, buckets, cost=1, keep=0.0):
+        args = [cost, keep]
+        for key, rate, capacity in buckets:
+            args += [rate, capacity]
+        result = self._script(keys=[self.prefix + key for key, _, _ in buckets], args=args)
+        wait = float(result[0])
+        return wait == 0, [float(value) for value in result[1:]], wait
+
+
+def build_buckets(filename, slots, name=QUOTA_BACKEND):
+    """
+    Cria o armazenamento dos baldes conforme QUOTA_BACKEND.
+
+    Parâmetros:
+    filename (str): Nome do arquivo em QUOTA_STATE_DIR (backend 'file').
+    slots (int): Posições do arquivo, ou chaves guardadas em memória.
+    """
+    if name == 'redis':
+        return RedisBuckets()
+    if name == 'file' and fcntl is not None:
+        return FileBuckets(os.path.join(QUOTA_STATE_DIR, filename), slots)
+    return MemoryBuckets(slots)
+
+
+class QuotaGovernor:
+    """
+    Controla as chamadas a API OpenWeather dentro da cota da chave, com baldes de fichas (por minuto e por dia)
+    compartilhados por todos os processos (build_buckets).
+
+    Cada chamada a API retira uma ficha. Sem fichas a requisição espera até QUOTA_WAIT segundos pela próxima,
+    se a espera for maior desiste na hora (acquire retorna False) e a api.py responde com o valor expirado do cache.
+    A renovação em segundo plano não espera e só usa as fichas acima da reserva (QUOTA_RESERVE).
+
+    Atributos:
+        acquired (int): Chamadas liberadas.
+        queued (int): Chamadas que esperaram por uma ficha.
+        rejected (int): Chamadas recusadas por falta de fichas (requisições).
+        skipped (int): Renovações em segundo plano recusadas para preservar a reserva.
+    """
+    def __init__(self, calls_per_minute=QUOTA_CALLS_PER_MINUTE, burst=QUOTA_BURST, calls_per_day=QUOTA_CALLS_PER_DAY,
+                 wait=QUOTA_WAIT, reserve=QUOTA_RESERVE, store=None):
+        self.buckets = []
+        if calls_per_minute > 0:
+            self.buckets.append(('quota:minute', calls_per_minute / 60.0, max(1.0, burst)))
+        if calls_per_day > 0:
+            self.buckets.append(('quota:day', calls_per_day / 86400.0, max(1.0, calls_per_day / 24)))
+        self.calls_per_minute = calls_per_minute
+        self.calls_per_day = calls_per_day
+        self.wait = wait
+        self.reserve = reserve
+        self.store = store if store is not None else build_buckets('weather_quota.bin', 64)
+        self.acquired = 0
+        self.queued = 0
+        self.rejected = 0
+        self.skipped = 0
+        self._lock = threading.Lock()
+
+    def _count(self, name):
+        with self._lock:
+            setattr(self, name, getattr(self, name) + 1)
+
+    def try_acquire(self, background=False):
+        """
+        Tenta retirar uma ficha sem esperar.
+
+        Retorna:
+        tuple: (liberada, segundos até a próxima ficha)
+        """
+        if not self.buckets:
+            return True, 0.0
+        allowed, _, wait = self.store.take(self.buckets, 1, self.reserve if background else 0.0)
+        return allowed, wait
+
+    def acquire(self, background=False):
+        """
+        Retira uma ficha para uma chamada a API, esperando até self.wait segundos (requisições).
+
+        Parâmetros:
+        background (bool, opcional): True para a renovação em segundo plano, sem espera e respeitando a reserva.
+
+        Retorna:
+        bool: True se a chamada pode ser feita.
+        """
+        deadline = time.monotonic() + self.wait
+        queued = False
+        while True:
+            allowed, wait = self.try_acquire(background)
+            if allowed:
+                self._count('acquired')
+                return True
+            if background:
+                self._count('skipped')
+                return False
+            if wait > deadline - time.monotonic():
+                self._count('rejected')
+                return False
+            if not queued:
+                queued = True
+                self._count('queued')
+            time.sleep(wait)
+
+    async def acquire_async(self, background=False):
+        """Versão assíncrona de acquire, espera a ficha sem bloquear o loop."""
+        deadline = time.monotonic() + self.wait
+        queued = False
+        while True:
+            allowed, wait = self.try_acquire(background)
+            if allowed:
+                self._count('acquired')
+                return True
+            if background:
+                self._count('skipped')
+                return False
+            if wait > deadline - time.monotonic():
+                self._count('rejected')
+                return False
+            if not queued:
+                queued = True
+                self._count('queued')
+            await asyncio.sleep(wait)
+
+    def stats(self):
+        """
+        Retorna as métricas da cota: fichas restantes de cada balde (compartilhadas entre processos)
+        e as chamadas liberadas, que esperaram e recusadas deste processo.
+        """
+        tokens = dict(zip((key for key, _, _ in self.buckets), self.store.take(self.buckets, 0)[1])) if self.buckets else {}
+        return {
+            "enabled": bool(self.buckets),
+            "backend": self.store.name,
+            "state_fallback": int(getattr(self.store, 'error', None) is not None),
+            "calls_per_minute": self.calls_per_minute,
+            "calls_per_day": self.calls_per_day,
+            "tokens_minute": round(tokens.get('quota:minute', 0.0), 3),
+            "tokens_day": round(tokens.get('quota:day', 0.0), 3),
+            "acquired": self.acquired,
+            "queued": self.queued,
+            "rejected": self.rejected,
+            "skipped": self.skipped,
+        }
+
+
+class RateLimiter:
+    """
+    Limite de requisições por cliente (IP) nas rotas da aplicação, com um balde de fichas por cliente
+    compartilhado pelos processos (build_buckets). Ao exceder o limite a requisição recebe 429 com Retry-After.
+
+    Atributos:
+        allowed (int): Requisições liberadas.
+        rejected (int): Requisições recusadas com 429.
+    """
+    def __init__(self, per_minute=RATE_LIMIT_PER_MINUTE, burst=RATE_LIMIT_BURST, trusted_proxies=RATE_LIMIT_TRUSTED_PROXIES,
+                 exempt=RATE_LIMIT_EXEMPT, store=None):
+        self.per_minute = per_minute
+        self.rate = per_minute / 60.0
+        self.capacity = max(1.0, burst)
+        self.trusted_proxies = trusted_proxies
+        self.exempt = exempt
+        self.store = store if store is not None else build_buckets('weather_ratelimit.bin', RATE_LIMIT_SLOTS)
+        self.allowed = 0
+        self.rejected = 0
+        self._lock = threading.Lock()
+
+    def client_key(self, headers, remote_addr):
+        """
+        Identifica o cliente pelo IP. Atrás de proxies (RATE_LIMIT_TRUSTED_PROXIES) usa o IP adicionado ao
+        X-Forwarded-For pelo proxy mais externo, os valores à esquerda dele são informados pelo cliente e ignorados.
+        """
+        if self.trusted_proxies:
+            forwarded = [value.strip() for value in headers.get('X-Forwarded-For', '').split(',') if value.strip()]
+            if len(forwarded) >= self.trusted_proxies:
+                return forwarded[-self.trusted_proxies]
+        return remote_addr or 'unknown'
+
+    def check(self, request):
+        """
+        before_request do Flask/Quart: confere o limite do cliente da requisição.
+
+        Retorna:
+        None se a requisição pode seguir, ou a resposta 429 (corpo, status, cabeçalhos).
+
+        Exemplo de Uso:
+        - app.before_request(lambda: rate_limiter.check(request))
+        """
+        if self.per_minute <= 0 or request.path in self.exempt:
+            return None
+        key = 'client:' + self.client_key(request.headers, request.remote_addr)
+        allowed, _, wait = self.store.take([(key, self.rate, self.capacity)])
+        with self._lock:
+            if allowed:
+                self.allowed += 1
+            else:
+                self.rejected += 1
+        if allowed:
+            return None
+        return (
+            {'error': 'Muitas requisições, tente novamente em instantes'},
+            429,
+            {'Retry-After': str(math.ceil(wait)), 'X-RateLimit-Limit': f'{self.per_minute:g}'},
+        )
+
+    def stats(self):
+        return {
+            "enabled": self.per_minute > 0,
+            "backend": self.store.name,
+            "state_fallback": int(getattr(self.store, 'error', None) is not None),
+            "per_minute": self.per_minute,
+            "burst": self.capacity,
+            "allowed": self.allowed,
+            "rejected": self.rejected,
+        }
+
+
+#Cota da API e limite por cliente únicos do processo, o estado dos baldes é compartilhado conforme QUOTA_BACKEND
+upstream_quota = QuotaGovernor()
+rate_limiter = RateLimiter()
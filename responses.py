@@ -0,0 +1,264 @@
+import gzip
+import hashlib
+import os
+import zlib
+from flask.json.provider import DefaultJSONProvider
+from metrics import stage
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+#Codificador JSON das respostas: 'auto' (orjson se instalado), 'orjson' ou 'json' (biblioteca padrão)
+JSON_PROVIDER = os.environ.get('JSON_PROVIDER', 'auto')
+#Compressão das respostas (gzip ou brotli, conforme o Accept-Encoding do cliente)
+COMPRESS_ENABLED = os.environ.get('COMPRESS_ENABLED', '1') != '0'
+#Tamanho mínimo (bytes) da resposta para comprimir, respostas menores vão sem compressão
+COMPRESS_MIN_SIZE = int(os.environ.get('COMPRESS_MIN_SIZE', 1024))
+COMPRESS_GZIP_LEVEL = int(os.environ.get('COMPRESS_GZIP_LEVEL', 6))
+COMPRESS_BROTLI_QUALITY = int(os.environ.get('COMPRESS_BROTLI_QUALITY', 4))
+
+#Tipos de conteúdo que valem a pena comprimir
+COMPRESS_MIMETYPES = ('application/json', 'text/html', 'text/plain', 'text/csv', 'application/x-ndjson')
+
+
+class FastJSONProvider(DefaultJSONProvider):
+    """
+    Provedor JSON do Flask/Quart que usa o orjson quando instalado, e o json da biblioteca padrão caso contrário.
+    Datas, Decimal e UUID continuam convertidos pelo DefaultJSONProvider.default, então a resposta é a mesma do jsonify.
+
+    Exemplo de Uso:
+    - app.json = FastJSONProvider(app)
+    """
+
+    #Opções do orjson equivalentes ao jsonify: chaves ordenadas e datas/dataclasses convertidas pelo default
+    options = 0
+
+    def __init__(self, app):
+        super().__init__(app)
+        self.fast = orjson is not None and JSON_PROVIDER in ('auto', 'orjson')
+        if self.fast:
+            self.options = orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_PASSTHROUGH_DATACLASS
+            if self.sort_keys:
+                self.options |= orjson.OPT_SORT_KEYS
+
+    def dumps_bytes(self, obj):
+        """Serializa obj em bytes UTF-8 com o orjson, retorna None se o orjson não puder serializar o valor."""
+        try:
+            return orjson.dumps(obj, default=self.default, option=self.options)
+        except (orjson.JSONEncodeError, TypeError):
+            return None
+
+    def dumps(self, obj, **kwargs):
+        if self.fast and not kwargs:
+            data = self.dumps_bytes(obj)
+            if data is not None:
+                return data.decode()
+        return super().dumps(obj, **kwargs)
+
+    def dumps_compact(self, obj):
+        """
+        Serializa obj exatamente como no corpo do jsonify (sem espaços, chaves ordenadas, mesmo codificador),
+        usado nas respostas em streaming montadas por partes (ex: function.iter_historic_json).
+        """
+        if self.fast:
+            data = self.dumps_bytes(obj)
+            if data is not None:
+                return data.decode()
+        return super().dumps(obj, separators=(',', ':'))
+
+    def response(self, *args, **kwargs):
+        with stage('serialize'):
+            #Em modo debug o jsonify formata com indentação, mantém o comportamento padrão
+            if not self.fast or (self.compact is None and self._app.debug):
+                return super().response(*args, **kwargs)
+            data = self.dumps_bytes(self._prepare_response_obj(args, kwargs))
+            if data is None:
+                return super().response(*args, **kwargs)
+            return self._app.response_class(data, mimetype=self.mimetype)
+
+
+def negotiate_encoding(accept_encoding):
+    """
+    Escolhe a compressão aceita pelo cliente, brotli (se instalado) antes de gzip.
+
+    Parâmetros:
+    accept_encoding (str): Cabeçalho Accept-Encoding da requisição, ex: 'gzip, deflate, br'.
+
+    Retorna:
+    str: 'br', 'gzip' ou None se o cliente não aceitar nenhuma.
+    """
+    accepted = {}
+    for part in (accept_encoding or '').split(','):
+        name, _, params = part.strip().partition(';')
+        quality = 1.0
+        if params.strip().startswith('q='):
+            try:
+                quality = float(params.strip()[2:])
+            except ValueError:
+                quality = 0.0
+        accepted[name.strip().lower()] = quality
+    for name in ('br', 'gzip'):
+        if name == 'br' and brotli is None:
+            continue
+        if accepted.get(name, accepted.get('*', 0)) > 0:
+            return name
+    return None
+
+
+def compress(body, encoding):
+    """Comprime o corpo da resposta com 'br' ou 'gzip'."""
+    if encoding == 'br':
+        return brotli.compress(body, quality=COMPRESS_BROTLI_QUALITY)
+    return gzip.compress(body, compresslevel=COMPRESS_GZIP_LEVEL, mtime=0)
+
+
+def compressor(encoding):
+    """
+    Retorna as funções (comprimir_parte, finalizar) de um compressor incremental, para respostas em streaming.
+    Cada parte é enviada comprimida logo que gerada (flush), sem esperar o fim da resposta.
+    """
+    if encoding == 'br':
+        stream = brotli.Compressor(quality=COMPRESS_BROTLI_QUALITY)
+        return (lambda chunk: stream.process(chunk) + stream.flush()), stream.finish
+    stream = zlib.compressobj(COMPRESS_GZIP_LEVEL, zlib.DEFLATED, 31)
+    return (lambda chunk: stream.compress(chunk) + stream.flush(zlib.Z_SYNC_FLUSH)), stream.flush
+
+
+def compress_chunks(chunks, encoding):
+    """
+    Comprime uma resposta em streaming parte por parte.
+
+    Parâmetros:
+    chunks (iterable): Partes da resposta (str ou bytes).
+    encoding (str): 'br' ou 'gzip'.
+
+    Retorna:
+    generator: Partes comprimidas (bytes).
+    """
+    process, finish = compressor(encoding)
+    try:
+        for chunk in chunks:
+            data = process(chunk.encode() if isinstance(chunk, str) else chunk)
+            if data:
+                yield data
+        yield finish()
+    finally:
+        #fecha o gerador original (ex: stream_with_context e o cursor do banco) junto com a resposta
+        if hasattr(chunks, 'close'):
+            chunks.close()
+
+
+async def compress_chunks_async(chunks, encoding):
+    """Versão assíncrona de compress_chunks, para respostas em streaming do Quart."""
+    process, finish = compressor(encoding)
+    async for chunk in chunks:
+        data = process(chunk.encode() if isinstance(chunk, str) else chunk)
+        if data:
+            yield data
+    yield finish()
+
+
+def etag_for(body):
+    """Calcula o ETag (entre aspas) do corpo da resposta sem compressão."""
+    return '"' + hashlib.blake2b(body, digest_size=16).hexdigest() + '"'
+
+
+def etag_matches(if_none_match, etag):
+    """
+    Confere se o If-None-Match da requisição contém o ETag da resposta.
+    Aceita ETags fracos (W/) e as variantes comprimidas ('"...-gzip"', '"...-br"').
+    """
+    if not if_none_match:
+        return False
+    for tag in if_none_match.split(','):
+        tag = tag.strip()
+        if tag == '*':
+            return True
+        if tag.startswith('W/'):
+            tag = tag[2:]
+        for suffix in ('-gzip"', '-br"'):
+            if tag.endswith(suffix):
+                tag = tag[:-len(suffix)] + '"'
+        if tag == etag:
+            return True
+    return False
+
+
+def is_compressible(status_code, mimetype, headers):
+    """Confere se a resposta pode receber ETag e compressão: status 200, tipo de texto e ainda sem Content-Encoding."""
+    return status_code == 200 and mimetype in COMPRESS_MIMETYPES and 'Content-Encoding' not in headers
+
+
+def finalize_body(body, request_headers, conditional=True):
+    """
+    Aplica ETag/If-None-Match e compressão a uma resposta completa.
+
+    Parâmetros:
+    body (bytes): Corpo da resposta sem compressão.
+    request_headers (Headers): Cabeçalhos da requisição.
+    conditional (bool, opcional): Usa ETag/If-None-Match, somente em GET e HEAD.
+
+    Retorna:
+    tuple: (status, corpo, cabeçalhos), status é 304 com corpo vazio se o cliente já tem essa versão, ou None.
+    """
+    encoding = None
+    if COMPRESS_ENABLED and len(body) >= COMPRESS_MIN_SIZE:
+        encoding = negotiate_encoding(request_headers.get('Accept-Encoding'))
+
+    headers = {}
+    if conditional:
+        etag = etag_for(body)
+        headers['ETag'] = etag if encoding is None else etag[:-1] + '-' + encoding + '"'
+        if etag_matches(request_headers.get('If-None-Match'), etag):
+            return 304, b'', headers
+    if encoding is not None:
+        body = compress(body, encoding)
+        headers['Content-Encoding'] = encoding
+    return None, body, headers
+
+
+def add_vary(response):
+    """Acrescenta Accept-Encoding ao cabeçalho Vary da resposta."""
+    vary = response.headers.get('Vary')
+    if not vary:
+        response.headers['Vary'] = 'Accept-Encoding'
+    elif 'accept-encoding' not in vary.lower():
+        response.headers['Vary'] = vary + ', Accept-Encoding'
+
+
+def finalize_response(response, request):
+    """
+    after_request do Flask: ETag/304 e compressão das respostas JSON, e compressão em partes das respostas em streaming.
+
+    Exemplo de Uso:
+    - app.after_request(lambda response: finalize_response(response, request))
+    """
+    if not is_compressible(response.status_code, response.mimetype, response.headers):
+        return response
+    add_vary(response)
+
+    if response.is_streamed:
+        encoding = negotiate_encoding(request.headers.get('Accept-Encoding')) if COMPRESS_ENABLED else None
+        if encoding is not None:
+            response.response = compress_chunks(response.response, encoding)
+            response.headers['Content-Encoding'] = encoding
+            response.headers.pop('Content-Length', None)
+        return response
+
+    with stage('compress'):
+        status, body, headers = finalize_body(response.get_data(), request.headers, request.method in ('GET', 'HEAD'))
+    response.set_data(body)
+    response.headers.update(headers)
+    if status is not None:
+        response.status_code = status
+        response.headers.pop('Content-Type', None)
+        response.headers.pop('Content-Length', None)
+    return response
@@ -0,0 +1,235 @@
+import heapq
+import logging
+import math
+import os
+import threading
+import time
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from cache import weather_cache, CACHE_TTL
+from quota import MemoryBuckets
+
+
+#Configuração da renovação do cache em segundo plano (cidades mais consultadas), pode ser ajustada por variáveis de ambiente
+REFRESH_ENABLED = os.environ.get('REFRESH_ENABLED', '0') == '1'
+#Quantidade de chaves (cidade + end-point) mais consultadas mantidas renovadas
+REFRESH_TOP_N = int(os.environ.get('REFRESH_TOP_N', 200))
+#Máximo de chamadas por minuto a API feitas pela renovação, somando todos os processos que dividem o armazenamento da cota
+REFRESH_CALLS_PER_MINUTE = float(os.environ.get('REFRESH_CALLS_PER_MINUTE', 30))
+#Fração do TTL restante em que a chave passa a ser renovada (0.2 = nos últimos 20% do TTL)
+REFRESH_AHEAD = float(os.environ.get('REFRESH_AHEAD', 0.2))
+#Meia-vida em segundos da contagem de consultas, cidades que deixam de ser consultadas esfriam
+REFRESH_HALF_LIFE = float(os.environ.get('REFRESH_HALF_LIFE', 1800))
+#Contagem mínima (com a meia-vida) para uma chave ser renovada
+REFRESH_MIN_SCORE = float(os.environ.get('REFRESH_MIN_SCORE', 2))
+REFRESH_INTERVAL = float(os.environ.get('REFRESH_INTERVAL', 1.0))
+REFRESH_CONCURRENCY = int(os.environ.get('REFRESH_CONCURRENCY', 4))
+#Máximo de chaves acompanhadas em memória, ao exceder as menos consultadas são descartadas
+REFRESH_MAX_TRACKED = int(os.environ.get('REFRESH_MAX_TRACKED', 10000))
+
+logger = logging.getLogger(__name__)
+
+
+class RefreshScheduler:
+    """
+    Renova em segundo plano as chaves do cache mais consultadas antes de expirarem, para que as requisições
+    dessas cidades sejam respondidas pelo cache sem esperar a API.
+
+    Cada consulta (record) soma 1 na contagem da chave, que decai pela metade a cada half_life segundos.
+    A cada interval segundos a thread escolhe as top_n chaves com contagem >= min_score cujo TTL restante
+    está abaixo de ahead * TTL (com uma variação fixa por chave, para não renovar todas ao mesmo tempo),
+    e renova as mais urgentes dentro do limite de calls_per_minute chamadas (balde de fichas).
+    Os valores são gravados no mesmo cache das requisições (cache.weather_cache.refresh).
+
+    O balde do limite fica em store, o mesmo armazenamento da cota da API (api.py usa o quota.upstream_quota.store),
+    assim com QUOTA_BACKEND=file ou redis o limite vale para todos os processos e não por worker. Cada renovação
+    ainda retira uma ficha da cota da API (fetch com background=True, respeitando a QUOTA_RESERVE).
+
+    Atributos:
+        recorded (int): Consultas registradas.
+        refreshed (int): Chaves renovadas.
+        failed (int): Renovações com erro (API indisponível ou resposta de erro) e ciclos (tick) interrompidos por erro.
+        throttled (int): Renovações adiadas por falta de fichas no limite de chamadas.
+    """
+    def __init__(self, fetch, top_n=REFRESH_TOP_N, calls_per_minute=REFRESH_CALLS_PER_MINUTE, ahead=REFRESH_AHEAD,
+                 half_life=REFRESH_HALF_LIFE, min_score=REFRESH_MIN_SCORE, interval=REFRESH_INTERVAL,
+                 concurrency=REFRESH_CONCURRENCY, max_tracked=REFRESH_MAX_TRACKED, cacheable=lambda value: True,
+                 cache=weather_cache, clock=time.monotonic, store=None):
+        self.fetch = fetch
+        self.cacheable = cacheable
+        self.cache = cache
+        self.clock = clock
+        self.top_n = top_n
+        self.rate = calls_per_minute / 60.0
+        #no máximo 10 segundos de chamadas de uma vez, espalha as renovações ao longo do minuto
+        self.capacity = max(1.0, self.rate * 10)
+        self.ahead = ahead
+        self.decay = math.log(2) / half_life
+        self.min_score = min_score
+        self.interval = interval
+        self.concurrency = concurrency
+        self.max_tracked = max_tracked
+        self.store = store if store is not None else MemoryBuckets(4)
+        self.buckets = [('refresh:minute', self.rate, self.capacity)]
+        self.recorded = 0
+        self.refreshed = 0
+        self.failed = 0
+        self.throttled = 0
+        self._scores = {}
+        self._pending = set()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self._executor = None
+
+    def start(self):
+        """Inicia a thread de renovação, caso ainda não esteja rodando neste processo."""
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._stop.clear()
+                self._executor = ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix='cache-refresh')
+                self._thread = threading.Thread(target=self._run, name='refresh-scheduler', daemon=True)
+                self._thread.start()
+
+    def stop(self, timeout=10):
+        """Para a thread de renovação e aguarda as renovações em andamento."""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+
+    def score(self, item, now):
+        """Contagem da chave no instante now, com o decaimento desde a última consulta."""
+        return item[0] * math.exp(-self.decay * (now - item[1]))
+
+    def record(self, key, endpoint, city_name=None, city_id=None):
+        """
+        Registra uma consulta de uma chave do cache.
+
+        Parâmetros:
+        key (str): Chave do cache (cache.cache_key).
+        endpoint (str): 'weather' ou 'forecast'.
+        city_name (str, opcional): Nome da cidade consultada.
+        city_id (int, opcional): ID da cidade na OpenWeather.
+        """
+        now = self.clock()
+        with self._lock:
+            item = self._scores.get(key)
+            if item is None:
+                self._scores[key] = [1.0, now, endpoint, city_name, city_id]
+                if len(self._scores) > self.max_tracked:
+                    self._prune(now)
+            else:
+                item[0] = self.score(item, now) + 1
+                item[1] = now
+            self.recorded += 1
+
+    def _prune(self, now):
+        """Descarta a metade menos consultada das chaves acompanhadas."""
+        keep = heapq.nlargest(self.max_tracked // 2, self._scores.items(), key=lambda entry: self.score(entry[1], now))
+        self._scores = dict(keep)
+
+    def hot_keys(self, now=None):
+        """
+        Retorna as top_n chaves mais consultadas com contagem >= min_score.
+
+        Retorna:
+        list: Tuplas (chave, contagem, endpoint, city_name, city_id), da mais consultada para a menos.
+        """
+        now = self.clock() if now is None else now
+        with self._lock:
+            items = [(key, self.score(item, now), *item[2:]) for key, item in self._scores.items()]
+        return heapq.nlargest(self.top_n, (item for item in items if item[1] >= self.min_score), key=lambda item: item[1])
+
+    def due(self, now=None):
+        """
+        Retorna as chaves quentes que precisam ser renovadas, as mais urgentes (menos TTL restante) primeiro.
+
+        Cada chave é renovada quando o TTL restante fica abaixo de ahead * TTL * (0.5 a 1.0), a fração é fixa por
+        chave (hash do nome), o que espalha no tempo as renovações de chaves gravadas juntas.
+        """
+        due = []
+        with self._lock:
+            pending = set(self._pending)
+        for key, score, endpoint, city_name, city_id in self.hot_keys(now):
+            if key in pending:
+                continue
+            ttl = CACHE_TTL[endpoint]
+            remaining = self.cache.ttl_remaining(key)
+            spread = 0.5 + (zlib.crc32(key.encode()) % 1000) / 2000
+            if remaining is None or remaining < self.ahead * ttl * spread:
+                due.append((remaining if remaining is not None else float('-inf'), -score, key, endpoint, city_name, city_id))
+        due.sort()
+        return [item[2:] for item in due]
+
+    def _take_token(self):
+        """Retira uma ficha do balde de chamadas (store), retorna False se o limite do minuto foi atingido."""
+        if self.rate <= 0:
+            return False
+        allowed, _, _ = self.store.take(self.buckets)
+        return allowed
+
+    def tick(self):
+        """Uma rodada do agendador: envia para renovação as chaves vencendo, dentro do limite de chamadas."""
+        for key, endpoint, city_name, city_id in self.due():
+            #verifica e marca a chave de uma vez, uma chave em renovação não é enviada de novo
+            with self._lock:
+                if key in self._pending:
+                    continue
+                self._pending.add(key)
+            if not self._take_token():
+                with self._lock:
+                    self._pending.discard(key)
+                    self.throttled += 1
+                break
+            self._executor.submit(self.refresh, key, endpoint, city_name, city_id)
+
+    def refresh(self, key, endpoint, city_name, city_id):
+        """Renova uma chave no cache, buscando na API com a função fetch do agendador."""
+        try:
+            renewed = self.cache.refresh(
+                key,
+                CACHE_TTL[endpoint],
+                lambda: self.fetch(city_name, endpoint == 'weather', city_id),
+                cacheable=self.cacheable,
+            )
+        except Exception as e:
+            renewed = False
+        with self._lock:
+            self._pending.discard(key)
+            if renewed:
+                self.refreshed += 1
+            else:
+                self.failed += 1
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.tick()
+            except Exception:
+                #o ciclo seguinte tenta de novo, o erro fica no log e em failed
+                with self._lock:
+                    self.failed += 1
+                logger.exception('falha no ciclo de renovação do cache em segundo plano')
+
+    def stats(self):
+        """
+        Retorna as métricas da renovação em segundo plano.
+
+        Retorna:
+        dict: chaves acompanhadas e quentes, consultas registradas, renovações feitas, com erro e adiadas pelo limite.
+        """
+        hot = len(self.hot_keys())
+        with self._lock:
+            return {
+                "enabled": REFRESH_ENABLED,
+                "tracked": len(self._scores),
+                "hot": hot,
+                "pending": len(self._pending),
+                "recorded": self.recorded,
+                "refreshed": self.refreshed,
+                "failed": self.failed,
+                "throttled": self.throttled,
+                "calls_per_minute": round(self.rate * 60, 3),
+            }
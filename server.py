@@ -0,0 +1,155 @@
+"""
+Servidor de produção com vários processos (gunicorn), configurado por variáveis de ambiente.
+
+Cada worker é um processo com WEB_THREADS threads (Flask, main.py) ou um loop asyncio (WEB_APP=asgi, asgi.py),
+usando todos os núcleos da máquina. Com WEB_PRELOAD=1 a aplicação e o índice de cidades são carregados uma vez
+no processo principal antes do fork, e a memória é compartilhada pelos workers (copy-on-write).
+Depois do fork cada worker cria o seu pool de conexões do banco, a sua sessão HTTP e as suas threads.
+No SIGTERM o gunicorn para de aceitar conexões, termina as requisições em andamento (WEB_GRACEFUL_TIMEOUT)
+e cada worker grava a fila do histórico (WRITE_BEHIND) antes de sair.
+
+Uso:
+    WEB_WORKERS=4 WEB_THREADS=8 WEB_BIND=0.0.0.0:8000 python server.py
+
+Observação:
+Requer o gunicorn (python -m pip install gunicorn), e o uvicorn para WEB_APP=asgi.
+"""
+import gc
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+
+#Configuração do servidor de produção
+WEB_BIND = os.environ.get('WEB_BIND', '127.0.0.1:5000')
+#'flask' (main.py, threads) ou 'asgi' (asgi.py, uvicorn)
+WEB_APP = os.environ.get('WEB_APP', 'flask')
+#Processos, por padrão um por núcleo
+WEB_WORKERS = int(os.environ.get('WEB_WORKERS', os.cpu_count() or 1))
+#Threads por processo (somente WEB_APP=flask), cada uma atende uma requisição por vez
+WEB_THREADS = int(os.environ.get('WEB_THREADS', 8))
+#Carrega a aplicação antes do fork, a memória é compartilhada pelos workers
+WEB_PRELOAD = os.environ.get('WEB_PRELOAD', '1') == '1'
+#Segundos sem resposta até o worker ser reiniciado, e para terminar as requisições em andamento no SIGTERM
+WEB_TIMEOUT = int(os.environ.get('WEB_TIMEOUT', 30))
+WEB_GRACEFUL_TIMEOUT = int(os.environ.get('WEB_GRACEFUL_TIMEOUT', 30))
+WEB_KEEPALIVE = int(os.environ.get('WEB_KEEPALIVE', 5))
+#Requisições até o worker ser reiniciado ('0' nunca), com variação aleatória para não reiniciar todos juntos
+WEB_MAX_REQUESTS = int(os.environ.get('WEB_MAX_REQUESTS', 0))
+WEB_MAX_REQUESTS_JITTER = int(os.environ.get('WEB_MAX_REQUESTS_JITTER', 0))
+
+
+def load_shared_state():
+    """
+    Carrega o índice de cidades com o engine síncrono (crud.py) e descarta o engine, para que nenhuma
+    conexão do banco seja herdada pelos workers.
+    """
+    import crud
+    from cities import load_city_index, historic_cities
+
+    crud.init_engine()
+    load_city_index(entries=historic_cities(crud.list_known_cities()))
+    crud.dispose_engine()
+
+
+def when_ready(server):
+    """
+    Processo principal, antes de criar os workers. Com WEB_PRELOAD=1 carrega o índice de cidades uma vez para todos,
+    e congela os objetos já criados (gc.freeze) para que a coleta de lixo dos workers não os copie.
+    """
+    if WEB_PRELOAD:
+        load_shared_state()
+        gc.freeze()
+    server.log.info('%s workers (%s), %s threads por worker, preload=%s', WEB_WORKERS, WEB_APP, WEB_THREADS, WEB_PRELOAD)
+
+
+def post_fork(server, worker):
+    """
+    Inicialização de cada worker depois do fork: pool de conexões do banco, sessão HTTP e threads das consultas
+    em lote novos, sem compartilhar sockets ou threads com o processo principal. A thread do histórico e a renovação
+    do cache iniciam sozinhas no primeiro uso em cada worker.
+    """
+    import api
+    import crud
+
+    crud.dispose_engine(close=False)
+    api.http_session = api.create_http_session()
+    api.batch_executor = ThreadPoolExecutor(max_workers=api.BATCH_MAX_CONCURRENCY, thread_name_prefix='weather-batch')
+
+
+def post_worker_init(worker):
+    """Sem WEB_PRELOAD a aplicação é carregada em cada worker, o índice de cidades também."""
+    from cities import city_index
+
+    if WEB_APP == 'flask' and not len(city_index):
+        load_shared_state()
+
+
+def worker_exit(server, worker):
+    """
+    Saída do worker (SIGTERM, reinício ou WEB_MAX_REQUESTS), depois de terminar as requisições em andamento:
+    grava a fila do histórico, para a renovação do cache e fecha as conexões do banco.
+    """
+    import api
+    import crud
+    import writer
+
+    writer.historic_writer.stop(timeout=WEB_GRACEFUL_TIMEOUT)
+    api.refresh_scheduler.stop()
+    api.batch_executor.shutdown(wait=False)
+    crud.dispose_engine()
+    stats = writer.historic_writer.stats()
+    server.log.info('worker %s encerrado: %s registros gravados, %s na fila, %s descartados',
+                    worker.pid, stats['written'], stats['queue_depth'], stats['dropped'])
+
+
+def worker_class():
+    if WEB_APP != 'asgi':
+        return 'gthread'
+    try:
+        import uvicorn_worker
+        return 'uvicorn_worker.UvicornWorker'
+    except ImportError:
+        return 'uvicorn.workers.UvicornWorker'
+
+
+def options():
+    """Configuração do gunicorn a partir das variáveis WEB_*."""
+    return {
+        'bind': WEB_BIND,
+        'workers': WEB_WORKERS,
+        'threads': WEB_THREADS,
+        'worker_class': worker_class(),
+        'preload_app': WEB_PRELOAD,
+        'timeout': WEB_TIMEOUT,
+        'graceful_timeout': WEB_GRACEFUL_TIMEOUT,
+        'keepalive': WEB_KEEPALIVE,
+        'max_requests': WEB_MAX_REQUESTS,
+        'max_requests_jitter': WEB_MAX_REQUESTS_JITTER,
+        'when_ready': when_ready,
+        'post_fork': post_fork,
+        'post_worker_init': post_worker_init,
+        'worker_exit': worker_exit,
+    }
+
+
+def run():
+    """Inicia o gunicorn com a aplicação de WEB_APP e a configuração de options()."""
+    from gunicorn.app.base import BaseApplication
+
+    class WeatherServer(BaseApplication):
+        def load_config(self):
+            for key, value in options().items():
+                self.cfg.set(key, value)
+
+        def load(self):
+            if WEB_APP == 'asgi':
+                from asgi import app
+            else:
+                from main import app
+            return app
+
+    WeatherServer().run()
+
+
+if __name__ == '__main__':
+    run()
@@ -0,0 +1,92 @@
+"""
+Configuração dos testes (pytest): a API da OpenWeatherMap é o stub local (benchmarks/stub_upstream.py),
+o banco é um SQLite temporário e a cota, o disjuntor e o cache são recriados a cada teste.
+
+Uso:
+    python -m pip install pytest
+    python -m pytest -q
+"""
+import os
+import sys
+import tempfile
+from types import SimpleNamespace
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, 'benchmarks'))
+
+from stub_upstream import start_stub, disable_limits
+
+#Ambiente lido na importação dos módulos da aplicação, definido antes de qualquer import do api.py ou main.py
+STATE_DIR = tempfile.mkdtemp(prefix='weather-tests-')
+disable_limits()
+os.environ.update({
+    'QUOTA_BACKEND': 'memory',
+    'HTTP_BACKOFF': '0',
+    'HTTP_BACKOFF_JITTER': '0',
+    'REFRESH_ENABLED': '0',
+    'WRITE_BEHIND': '0',
+    'CACHE_BACKEND': 'memory',
+    'HISTORIC_ARCHIVE_DIR': os.path.join(STATE_DIR, 'archive'),
+    'DATABASE_URL': 'sqlite:///' + os.path.join(STATE_DIR, 'weather.db'),
+})
+
+import pytest
+
+import api
+import crud
+from api import CircuitBreaker
+from cache import WeatherCache, MemoryBackend
+from cities import CityIndex
+from quota import QuotaGovernor, MemoryBuckets
+
+
+@pytest.fixture(scope='session')
+def stub_server():
+    server = start_stub()
+    yield server
+    server.shutdown()
+
+
+@pytest.fixture
+def stub(stub_server, monkeypatch):
+    """Stub respondendo com sucesso, sem latência e com os contadores zerados, usado pelo api.py do teste."""
+    stub_server.latency = 0.0
+    stub_server.error_rate = 0.0
+    stub_server.error_status = 503
+    stub_server.error_body = None
+    stub_server.calls = 0
+    stub_server.calls_by_path = {}
+    monkeypatch.setattr(api, 'API_BASE_URL', stub_server.base_url)
+    return stub_server
+
+
+@pytest.fixture
+def upstream(stub, monkeypatch):
+    """
+    Estado do api.py recriado para o teste: cache em memória, índice de cidades vazio, disjuntor (3 falhas, 0,2 s aberto)
+    e cota desligada.
+
+    Retorna:
+    SimpleNamespace: stub, cache, breaker e quota usados pelo api.py.
+    """
+    state = SimpleNamespace(
+        stub=stub,
+        cache=WeatherCache(MemoryBackend()),
+        breaker=CircuitBreaker(failure_threshold=3, reset_timeout=0.2),
+        quota=QuotaGovernor(calls_per_minute=0, calls_per_day=0, store=MemoryBuckets(16)),
+    )
+    monkeypatch.setattr(api, 'weather_cache', state.cache)
+    monkeypatch.setattr(api, 'city_index', CityIndex())
+    monkeypatch.setattr(api, 'circuit_breaker', state.breaker)
+    monkeypatch.setattr(api, 'upstream_quota', state.quota)
+    return state
+
+
+@pytest.fixture
+def database(tmp_path):
+    """Banco SQLite vazio com as tabelas da aplicação, usado pelo crud.py durante o teste."""
+    engine = crud.init_engine('sqlite:///' + str(tmp_path / 'weather.db'))
+    crud.Base.metadata.create_all(engine)
+    yield engine
+    crud.dispose_engine()
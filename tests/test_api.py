@@ -0,0 +1,118 @@
+import time
+
+import pytest
+
+import api
+from api import UpstreamUnavailable
+from quota import QuotaGovernor, MemoryBuckets
+
+
+def counting_quota():
+    """Cota com fichas de sobra, para contar as fichas retiradas por chamada."""
+    return QuotaGovernor(calls_per_minute=6000, burst=100, calls_per_day=0, wait=0, store=MemoryBuckets(16))
+
+
+def test_5xx_is_retried_with_one_quota_token_per_attempt(upstream, monkeypatch):
+    quota = counting_quota()
+    monkeypatch.setattr(api, 'upstream_quota', quota)
+    upstream.stub.error_rate = 1.0
+
+    with pytest.raises(UpstreamUnavailable, match='status 503'):
+        api.fetch_weather_data('Osorio')
+
+    assert upstream.stub.calls == api.HTTP_RETRIES + 1
+    assert quota.acquired == api.HTTP_RETRIES + 1
+    assert upstream.breaker.failures == 1
+
+
+def test_429_is_not_retried(upstream):
+    upstream.stub.error_rate = 1.0
+    upstream.stub.error_status = 429
+
+    with pytest.raises(UpstreamUnavailable, match='status 429'):
+        api.fetch_weather_data('Osorio')
+
+    assert upstream.stub.calls == 1
+    assert upstream.breaker.failures == 1
+
+
+def test_non_json_body_counts_as_failure(upstream):
+    upstream.stub.error_rate = 1.0
+    upstream.stub.error_status = 200
+    upstream.stub.error_body = '<html>Bad gateway</html>'
+
+    with pytest.raises(UpstreamUnavailable):
+        api.fetch_weather_data('Osorio')
+
+    assert upstream.stub.calls == 1
+    assert upstream.breaker.failures == 1
+
+
+def test_success_resets_breaker_failures(upstream):
+    upstream.stub.error_rate = 1.0
+    with pytest.raises(UpstreamUnavailable):
+        api.fetch_weather_data('Osorio')
+    upstream.stub.error_rate = 0.0
+
+    assert api.fetch_weather_data('Osorio')['name'] == 'Osorio'
+    assert upstream.breaker.failures == 0
+
+
+def test_breaker_opens_and_half_opens(upstream):
+    upstream.stub.error_rate = 1.0
+    for _ in range(upstream.breaker.failure_threshold):
+        with pytest.raises(UpstreamUnavailable):
+            api.fetch_weather_data('Osorio')
+    assert upstream.breaker.state == 'open'
+
+    #aberto: recusa sem chamar a API
+    calls = upstream.stub.calls
+    with pytest.raises(UpstreamUnavailable, match='circuito aberto'):
+        api.fetch_weather_data('Osorio')
+    assert upstream.stub.calls == calls
+    assert upstream.breaker.rejected == 1
+
+    #depois do reset_timeout libera uma única chamada de teste
+    time.sleep(upstream.breaker.reset_timeout + 0.05)
+    assert upstream.breaker.state == 'half_open'
+    assert upstream.breaker.allow()
+    assert not upstream.breaker.allow()
+    upstream.breaker.cancel()
+
+    upstream.stub.error_rate = 0.0
+    assert api.fetch_weather_data('Osorio')['name'] == 'Osorio'
+    assert upstream.breaker.state == 'closed'
+
+
+def test_failed_probe_reopens_breaker(upstream):
+    upstream.stub.error_rate = 1.0
+    for _ in range(upstream.breaker.failure_threshold):
+        with pytest.raises(UpstreamUnavailable):
+            api.fetch_weather_data('Osorio')
+    time.sleep(upstream.breaker.reset_timeout + 0.05)
+
+    calls = upstream.stub.calls
+    with pytest.raises(UpstreamUnavailable, match='status 503'):
+        api.fetch_weather_data('Osorio')
+    assert upstream.stub.calls == calls + api.HTTP_RETRIES + 1
+    assert upstream.breaker.state == 'open'
+
+
+def test_stale_value_is_served_when_upstream_fails(upstream, monkeypatch):
+    monkeypatch.setitem(api.CACHE_TTL, 'weather', 0)
+    fresh = api.get_weather_data('Osorio')
+    assert fresh['name'] == 'Osorio'
+
+    upstream.stub.error_rate = 1.0
+    assert api.get_weather_data('Osorio') is fresh
+    assert upstream.cache.stale_served == 1
+
+
+def test_failure_without_stale_value_returns_503(upstream):
+    upstream.stub.error_rate = 1.0
+
+    data = api.get_weather_data('Osorio')
+
+    assert data['cod'] == 503
+    assert not api.is_valid_response(data)
+    assert len(upstream.cache.backend) == 0
@@ -0,0 +1,151 @@
+import asyncio
+import threading
+import time
+
+import api
+import models
+from cache import WeatherCache, MemoryBackend, CachedResponse
+from scheduler import RefreshScheduler
+
+
+def run_together(count, target):
+    """Executa target em count threads liberadas ao mesmo tempo e retorna os resultados."""
+    barrier = threading.Barrier(count)
+    results = [None] * count
+
+    def worker(index):
+        barrier.wait()
+        results[index] = target()
+
+    threads = [threading.Thread(target=worker, args=(index,)) for index in range(count)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results
+
+
+def test_concurrent_misses_make_a_single_upstream_call(upstream):
+    upstream.stub.latency = 0.3
+
+    results = run_together(8, lambda: api.get_weather_data('Torres'))
+
+    assert upstream.stub.calls == 1
+    assert all(result is results[0] for result in results)
+    stats = upstream.cache.stats()
+    assert stats["misses"] == 1
+    assert stats["coalesced"] == 7
+
+
+def test_waiters_receive_the_leader_error():
+    cache = WeatherCache(MemoryBackend())
+    started = threading.Event()
+    release = threading.Event()
+    calls = []
+
+    def fetch():
+        calls.append(1)
+        started.set()
+        release.wait(5)
+        raise RuntimeError('falha')
+
+    errors = []
+
+    def request():
+        try:
+            cache.get_or_fetch('weather:osorio', 60, fetch)
+        except RuntimeError as e:
+            errors.append(e)
+
+    leader = threading.Thread(target=request)
+    leader.start()
+    started.wait(5)
+    waiter = threading.Thread(target=request)
+    waiter.start()
+    while cache.stats()["coalesced"] < 1:
+        time.sleep(0.001)
+    release.set()
+    leader.join()
+    waiter.join()
+
+    assert len(calls) == 1
+    assert len(errors) == 2 and errors[0] is errors[1]
+    assert len(cache.backend) == 0
+
+
+def test_errors_are_not_cached(upstream):
+    assert api.get_weather_data('cidadeinexistente')['cod'] == '404'
+    assert api.get_weather_data('cidadeinexistente')['cod'] == '404'
+
+    assert upstream.stub.calls == 2
+
+
+def test_model_lives_with_the_cached_response(upstream):
+    data = api.get_weather_data('Osorio')
+
+    assert isinstance(data, CachedResponse)
+    assert models.weather_model(data) is models.weather_model(data)
+
+    #dicionários fora do cache são convertidos a cada chamada
+    plain = dict(data)
+    assert models.weather_model(plain) is not models.weather_model(plain)
+
+
+def test_eviction_releases_the_response(upstream):
+    upstream.cache.backend = MemoryBackend(max_entries=1)
+    first = api.get_weather_data('Osorio')
+    api.get_weather_data('Torres')
+
+    assert upstream.cache.backend.evictions >= 1
+    assert api.get_weather_data('Osorio') is not first
+
+
+class ThreadRecordingBackend(MemoryBackend):
+    """MemoryBackend marcado como bloqueante (como o RedisBackend), guarda a thread de cada operação."""
+    blocking = True
+
+    def __init__(self):
+        super().__init__()
+        self.threads = []
+
+    def get(self, key, allow_stale=False):
+        self.threads.append(threading.get_ident())
+        return super().get(key, allow_stale)
+
+    def set(self, key, value, ttl):
+        self.threads.append(threading.get_ident())
+        super().set(key, value, ttl)
+
+
+def test_blocking_backend_runs_outside_the_event_loop():
+    backend = ThreadRecordingBackend()
+    cache = WeatherCache(backend)
+
+    async def fetch():
+        return {"name": "Osorio"}
+
+    async def requests():
+        first = await cache.get_or_fetch_async('weather:osorio', 60, fetch)
+        second = await cache.get_or_fetch_async('weather:osorio', 60, fetch)
+        return first, second, await cache.get_stale_async('weather:osorio')
+
+    first, second, stale = asyncio.run(requests())
+
+    assert first == second == stale == {"name": "Osorio"}
+    assert len(backend.threads) == 4
+    assert threading.get_ident() not in backend.threads
+
+
+def test_refresh_cycle_errors_are_logged_and_counted(caplog):
+    scheduler = RefreshScheduler(fetch=lambda *args: None, interval=0.01, cache=WeatherCache(MemoryBackend()))
+
+    def tick():
+        raise RuntimeError('falha no ciclo')
+
+    scheduler.tick = tick
+    scheduler.start()
+    while scheduler.stats()["failed"] < 1:
+        time.sleep(0.005)
+    scheduler.stop()
+
+    assert any(record.exc_info and 'falha no ciclo' in str(record.exc_info[1]) for record in caplog.records)
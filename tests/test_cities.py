@@ -0,0 +1,15 @@
+from cities import CityIndex
+
+
+def test_lookup_short_circuits_only_unambiguous_names():
+    index = CityIndex([('Osório', 'BR', 3455775), ('Santiago', 'CL', 3871336), ('Santiago', 'ES', 3109642)])
+    #a cidade aprendida fica na lista pendente, a busca consulta as duas
+    index.add('Santiago', 'DO', 3492914)
+
+    assert index.lookup('osorio') == 3455775
+    assert index.lookup('Osorio,AR') is None
+    #mesmo nome em vários países, nenhum o preferido: a consulta usa q=
+    assert index.lookup('Santiago') is None
+    assert index.lookup('Santiago', country='es') == 3109642
+    assert index.lookup('Santiago,DO') == 3492914
+    assert index.lookup('Santiago,BR') is None
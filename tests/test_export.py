@@ -0,0 +1,53 @@
+from datetime import date, datetime
+
+import pytest
+
+import crud
+from archive import historic_archive, pa
+from export import export_historic, csv_field
+from function import convert_api_to_current_city
+from stub_upstream import weather_payload
+
+
+def historic_row(name, city_id, moment):
+    """Linha do histórico (crud.historic_values) de uma cidade em uma data fixa."""
+    values = crud.historic_values(convert_api_to_current_city(weather_payload(name, city_id)))
+    values.update(data=moment.date(), data_current=moment)
+    return values
+
+
+@pytest.fixture
+def archive_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(historic_archive, 'directory', str(tmp_path / 'archive'))
+    monkeypatch.setattr(historic_archive, '_version', None)
+    return tmp_path / 'archive'
+
+
+def test_csv_field_matches_postgresql_copy():
+    assert csv_field(None) == ''
+    assert csv_field(50.0) == '50'
+    assert csv_field(81.5) == '81.5'
+    assert csv_field(float('nan')) == 'NaN'
+    assert csv_field(datetime(2025, 10, 5, 10, 0)) == '2025-10-05 10:00:00'
+    assert csv_field(datetime(2025, 10, 5, 10, 0, 0, 250000)) == '2025-10-05 10:00:00.25'
+    assert csv_field(date(2025, 10, 5)) == '2025-10-05'
+    assert csv_field('Osorio') == 'Osorio'
+    assert csv_field('') == '""'
+    assert csv_field('nublado, chuva') == '"nublado, chuva"'
+    assert csv_field('"x"') == '"""x"""'
+
+
+@pytest.mark.skipif(pa is None, reason='o arquivo do histórico requer o pyarrow')
+def test_csv_export_is_uniform_across_the_archive(database, archive_dir):
+    crud.insert_historic_rows([historic_row('Osorio', 3455775, datetime(2025, 9, 5, 10, 0)),
+                               historic_row('Osorio', 3455775, datetime(2025, 10, 5, 10, 0))])
+    assert crud.archive_historic(months=1, today=date(2025, 10, 20)) == [(date(2025, 9, 1), 1)]
+
+    lines = b''.join(export_historic('csv')).decode().splitlines()
+
+    assert len(lines) == 3
+    archived, live = lines[1], lines[2]
+    #mesmas colunas, mesma formatação, só mudam as datas e a identidade
+    assert '2025-09-05 10:00:00,' in archived and '2025-10-05 10:00:00,' in live
+    assert archived.split(',')[4:] == live.split(',')[4:]
+    assert '"' not in archived and '.0,' not in archived
@@ -0,0 +1,108 @@
+from sqlalchemy import func, select
+
+import crud
+import writer
+import main
+from function import convert_api_to_current_city
+from stub_upstream import weather_payload
+
+
+def city(name, city_id):
+    """Dados limpos de uma cidade (convert_api_to_current_city), como gravados pela rota /weather."""
+    return convert_api_to_current_city(weather_payload(name, city_id))
+
+
+def count(table):
+    with crud.get_engine().connect() as connection:
+        return connection.execute(select(func.count()).select_from(table)).scalar()
+
+
+def test_insert_is_idempotent_per_city_and_day(database):
+    osorio = city('Osorio', 3455775)
+
+    crud.insert_weather_historic(osorio)
+    crud.insert_weather_historic(osorio)
+
+    assert count(crud.tableHistoric) == 1
+
+
+def test_insert_many_skips_duplicates_and_errors(database):
+    osorio, torres = city('Osorio', 3455775), city('Torres', 3446370)
+
+    crud.insert_weather_historic_many([osorio, osorio, torres, {"code": 0, "msg": "erro"}])
+    crud.insert_weather_historic_many([torres])
+
+    assert count(crud.tableHistoric) == 2
+
+
+def test_insert_ignores_error_responses(database, caplog):
+    failed = writer.historic_writer.failed
+    writer.save_weather_historic({"code": 0, "msg": "Nome da cidade incorreto ou não encontrado"})
+    crud.insert_weather_historic({"code": 0, "msg": "erro"})
+
+    assert count(crud.tableHistoric) == 0
+    assert writer.historic_writer.failed == failed
+    assert not caplog.records
+
+
+def test_rollup_counts_only_inserted_rows(database):
+    osorio = city('Osorio', 3455775)
+
+    for _ in range(3):
+        crud.insert_weather_historic(osorio)
+
+    with crud.get_engine().connect() as connection:
+        registros = connection.execute(select(crud.tableHistoricRollup.registros)).scalars().all()
+    assert registros == [1, 1]
+
+
+def test_keyset_pages_cover_the_history_once(database):
+    crud.insert_weather_historic_many([city(f'Cidade {index}', 4000000 + index) for index in range(7)])
+
+    pages = []
+    after = None
+    while True:
+        rows = crud.get_data_historic(limit=3, after=after)
+        if not rows:
+            break
+        pages.append([row.identidade for row in rows])
+        after = rows[-1].identidade
+
+    identities = [identity for page in pages for identity in page]
+    assert [len(page) for page in pages] == [3, 3, 1]
+    assert identities == sorted(identities, reverse=True)
+    assert len(set(identities)) == 7
+
+
+def test_historic_page_without_database_returns_503(tmp_path):
+    crud.init_engine('sqlite:///' + str(tmp_path / 'vazio.db'))
+    try:
+        response = main.app.test_client().get('/historic?limit=10')
+    finally:
+        crud.dispose_engine()
+
+    assert response.status_code == 503
+    assert 'error' in response.get_json()
+
+
+def test_historic_route_pages_match_the_stream(database):
+    crud.insert_weather_historic_many([city(f'Cidade {index}', 4000000 + index) for index in range(5)])
+    client = main.app.test_client()
+
+    first = client.get('/historic?limit=3')
+    after = first.headers['X-Next-After']
+    second = client.get(f'/historic?limit=3&after={after}')
+    stream = client.get('/historic')
+
+    assert 'X-Next-After' not in second.headers
+    assert stream.get_json() == first.get_json() + second.get_json()
+    #mesmo serializador nas duas respostas, inclusive a ordem das chaves
+    assert stream.get_data(as_text=True).rstrip() == client.get('/historic?limit=5').get_data(as_text=True).rstrip()
+
+
+def test_stop_without_thread_leaves_the_queue_empty():
+    historic = writer.HistoricWriter()
+
+    historic.stop()
+
+    assert historic.stats()["queue_depth"] == 0
@@ -0,0 +1,24 @@
+import pytest
+
+import main
+import metrics
+
+
+def monitoring_routes():
+    """Rotas de estatísticas do main.py (/...Stats), além de /metrics e /traces."""
+    return sorted(rule.rule for rule in main.app.url_map.iter_rules()
+                  if rule.rule.endswith('Stats') or rule.rule in ('/metrics', '/traces'))
+
+
+@pytest.mark.parametrize('route', monitoring_routes())
+def test_monitoring_routes_require_the_admin_token(route, monkeypatch):
+    client = main.app.test_client()
+
+    monkeypatch.setattr(metrics, 'ADMIN_TOKEN', '')
+    assert client.get(route).status_code == 404
+
+    monkeypatch.setattr(metrics, 'ADMIN_TOKEN', 'segredo')
+    assert client.get(route).status_code == 403
+    assert client.get(route, headers={'X-Admin-Token': 'errado'}).status_code == 403
+    assert client.get(route, headers={'X-Admin-Token': 'segredo'}).status_code == 200
+    assert client.get(route, headers={'Authorization': 'Bearer segredo'}).status_code == 200
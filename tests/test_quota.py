@@ -0,0 +1,88 @@
+import pytest
+
+import api
+import main
+from api import QuotaExhausted
+from quota import QuotaGovernor, RateLimiter, MemoryBuckets
+
+
+def limited_quota(burst):
+    """Cota com burst fichas e sem reposição na duração do teste, sem espera."""
+    return QuotaGovernor(calls_per_minute=0.001, burst=burst, calls_per_day=0, wait=0, store=MemoryBuckets(16))
+
+
+def test_exhausted_quota_serves_error_without_calling_upstream(upstream, monkeypatch):
+    quota = limited_quota(burst=1)
+    monkeypatch.setattr(api, 'upstream_quota', quota)
+
+    assert api.get_weather_data('Osorio')['name'] == 'Osorio'
+    data = api.get_weather_data('Torres')
+
+    assert data['cod'] == 503
+    assert upstream.stub.calls == 1
+    assert quota.rejected == 1
+    #a cota recusada na primeira tentativa não conta como falha da API
+    assert upstream.breaker.failures == 0
+
+
+def test_retries_stop_when_quota_runs_out(upstream, monkeypatch):
+    quota = limited_quota(burst=2)
+    monkeypatch.setattr(api, 'upstream_quota', quota)
+    upstream.stub.error_rate = 1.0
+
+    with pytest.raises(QuotaExhausted):
+        api.fetch_weather_data('Osorio')
+
+    assert upstream.stub.calls == 2
+    assert upstream.breaker.failures == 1
+
+
+def test_background_refresh_keeps_the_reserve(upstream, monkeypatch):
+    quota = QuotaGovernor(calls_per_minute=0.001, burst=2, calls_per_day=0, wait=0, reserve=0.5,
+                          store=MemoryBuckets(16))
+    monkeypatch.setattr(api, 'upstream_quota', quota)
+
+    assert api.fetch_weather_data('Osorio', background=True)['name'] == 'Osorio'
+    with pytest.raises(QuotaExhausted):
+        api.fetch_weather_data('Torres', background=True)
+
+    assert quota.skipped == 1
+    assert api.fetch_weather_data('Torres')['name'] == 'Torres'
+
+
+@pytest.fixture
+def client(monkeypatch):
+    limiter = RateLimiter(per_minute=60, burst=2, store=MemoryBuckets(16))
+    monkeypatch.setattr(main, 'rate_limiter', limiter)
+    return main.app.test_client(), limiter
+
+
+def test_rate_limit_answers_429_with_retry_after(client):
+    client, limiter = client
+
+    statuses = [client.get('/cities?q=oso').status_code for _ in range(3)]
+
+    assert statuses == [200, 200, 429]
+    response = client.get('/cities?q=oso')
+    assert response.status_code == 429
+    assert int(response.headers['Retry-After']) >= 1
+    assert limiter.rejected == 2
+
+
+def test_rate_limit_is_per_client(client):
+    client, _ = client
+
+    for _ in range(2):
+        client.get('/cities?q=oso', environ_base={'REMOTE_ADDR': '10.0.0.1'})
+
+    assert client.get('/cities?q=oso', environ_base={'REMOTE_ADDR': '10.0.0.1'}).status_code == 429
+    assert client.get('/cities?q=oso', environ_base={'REMOTE_ADDR': '10.0.0.2'}).status_code == 200
+
+
+def test_monitoring_routes_are_exempt(client):
+    client, limiter = client
+
+    statuses = {client.get('/metrics').status_code for _ in range(5)}
+
+    assert 429 not in statuses
+    assert limiter.rejected == 0
@@ -0,0 +1,201 @@
+import atexit
+import logging
+import os
+import queue
+import threading
+import time
+from crud import historic_values, insert_historic_rows, insert_weather_historic, insert_weather_historic_many
+
+
+#Configuração da gravação em segundo plano (write-behind) do histórico, pode ser ajustada por variáveis de ambiente
+WRITE_BEHIND = os.environ.get('WRITE_BEHIND', '0') == '1'
+WRITE_BEHIND_BATCH_SIZE = int(os.environ.get('WRITE_BEHIND_BATCH_SIZE', 200))
+WRITE_BEHIND_INTERVAL = float(os.environ.get('WRITE_BEHIND_INTERVAL', 1.0))
+WRITE_BEHIND_MAX_QUEUE = int(os.environ.get('WRITE_BEHIND_MAX_QUEUE', 10000))
+
+logger = logging.getLogger(__name__)
+
+
+class HistoricWriter:
+    """
+    Fila em memória e thread de gravação do histórico em segundo plano.
+
+    As rotas colocam os registros na fila e respondem sem esperar o banco de dados. A thread grava
+    a fila em lotes de até batch_size linhas, ou a cada interval segundos, com crud.insert_historic_rows.
+    Com a fila cheia o registro é descartado e contado em dropped.
+    Os erros do banco, na fila ou na gravação direta (WRITE_BEHIND=0), vão para o log e são contados em failed.
+
+    Atributos:
+        enqueued (int): Registros colocados na fila.
+        written (int): Linhas enviadas ao banco.
+        dropped (int): Registros descartados (fila cheia ou erro na gravação).
+        failed (int): Registros não gravados por erro do banco, na fila ou na gravação direta.
+        flushes (int): Lotes gravados.
+    """
+    def __init__(self, batch_size=WRITE_BEHIND_BATCH_SIZE, interval=WRITE_BEHIND_INTERVAL, max_queue=WRITE_BEHIND_MAX_QUEUE):
+        self.batch_size = batch_size
+        self.interval = interval
+        self.queue = queue.Queue(maxsize=max_queue)
+        self.enqueued = 0
+        self.written = 0
+        self.dropped = 0
+        self.failed = 0
+        self.flushes = 0
+        self.flush_total = 0.0
+        self.flush_max = 0.0
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        """Inicia a thread de gravação, caso ainda não esteja rodando neste processo."""
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._stop.clear()
+                self._thread = threading.Thread(target=self._run, name='historic-writer', daemon=True)
+                self._thread.start()
+
+    def stop(self, timeout=10):
+        """Para a thread de gravação depois de gravar o que estiver na fila."""
+        self._stop.set()
+        thread = self._thread
+        #sem a thread (WRITE_BEHIND=0 ou nunca iniciada) não há quem retire o aviso da fila, ele contaria em queue_depth
+        if thread is None or not thread.is_alive():
+            return
+        try:
+            #acorda a thread que espera a fila (_take), o lote em andamento é gravado na hora
+            self.queue.put_nowait(None)
+        except queue.Full:
+            pass
+        thread.join(timeout)
+
+    def put(self, dados):
+        """
+        Coloca os dados de uma cidade na fila de gravação, sem esperar o banco.
+
+        Parâmetros:
+        dados (dict): Um dicionário limpo de dados da função convert_api_to_current_city.
+
+        Retorna:
+        bool: True se o registro entrou na fila, False se foi ignorado (erro na cidade) ou descartado (fila cheia).
+        """
+        if dados.get('code') != 1:
+            return False
+        self.start()
+        try:
+            self.queue.put_nowait(historic_values(dados))
+        except queue.Full:
+            with self._lock:
+                self.dropped += 1
+            return False
+        with self._lock:
+            self.enqueued += 1
+        return True
+
+    def _take(self):
+        """Retira da fila até batch_size registros, esperando no máximo interval segundos."""
+        batch = []
+        deadline = time.monotonic() + self.interval
+        while len(batch) < self.batch_size:
+            timeout = deadline - time.monotonic()
+            try:
+                if self._stop.is_set() or timeout <= 0:
+                    item = self.queue.get_nowait()
+                else:
+                    item = self.queue.get(timeout=timeout)
+            except queue.Empty:
+                break
+            if item is None:
+                break
+            batch.append(item)
+        return batch
+
+    def _run(self):
+        while not (self._stop.is_set() and self.queue.empty()):
+            batch = self._take()
+            if batch:
+                self.flush(batch)
+
+    def flush(self, batch):
+        """Grava um lote no banco, removendo repetições da mesma cidade e data."""
+        rows = list({(row['id'], row['data']): row for row in batch}.values())
+        start = time.perf_counter()
+        try:
+            insert_historic_rows(rows)
+        except Exception as e:
+            with self._lock:
+                self.dropped += len(batch)
+            self.record_failure(len(batch), e)
+            return
+        elapsed = time.perf_counter() - start
+        with self._lock:
+            self.written += len(rows)
+            self.flushes += 1
+            self.flush_total += elapsed
+            self.flush_max = max(self.flush_max, elapsed)
+
+    def record_failure(self, count, error):
+        """
+        Registra no log e em failed os registros do histórico não gravados por erro do banco.
+
+        Parâmetros:
+        count (int): Registros perdidos.
+        error (Exception): Erro da gravação.
+        """
+        with self._lock:
+            self.failed += count
+        logger.error('falha ao gravar %d registro(s) do histórico: %s', count, error, exc_info=error)
+
+    def stats(self):
+        """
+        Retorna as métricas da gravação em segundo plano.
+
+        Retorna:
+        dict: tamanho da fila, registros enfileirados, gravados e descartados e a latência dos lotes (ms).
+        """
+        with self._lock:
+            return {
+                "enabled": WRITE_BEHIND,
+                "queue_depth": self.queue.qsize(),
+                "enqueued": self.enqueued,
+                "written": self.written,
+                "dropped": self.dropped,
+                "failed": self.failed,
+                "flushes": self.flushes,
+                "flush_avg_ms": round(self.flush_total * 1000 / self.flushes, 3) if self.flushes else 0.0,
+                "flush_max_ms": round(self.flush_max * 1000, 3),
+            }
+
+
+#Gravador único do processo
+historic_writer = HistoricWriter()
+atexit.register(historic_writer.stop)
+
+
+def save_weather_historic(dados):
+    """
+    Grava os dados da cidade no histórico: na fila do historic_writer com WRITE_BEHIND=1,
+    ou direto no banco com crud.insert_weather_historic. Um erro do banco não interrompe a rota,
+    fica no log e em historic_writer.failed.
+    """
+    if WRITE_BEHIND:
+        historic_writer.put(dados)
+    else:
+        try:
+            insert_weather_historic(dados)
+        except Exception as e:
+            historic_writer.record_failure(1, e)
+
+
+def save_weather_historic_many(lista):
+    """
+    Versão de save_weather_historic para as rotas em lote (crud.insert_weather_historic_many).
+    """
+    if WRITE_BEHIND:
+        for dados in lista:
+            historic_writer.put(dados)
+    else:
+        try:
+            insert_weather_historic_many(lista)
+        except Exception as e:
+            historic_writer.record_failure(sum(1 for dados in lista if dados.get('code') == 1), e)